@@ -21,6 +21,8 @@ import queue
 from cloudify.amqp_client import AMQPConnection
 from cloudify.constants import EVENTS_EXCHANGE_NAME, LOGS_EXCHANGE_NAME
 
+from . import metrics
+
 
 class AckingAMQPConnection(AMQPConnection):
     def _process_publish(self, channel):
@@ -74,6 +76,7 @@ class AMQPLogsEventsConsumer(object):
                                     (channel, method.delivery_tag))
         except Exception as e:
             logger.warn('Failed message processing: %s', e)
+            metrics.DROPPED_MESSAGES.labels(reason='invalid').inc()
             logger.debug('Message was: %s', body)
 
     def _bind_queue_to_exchange(self,
@@ -0,0 +1,257 @@
+"""Benchmark the logs & events ingestion path.
+
+Synthetic log & event messages are fed directly into the publisher,
+and stored in the database configured in the rest-service config file.
+RabbitMQ is not needed: the AMQP connection is replaced by a fake one,
+which only records when each message was acked.
+
+Example:
+    python -m amqp_postgres.benchmark --messages 100000 --executions 50
+"""
+import argparse
+import logging
+import os
+import time
+import uuid
+
+from cloudify.constants import EVENTS_EXCHANGE_NAME, LOGS_EXCHANGE_NAME
+from cloudify.models_states import ExecutionState
+
+from manager_rest import config
+from manager_rest.flask_utils import setup_flask_app
+from manager_rest.storage import models
+from manager_rest.storage.models_base import db
+from manager_rest.utils import get_formatted_timestamp
+
+from .main import CONFIG_PATH
+from .postgres_publisher import DBLogEventPublisherPool
+
+logger = logging.getLogger(__name__)
+
+
+class FakeAcksQueue(object):
+    """Record the time when each message was acked"""
+    def __init__(self):
+        self.acked_at = {}
+
+    def put(self, tag):
+        self.acked_at[tag] = time.time()
+
+
+class FakeAMQPConnection(object):
+    """Stand-in for AckingAMQPConnection"""
+    def __init__(self):
+        self.acks_queue = FakeAcksQueue()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = int(round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def _rss_mb():
+    """The current resident set size of this process (linux only)"""
+    with open('/proc/self/statm') as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def create_executions(count):
+    creator = models.User.query.get(0)
+    tenant = models.Tenant.query.get(0)
+    executions = []
+    for _ in range(count):
+        execution = models.Execution(
+            id='benchmark-{0}'.format(uuid.uuid4()),
+            status=ExecutionState.STARTED,
+            created_at=get_formatted_timestamp(),
+            workflow_id='benchmark',
+            error='',
+            parameters={},
+            is_system_workflow=False,
+        )
+        execution.creator = creator
+        execution.tenant = tenant
+        db.session.add(execution)
+        executions.append(execution)
+    db.session.commit()
+    return [execution.id for execution in executions]
+
+
+def delete_executions(execution_ids):
+    (
+        models.Execution.query
+        .filter(models.Execution.id.in_(execution_ids))
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def make_message(execution_id, number, message_size, is_event):
+    text = 'message {0} '.format(number).ljust(message_size, 'x')
+    message = {
+        'context': {
+            'execution_id': execution_id,
+            'node_id': 'node_{0}'.format(number % 10),
+            'operation': 'cloudify.interfaces.lifecycle.create',
+        },
+        'message': {'text': text},
+        'timestamp': get_formatted_timestamp(),
+    }
+    if is_event:
+        message['event_type'] = 'sending_task'
+        return message, EVENTS_EXCHANGE_NAME
+    message['logger'] = 'ctx.benchmark'
+    message['level'] = 'info'
+    return message, LOGS_EXCHANGE_NAME
+
+
+def run_benchmark(execution_ids, messages=10000, rate=0, message_size=100,
+                  events_ratio=0.5, workers=1, timeout=60):
+    """Feed the messages into the publisher, and wait for them to be acked.
+
+    :param rate: messages per second to send, or 0 to send as fast as
+        possible
+    :param timeout: stop waiting if no message was acked for this long
+    :return: a dict of the results
+    """
+    connection = FakeAMQPConnection()
+    publisher = DBLogEventPublisherPool(
+        config.instance, connection, workers=workers)
+    publisher.start()
+
+    rss_before = _rss_mb()
+    sent_at = {}
+    started = time.time()
+    for number in range(messages):
+        if rate:
+            delay = started + number / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        message, exchange = make_message(
+            execution_ids[number % len(execution_ids)],
+            number,
+            message_size,
+            # spread the events evenly among the logs
+            is_event=int((number + 1) * events_ratio) >
+            int(number * events_ratio),
+        )
+        sent_at[number] = time.time()
+        publisher.process(message, exchange, number)
+    sending_finished = time.time()
+
+    acked_at = connection.acks_queue.acked_at
+    last_progress, last_acked = time.time(), 0
+    while len(acked_at) < messages and publisher.error_exit is None:
+        time.sleep(0.1)
+        if len(acked_at) != last_acked:
+            last_progress, last_acked = time.time(), len(acked_at)
+        elif time.time() - last_progress > timeout:
+            logger.warning('No progress for %d seconds, giving up', timeout)
+            break
+    if publisher.error_exit is not None:
+        raise publisher.error_exit
+
+    acked_at = dict(acked_at)
+    latencies = [acked_at[tag] - sent_at[tag] for tag in acked_at]
+    finished = max(acked_at.values(), default=time.time())
+    return {
+        'messages': messages,
+        'acked': len(acked_at),
+        'send_duration': sending_finished - started,
+        'duration': finished - started,
+        'msgs_per_sec': len(acked_at) / max(finished - started, 1e-9),
+        'latency_p50': _percentile(latencies, 50),
+        'latency_p99': _percentile(latencies, 99),
+        'rss_growth_mb': _rss_mb() - rss_before,
+    }
+
+
+def print_results(results):
+    print('Messages sent:      {messages}'.format(**results))
+    print('Messages stored:    {acked}'.format(**results))
+    print('Sending took:       {send_duration:.2f}s'.format(**results))
+    print('Storing took:       {duration:.2f}s'.format(**results))
+    print('Throughput:         {msgs_per_sec:.1f} msgs/sec'.format(**results))
+    if results['latency_p50'] is not None:
+        print('Latency p50:        {latency_p50:.3f}s'.format(**results))
+        print('Latency p99:        {latency_p99:.3f}s'.format(**results))
+    print('RSS growth:         {rss_growth_mb:.1f}MB'.format(**results))
+
+
+def main(args):
+    logging.basicConfig(
+        level=args['loglevel'].upper(),
+        format="%(asctime)s %(message)s")
+    config.instance.load_from_file(args['config'])
+    config.instance.amqp_postgres_use_copy = args['use_copy']
+    if args['batch_size']:
+        config.instance.amqp_postgres_batch_size = args['batch_size']
+    if args['batch_delay']:
+        config.instance.amqp_postgres_batch_delay = args['batch_delay']
+
+    with setup_flask_app().app_context():
+        config.instance.load_from_db()
+        execution_ids = create_executions(args['executions'])
+    try:
+        results = run_benchmark(
+            execution_ids,
+            messages=args['messages'],
+            rate=args['rate'],
+            message_size=args['message_size'],
+            events_ratio=args['events_ratio'],
+            workers=args['workers'],
+            timeout=args['timeout'],
+        )
+    finally:
+        if not args['keep']:
+            with setup_flask_app().app_context():
+                delete_executions(execution_ids)
+    print_results(results)
+
+
+def cli():
+    """Parse arguments and run main"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark storing logs & events in the database')
+    parser.add_argument('--config', default=CONFIG_PATH,
+                        help='Path to the config file')
+    parser.add_argument('--messages', type=int, default=10000,
+                        help='Total number of messages to send')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Messages per second to send (0: unlimited)')
+    parser.add_argument('--executions', type=int, default=10,
+                        help='Number of executions to spread messages over')
+    parser.add_argument('--message-size', dest='message_size', type=int,
+                        default=100, help='Length of the message text')
+    parser.add_argument('--events-ratio', dest='events_ratio', type=float,
+                        default=0.5, help='Ratio of events to all messages')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of publisher workers')
+    parser.add_argument('--batch-size', dest='batch_size', type=int,
+                        help='Override the configured batch size')
+    parser.add_argument('--batch-delay', dest='batch_delay', type=float,
+                        help='Override the configured batch delay')
+    parser.add_argument('--use-copy', dest='use_copy', action='store_true',
+                        help='Store the batches using COPY')
+    parser.add_argument('--timeout', type=int, default=60,
+                        help='Give up after no progress for this many '
+                             'seconds')
+    parser.add_argument('--keep', action='store_true',
+                        help="Don't delete the executions (and their "
+                             "logs & events) afterwards")
+    parser.add_argument('--log-level', dest='loglevel', default='WARNING',
+                        help='Logging level')
+    args = parser.parse_args()
+    main(vars(args))
+
+
+if __name__ == '__main__':
+    cli()
@@ -2,12 +2,14 @@ import logging
 import argparse
 import queue
 
+from prometheus_client import start_http_server
+
 from cloudify.amqp_client import get_client
 from manager_rest import config
 from manager_rest.flask_utils import setup_flask_app
 
 from .amqp_consumer import AMQPLogsEventsConsumer, AckingAMQPConnection
-from .postgres_publisher import DBLogEventPublisher
+from .postgres_publisher import DBLogEventPublisherPool
 
 logger = logging.getLogger(__name__)
 BROKER_PORT_SSL = 5671
@@ -32,7 +34,11 @@ def _create_connections():
         cls=AckingAMQPConnection
     )
     amqp_client.acks_queue = acks_queue
-    db_publisher = DBLogEventPublisher(config.instance, amqp_client)
+    db_publisher = DBLogEventPublisherPool(
+        config.instance,
+        amqp_client,
+        workers=cfy_config.amqp_postgres_workers,
+    )
     amqp_consumer = AMQPLogsEventsConsumer(
         message_processor=db_publisher.process
     )
@@ -42,6 +48,20 @@ def _create_connections():
     return amqp_client, db_publisher
 
 
+def _start_metrics_exporter():
+    """Serve the ingestion metrics over HTTP, if a port is configured.
+
+    The exporter runs in a daemon thread, so it doesn't need to be
+    stopped separately.
+    """
+    cfy_config = config.instance
+    port = cfy_config.amqp_postgres_metrics_port
+    if not port:
+        return
+    start_http_server(port, addr=cfy_config.amqp_postgres_metrics_host)
+    logger.info('Serving metrics on port %s', port)
+
+
 def main(args):
     logging.basicConfig(
         level=args.get('loglevel', 'INFO').upper(),
@@ -51,6 +71,7 @@ def main(args):
     with setup_flask_app().app_context():
         config.instance.load_from_db()
     amqp_client, db_publisher = _create_connections()
+    _start_metrics_exporter()
 
     logger.info('Starting consuming...')
     amqp_client.consume()
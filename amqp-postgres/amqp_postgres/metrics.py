@@ -0,0 +1,36 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+BATCH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+BATCH_SIZE = Histogram(
+    'amqp_postgres_batch_size',
+    'Number of logs & events stored in a single batch',
+    buckets=BATCH_SIZE_BUCKETS,
+)
+STORE_DURATION = Histogram(
+    'amqp_postgres_store_duration_seconds',
+    'Time spent storing and committing a single batch',
+)
+BATCH_LATENCY = Histogram(
+    'amqp_postgres_batch_latency_seconds',
+    'Time from taking the first message of a batch off the queue, '
+    'until the whole batch is stored and acked',
+)
+NOBATCH_FALLBACKS = Counter(
+    'amqp_postgres_nobatch_fallbacks_total',
+    'Number of batches that failed to store, and were stored row by row',
+)
+DROPPED_MESSAGES = Counter(
+    'amqp_postgres_dropped_messages_total',
+    'Number of messages that were not stored',
+    ['reason'],
+)
+EXECUTIONS_CACHE_LOOKUPS = Counter(
+    'amqp_postgres_executions_cache_lookups_total',
+    'Number of executions cache lookups',
+    ['result'],
+)
+BACKLOG = Gauge(
+    'amqp_postgres_backlog',
+    'Number of messages received, but not yet stored',
+)
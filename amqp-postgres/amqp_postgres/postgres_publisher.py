@@ -1,3 +1,4 @@
+import io
 import json
 import logging
 import queue
@@ -12,10 +13,17 @@ from collections import OrderedDict
 from cloudify.constants import EVENTS_EXCHANGE_NAME, LOGS_EXCHANGE_NAME
 from manager_rest.flask_utils import setup_flask_app
 
+from . import metrics
+
 
 logger = logging.getLogger(__name__)
 
 BATCH_DELAY = 0.5
+BATCH_SIZE = 100
+# when storing a batch using COPY fails, the batch is split in halves which
+# are retried separately; batches of this size or smaller are instead stored
+# row by row, so that only the erroneous rows are dropped
+COPY_SPLIT_THRESHOLD = 10
 
 EVENT_INSERT_QUERY = """
     INSERT INTO events (
@@ -91,7 +99,54 @@ LOG_VALUES_TEMPLATE = """(
     )
 """
 
-EXECUTION_SELECT_QUERY = """
+COPY_QUERY = 'COPY {table} ({columns}) FROM STDIN'
+# the same value as the INSERT queries use for the "timestamp" column
+NOW_QUERY = "SELECT now() at time zone 'utc'"
+
+# (column, item key) pairs for storing events and logs using COPY.
+# The "timestamp" column is not listed here, because it is always set
+# to the time of storing the batch, as given by the db.
+EVENT_COPY_COLUMNS = [
+    ('reported_timestamp', 'timestamp'),
+    ('_execution_fk', 'execution_id'),
+    ('_tenant_id', 'tenant_id'),
+    ('_creator_id', 'creator_id'),
+    ('event_type', 'event_type'),
+    ('message', 'message'),
+    ('message_code', 'message_code'),
+    ('operation', 'operation'),
+    ('node_id', 'node_id'),
+    ('error_causes', 'error_causes'),
+    ('visibility', 'visibility'),
+    ('source_id', 'source_id'),
+    ('target_id', 'target_id'),
+]
+
+LOG_COPY_COLUMNS = [
+    ('reported_timestamp', 'timestamp'),
+    ('_execution_fk', 'execution_id'),
+    ('_tenant_id', 'tenant_id'),
+    ('_creator_id', 'creator_id'),
+    ('logger', 'logger'),
+    ('level', 'level'),
+    ('message', 'message'),
+    ('message_code', 'message_code'),
+    ('operation', 'operation'),
+    ('node_id', 'node_id'),
+    ('visibility', 'visibility'),
+    ('source_id', 'source_id'),
+    ('target_id', 'target_id'),
+]
+
+# after storing logs & events, a notification with the execution's
+# _storage_id is sent on this channel, for streaming them to clients
+EVENTS_NOTIFICATION_CHANNEL = 'events_inserted'
+EVENTS_NOTIFY_QUERY = """
+    SELECT pg_notify(%s, execution_fk::text)
+    FROM unnest(%s::integer[]) AS execution_fk
+"""
+
+EXECUTIONS_SELECT_QUERY = """
     SELECT
         id,
         _storage_id,
@@ -99,7 +154,7 @@ EXECUTION_SELECT_QUERY = """
         _tenant_id,
         visibility
     FROM executions
-    WHERE id = %s
+    WHERE id = ANY(%s)
 """
 
 
@@ -111,6 +166,30 @@ def _strip_nul(text):
     return text.replace('\x00', '<NUL>')
 
 
+def _get_execution_id(message):
+    try:
+        return message['context']['execution_id']
+    except (KeyError, TypeError):
+        return None
+
+
+def _copy_escape(value):
+    """Format the value as a field of the COPY text format.
+
+    None is stored as NULL, and the characters that are meaningful in
+    the text format (backslash, and the row & column delimiters) are escaped.
+    """
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+        .replace('\t', '\\t')
+    )
+
+
 class DBLogEventPublisher(object):
     COMMIT_DELAY = 0.1  # seconds
 
@@ -120,25 +199,23 @@ class DBLogEventPublisher(object):
 
         self._last_commit = time()
         self.config = config
+        self._batch_size = config.amqp_postgres_batch_size or BATCH_SIZE
+        self._batch_delay = config.amqp_postgres_batch_delay or BATCH_DELAY
+        self._use_copy = bool(config.amqp_postgres_use_copy)
         self._amqp_connection = connection
         self._started = queue.Queue()
-        self._reset_cache()
+        # the result that "the execution doesn't exist" is only cached for
+        # a short time, because the execution might well exist soon
+        self._executions_cache = ExecutionsCache(
+            size_limit=config.amqp_postgres_executions_cache_size,
+            ttl=config.amqp_postgres_executions_cache_ttl,
+            negative_ttl=config.amqp_postgres_executions_cache_negative_ttl,
+        )
         # exception stored here will be raised by the main thread
         self.error_exit = None
 
     def _reset_cache(self):
-        self._executions_cache = LimitedSizeDict(100)
-
-    def _sanitize_cache(self):
-        """Drop None executions from the cache.
-
-        This is to be run after every batch of items, so that the cached
-        result that "the execution doesn't exist" can be dropped, because
-        the execution might well exist on the next batch.
-        """
-        for key, execution in list(self._executions_cache.items()):
-            if execution is None:
-                self._executions_cache.pop(key)
+        self._executions_cache.clear()
 
     def start(self):
         self.error_exit = None
@@ -158,6 +235,7 @@ class DBLogEventPublisher(object):
                 raise started
 
     def process(self, message, exchange, tag):
+        metrics.BACKLOG.inc()
         self._batch.put((message, exchange, tag))
 
     def connect(self):
@@ -181,51 +259,96 @@ class DBLogEventPublisher(object):
         else:
             self._started.put(True)
         items = []
+        batch_started = None
         while True:
             try:
-                items.append(self._batch.get(timeout=BATCH_DELAY / 2))
+                items.append(self._batch.get(timeout=self._batch_delay / 2))
             except queue.Empty:
                 pass
-            if len(items) > 100 or \
-                    (items and (time() - self._last_commit > BATCH_DELAY)):
-                try:
-                    self._store(conn, items)
-                except psycopg2.OperationalError as e:
-                    self.on_db_connection_error(e)
-                except Exception:
-                    logger.info('Error storing %d logs+events in batch',
-                                len(items))
-                    conn.rollback()
-                    # in case the integrityError was caused by stale cache,
-                    # clean it entirely before trying to insert without
-                    # batching.
-                    # This happens rarely.
-                    self._reset_cache()
-                    self._store_nobatch(conn, items)
+            else:
+                if batch_started is None:
+                    batch_started = time()
+            if len(items) > self._batch_size or \
+                    (items and
+                     (time() - self._last_commit > self._batch_delay)):
+                metrics.BATCH_SIZE.observe(len(items))
+                with metrics.STORE_DURATION.time():
+                    self._store_batch(conn, items)
+                metrics.BACKLOG.dec(len(items))
+                metrics.BATCH_LATENCY.observe(time() - batch_started)
                 items = []
+                batch_started = None
                 self._last_commit = time()
-                self._sanitize_cache()
 
-    def _get_execution(self, conn, execution_id):
-        if execution_id not in self._executions_cache:
-            with conn.cursor() as cur:
-                cur.execute(EXECUTION_SELECT_QUERY, (execution_id, ))
-                executions = cur.fetchall()
-            if len(executions) > 1:
-                raise ValueError('Expected 1 execution, found {0} (id: {1})'
-                                 .format(len(executions), execution_id))
-            elif not executions:
-                execution = None
+    def _store_batch(self, conn, items):
+        try:
+            self._store(conn, items)
+        except psycopg2.OperationalError as e:
+            self.on_db_connection_error(e)
+        except Exception:
+            logger.info('Error storing %d logs+events in batch', len(items))
+            conn.rollback()
+            # in case the integrityError was caused by stale cache,
+            # clean it entirely before trying to insert without
+            # batching.
+            # This happens rarely.
+            self._reset_cache()
+            if self._use_copy and len(items) > COPY_SPLIT_THRESHOLD:
+                half = len(items) // 2
+                self._store_batch(conn, items[:half])
+                self._store_batch(conn, items[half:])
+            else:
+                self._store_nobatch(conn, items)
+
+    def _get_executions(self, conn, execution_ids):
+        """Get the executions with the given ids.
+
+        Executions that aren't cached yet, are all fetched using a single
+        query. Return a dict of execution id to execution, or to None if
+        the execution doesn't exist.
+        """
+        executions = {}
+        to_fetch = []
+        for execution_id in set(execution_ids):
+            execution = self._executions_cache.get(execution_id)
+            if execution is ExecutionsCache.MISSING:
+                to_fetch.append(execution_id)
             else:
-                execution = executions[0]
-            self._executions_cache[execution_id] = execution
-        return self._executions_cache[execution_id]
+                executions[execution_id] = execution
+        metrics.EXECUTIONS_CACHE_LOOKUPS.labels(result='hit')\
+            .inc(len(executions))
+        if not to_fetch:
+            return executions
+        metrics.EXECUTIONS_CACHE_LOOKUPS.labels(result='miss')\
+            .inc(len(to_fetch))
+
+        fetched = {}
+        with conn.cursor() as cur:
+            cur.execute(EXECUTIONS_SELECT_QUERY, (to_fetch, ))
+            for execution in cur.fetchall():
+                if execution['id'] in fetched:
+                    raise ValueError(
+                        'Expected 1 execution, found more (id: {0})'
+                        .format(execution['id']))
+                fetched[execution['id']] = execution
+        for execution_id in to_fetch:
+            execution = fetched.get(execution_id)
+            self._executions_cache.set(execution_id, execution)
+            executions[execution_id] = execution
+        return executions
+
+    def _get_execution(self, conn, execution_id):
+        return self._get_executions(conn, [execution_id])[execution_id]
 
-    def _get_db_item(self, conn, message, exchange):
+    def _get_db_item(self, conn, message, exchange, executions=None):
         execution_id = message['context']['execution_id']
-        execution = self._get_execution(conn, execution_id)
+        if executions is not None and execution_id in executions:
+            execution = executions[execution_id]
+        else:
+            execution = self._get_execution(conn, execution_id)
         if execution is None:
             logger.warning('No execution found: %s', execution_id)
+            metrics.DROPPED_MESSAGES.labels(reason='no_execution').inc()
             return
 
         if exchange == EVENTS_EXCHANGE_NAME:
@@ -240,17 +363,31 @@ class DBLogEventPublisher(object):
         events, logs = [], []
 
         acks = []
+        executions = self._get_executions(conn, [
+            execution_id for execution_id in
+            (_get_execution_id(message) for message, _, _ in items)
+            if execution_id is not None
+        ])
         for message, exchange, ack in items:
             acks.append(ack)
-            item = self._get_db_item(conn, message, exchange)
+            item = self._get_db_item(conn, message, exchange, executions)
             if item is None:
                 continue
             target = events if exchange == EVENTS_EXCHANGE_NAME else logs
             target.append(item)
 
         with conn.cursor() as cur:
-            self._insert_events(cur, events)
-            self._insert_logs(cur, logs)
+            if self._use_copy:
+                # take the timestamp from the db, so that it's consistent
+                # with the rows stored by INSERT, regardless of clock skew
+                cur.execute(NOW_QUERY)
+                now = cur.fetchone()[0]
+                self._copy_events(cur, events, now)
+                self._copy_logs(cur, logs, now)
+            else:
+                self._insert_events(cur, events)
+                self._insert_logs(cur, logs)
+            self._notify_stored(cur, events + logs)
         logger.debug('commit %s', len(logs) + len(events))
         conn.commit()
         for ack in acks:
@@ -263,6 +400,7 @@ class DBLogEventPublisher(object):
         batch throws an IntegrityError - we fall back to inserting the items
         one by one, so that only the erroneous message is dropped.
         """
+        metrics.NOBATCH_FALLBACKS.inc()
         for message, exchange, ack in items:
             item = self._get_db_item(conn, message, exchange)
             if item is None:
@@ -272,11 +410,13 @@ class DBLogEventPublisher(object):
             try:
                 with conn.cursor() as cur:
                     insert(cur, [item])
+                    self._notify_stored(cur, [item])
                 conn.commit()
             except psycopg2.OperationalError as e:
                 self.on_db_connection_error(e)
             except (psycopg2.IntegrityError, ValueError):
                 logger.debug('Error storing %s: %s', exchange, item)
+                metrics.DROPPED_MESSAGES.labels(reason='store_error').inc()
                 conn.rollback()
             except psycopg2.ProgrammingError as e:
                 if e.pgcode == psycopg2.errorcodes.UNDEFINED_COLUMN:
@@ -285,12 +425,26 @@ class DBLogEventPublisher(object):
                 else:
                     logger.exception('Error storing %s: %s (ProgrammingError)',
                                      exchange, item)
+                metrics.DROPPED_MESSAGES.labels(reason='store_error').inc()
                 conn.rollback()
             except Exception:
                 logger.exception('Unexpected error while storing %s: %s',
                                  exchange, item)
+                metrics.DROPPED_MESSAGES.labels(reason='store_error').inc()
                 conn.rollback()
 
+    def _notify_stored(self, cursor, items):
+        """Notify about the executions that had logs & events stored.
+
+        Notifications are only delivered once the transaction commits,
+        and duplicate notifications in a transaction are folded into one.
+        """
+        execution_fks = sorted({item['execution_id'] for item in items})
+        if not execution_fks:
+            return
+        cursor.execute(EVENTS_NOTIFY_QUERY,
+                       (EVENTS_NOTIFICATION_CHANNEL, execution_fks))
+
     def _insert_events(self, cursor, events):
         if not events:
             return
@@ -303,6 +457,35 @@ class DBLogEventPublisher(object):
         execute_values(cursor, LOG_INSERT_QUERY, logs,
                        template=LOG_VALUES_TEMPLATE)
 
+    def _copy_events(self, cursor, events, now):
+        self._copy_rows(cursor, 'events', EVENT_COPY_COLUMNS, events, now)
+
+    def _copy_logs(self, cursor, logs, now):
+        self._copy_rows(cursor, 'logs', LOG_COPY_COLUMNS, logs, now)
+
+    def _copy_rows(self, cursor, table, columns, items, now):
+        """Stream the items into the table using COPY FROM STDIN.
+
+        Unlike the INSERT path, the cost of COPY doesn't depend on
+        building (and parsing) a statement with all the items, so it
+        scales well with the batch size.
+
+        :param now: the timestamp of the stored rows
+        """
+        if not items:
+            return
+        now = _copy_escape(now.isoformat())
+        data = io.StringIO()
+        for item in items:
+            data.write('\t'.join(
+                [now] + [_copy_escape(item[key]) for _, key in columns]))
+            data.write('\n')
+        data.seek(0)
+        cursor.copy_expert(COPY_QUERY.format(
+            table=table,
+            columns=', '.join(['timestamp'] + [col for col, _ in columns]),
+        ), data)
+
     def on_db_connection_error(self, err):
         logger.critical('Database down - cannot continue')
         self._amqp_connection.close()
@@ -330,6 +513,7 @@ class DBLogEventPublisher(object):
         except KeyError as e:
             logger.warning('Error formatting log: %s', e)
             logger.debug('Malformed log: %s', message)
+            metrics.DROPPED_MESSAGES.labels(reason='malformed').inc()
             return None
 
     @staticmethod
@@ -356,25 +540,81 @@ class DBLogEventPublisher(object):
         except KeyError as e:
             logger.warning('Error formatting event: %s', e)
             logger.debug('Malformed event: %s', message)
+            metrics.DROPPED_MESSAGES.labels(reason='malformed').inc()
             return None
 
 
-class LimitedSizeDict(OrderedDict):
+class DBLogEventPublisherPool(object):
+    """Store logs & events using several publishers at once.
+
+    Each publisher has its own thread and its own database connection.
+    Messages are partitioned between the publishers by the execution id,
+    so that the logs & events of a single execution are still stored
+    in order.
     """
-    A FIFO dictionary with a maximum size limit. If number of keys reaches
-    the limit, the elements added first will be popped
-    Implementation taken from https://stackoverflow.com/a/2437645/978089
+    def __init__(self, config, connection, workers=1):
+        self._publishers = [
+            DBLogEventPublisher(config, connection)
+            for _ in range(max(workers, 1))
+        ]
+
+    @property
+    def error_exit(self):
+        for publisher in self._publishers:
+            if publisher.error_exit is not None:
+                return publisher.error_exit
+
+    def start(self):
+        for publisher in self._publishers:
+            publisher.start()
+
+    def process(self, message, exchange, tag):
+        index = hash(_get_execution_id(message)) % len(self._publishers)
+        self._publishers[index].process(message, exchange, tag)
+
+
+class ExecutionsCache(object):
+    """An LRU cache of executions, with expiring entries.
+
+    If the number of entries reaches the limit, the least recently used
+    entries are dropped. Entries storing None - meaning that the execution
+    doesn't exist - expire after negative_ttl instead of ttl.
     """
-    def __init__(self, size_limit=None, *args, **kwds):
+    MISSING = object()
+
+    def __init__(self, size_limit=1000, ttl=300, negative_ttl=1):
         self.size_limit = size_limit
-        OrderedDict.__init__(self, *args, **kwds)
-        self._check_size_limit()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
 
-    def __setitem__(self, key, value):
-        OrderedDict.__setitem__(self, key, value)
-        self._check_size_limit()
+    def __len__(self):
+        return len(self._entries)
 
-    def _check_size_limit(self):
+    def get(self, key):
+        """Get the cached value, or MISSING if it's not cached"""
+        try:
+            value, expires_at = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return self.MISSING
+        if expires_at < time():
+            del self._entries[key]
+            self.misses += 1
+            return self.MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (value, time() + ttl)
+        self._entries.move_to_end(key)
         if self.size_limit is not None:
-            while len(self) > self.size_limit:
-                self.popitem(last=False)
+            while len(self._entries) > self.size_limit:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -15,9 +15,12 @@
 ############
 
 import mock
+import psycopg2
+import unittest
 from uuid import uuid4
 from time import sleep
 from dateutil import parser as date_parser
+from prometheus_client import REGISTRY
 
 from cloudify.models_states import VisibilityState
 
@@ -27,7 +30,14 @@ from manager_rest.amqp_manager import AMQPManager
 from manager_rest.utils import get_formatted_timestamp
 from manager_rest.test.base_test import BaseServerTestCase
 
-from amqp_postgres.postgres_publisher import BATCH_DELAY, DBLogEventPublisher
+from amqp_postgres import benchmark
+from amqp_postgres.postgres_publisher import (
+    BATCH_DELAY,
+    EVENTS_NOTIFICATION_CHANNEL,
+    DBLogEventPublisher,
+    DBLogEventPublisherPool,
+    ExecutionsCache,
+)
 
 LOG_MESSAGE = 'cloudify-logs'
 EVENT_MESSAGE = 'cloudify-events-topic'
@@ -37,10 +47,13 @@ class TestAMQPPostgres(BaseServerTestCase):
     def setUp(self):
         super(TestAMQPPostgres, self).setUp()
         self._mock_amqp_conn = mock.Mock()
-        self.db_publisher = DBLogEventPublisher(
-            self.server_configuration, self._mock_amqp_conn)
+        self.db_publisher = self._create_publisher()
         self.db_publisher.start()
 
+    def _create_publisher(self):
+        return DBLogEventPublisher(
+            self.server_configuration, self._mock_amqp_conn)
+
     def publish_messages(self, messages):
         for message, message_type in messages:
             self.db_publisher.process(message, message_type, 0)
@@ -67,6 +80,18 @@ class TestAMQPPostgres(BaseServerTestCase):
         self._assert_log(log, db_log)
         self._assert_event(event, db_event)
 
+    def test_insert_special_characters(self):
+        execution_id = str(uuid4())
+        self._create_execution(execution_id)
+
+        log = self._get_log(execution_id, message='a\tb\nc\r\\N\\')
+        self.publish_messages([
+            (log, LOG_MESSAGE)
+        ])
+
+        db_log = self._get_db_element(models.Log)
+        self._assert_log(log, db_log)
+
     def test_missing_execution(self):
         execution_id = str(uuid4())
         self._create_execution(execution_id)
@@ -100,6 +125,48 @@ class TestAMQPPostgres(BaseServerTestCase):
 
         self._assert_log(log_2, execution_2_logs[0])
 
+    def test_metrics(self):
+        def _sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        execution_id = str(uuid4())
+        self._create_execution(execution_id)
+        dropped_before = _sample('amqp_postgres_dropped_messages_total',
+                                 reason='no_execution')
+        batches_before = _sample('amqp_postgres_batch_size_count')
+
+        self.publish_messages([
+            (self._get_log(execution_id), LOG_MESSAGE),
+            (self._get_log(str(uuid4())), LOG_MESSAGE),
+        ])
+
+        self.assertEqual(
+            _sample('amqp_postgres_dropped_messages_total',
+                    reason='no_execution'),
+            dropped_before + 1)
+        self.assertGreater(_sample('amqp_postgres_batch_size_count'),
+                           batches_before)
+        self.assertEqual(_sample('amqp_postgres_backlog'), 0)
+
+    def test_notify_stored(self):
+        execution_id = str(uuid4())
+        self._create_execution(execution_id)
+        execution = self.sm.get(models.Execution, execution_id)
+
+        conn = psycopg2.connect(instance.db_url)
+        self.addCleanup(conn.close)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute('LISTEN {0}'.format(EVENTS_NOTIFICATION_CHANNEL))
+
+        self.publish_messages([
+            (self._get_event(execution_id), EVENT_MESSAGE),
+            (self._get_log(execution_id), LOG_MESSAGE),
+        ])
+        conn.poll()
+        payloads = {notify.payload for notify in conn.notifies}
+        self.assertEqual(payloads, {str(execution._storage_id)})
+
     @staticmethod
     def _get_amqp_manager():
         return AMQPManager(
@@ -206,3 +273,96 @@ class TestAMQPPostgres(BaseServerTestCase):
             },
             'timestamp': get_formatted_timestamp()
         }
+
+
+class TestBenchmark(BaseServerTestCase):
+    def test_run_benchmark(self):
+        execution_ids = benchmark.create_executions(3)
+        results = benchmark.run_benchmark(
+            execution_ids, messages=50, events_ratio=0.2, timeout=5)
+        self.assertEqual(results['acked'], 50)
+        self.assertIsNotNone(results['latency_p99'])
+        self.assertIn('rss_growth_mb', results)
+        self.assertEqual(len(self.sm.list(models.Event)), 10)
+        self.assertEqual(len(self.sm.list(models.Log)), 40)
+
+        benchmark.delete_executions(execution_ids)
+        self.assertEqual(len(self.sm.list(models.Log)), 0)
+
+
+class TestAMQPPostgresCopy(TestAMQPPostgres):
+    """Run the same tests, but store the batches using COPY"""
+    def setUp(self):
+        self.server_configuration.amqp_postgres_use_copy = True
+        self.addCleanup(delattr, self.server_configuration,
+                        'amqp_postgres_use_copy')
+        super(TestAMQPPostgresCopy, self).setUp()
+
+
+class TestAMQPPostgresPool(TestAMQPPostgres):
+    """Run the same tests, but with several publishers"""
+    def _create_publisher(self):
+        return DBLogEventPublisherPool(
+            self.server_configuration, self._mock_amqp_conn, workers=3)
+
+    def test_insert_many_executions(self):
+        execution_ids = [str(uuid4()) for _ in range(6)]
+        for execution_id in execution_ids:
+            self._create_execution(execution_id)
+
+        messages = []
+        for msg_num in range(5):
+            for execution_id in execution_ids:
+                messages.append((
+                    self._get_log(execution_id, message=str(msg_num)),
+                    LOG_MESSAGE
+                ))
+        self.publish_messages(messages)
+
+        for execution_id in execution_ids:
+            logs = self.sm.list(
+                models.Log,
+                filters={'execution_id': execution_id},
+                sort={'_storage_id': 'asc'},
+            )
+            self.assertEqual([log.message for log in logs],
+                             [str(msg_num) for msg_num in range(5)])
+        self.assertEqual(self._mock_amqp_conn.acks_queue.put.call_count,
+                         len(messages))
+
+
+class TestExecutionsCache(unittest.TestCase):
+    def test_lru(self):
+        cache = ExecutionsCache(size_limit=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        # b was the least recently used
+        self.assertIs(cache.get('b'), ExecutionsCache.MISSING)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        cache = ExecutionsCache(ttl=10, negative_ttl=1)
+        with mock.patch('amqp_postgres.postgres_publisher.time',
+                        return_value=100):
+            cache.set('a', 1)
+            cache.set('b', None)
+        with mock.patch('amqp_postgres.postgres_publisher.time',
+                        return_value=105):
+            self.assertEqual(cache.get('a'), 1)
+            self.assertIs(cache.get('b'), ExecutionsCache.MISSING)
+        with mock.patch('amqp_postgres.postgres_publisher.time',
+                        return_value=111):
+            self.assertIs(cache.get('a'), ExecutionsCache.MISSING)
+
+    def test_counters(self):
+        cache = ExecutionsCache()
+        cache.get('a')
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('a')
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 1)
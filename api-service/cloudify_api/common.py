@@ -14,6 +14,10 @@ async def make_db_session(request: Request) -> AsyncSession:
         yield session
 
 
+def make_streaming_response(data: str) -> bytes:
+    return f"{data}\n\n".encode('utf-8', errors='ignore')
+
+
 class CommonParameters(BaseModel):
     order_by: str | None = None
     desc: bool = False
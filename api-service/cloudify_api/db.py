@@ -6,7 +6,12 @@ from sqlalchemy.ext.asyncio import (create_async_engine,
 from sqlalchemy.orm import sessionmaker
 
 from manager_rest.storage.management_models import Tenant  # noqa
-from manager_rest.storage.resource_models import AuditLog  # noqa
+from manager_rest.storage.resource_models import (  # noqa
+    AuditLog,
+    Event,
+    Execution,
+    Log,
+)
 
 
 def engine(database_dsn: str, connect_args: Dict) -> AsyncEngine:
@@ -5,6 +5,9 @@ import logging
 import asyncpg
 
 NOTIFICATION_CHANNEL = 'audit_log_inserted'
+# sent by amqp-postgres, with the _storage_id of the execution that had
+# logs & events stored
+EVENTS_NOTIFICATION_CHANNEL = 'events_inserted'
 
 
 class ListenerException(Exception):
@@ -28,6 +31,7 @@ class Listener:
         self.conn_listen = None
         self.channels = {}
         self._loop = None
+        self._connect_lock = asyncio.Lock()
 
     @property
     def loop(self):
@@ -65,8 +69,10 @@ class Listener:
                              "removed from channel %s.", queue, channel)
 
     async def _listener(self, channel: str):
-        if not self.conn_listen:
-            self.conn_listen = await asyncpg.connect(self.dsn)
+        # all the channels share a single connection
+        async with self._connect_lock:
+            if not self.conn_listen:
+                self.conn_listen = await asyncpg.connect(self.dsn)
 
         await self.conn_listen.add_listener(
             channel,
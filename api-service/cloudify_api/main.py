@@ -1,7 +1,11 @@
 import pkg_resources
 
 import cloudify_api
-from cloudify_api.routers import audit as audit_router, health as health_router
+from cloudify_api.listener import (EVENTS_NOTIFICATION_CHANNEL,
+                                   NOTIFICATION_CHANNEL)
+from cloudify_api.routers import (audit as audit_router,
+                                  events as events_router,
+                                  health as health_router)
 
 DEBUG = False
 
@@ -15,6 +19,7 @@ def create_application() -> cloudify_api.CloudifyAPI:
     )
     application.configure()
     application.include_router(audit_router, prefix="/api/v3.1")
+    application.include_router(events_router, prefix="/api/v3.1")
     application.include_router(health_router)
     return application
 
@@ -25,4 +30,5 @@ app = create_application()
 @app.on_event("startup")
 async def startup_event():
     app.logger.debug("Handling startup process for %s", app)
-    app.listener.listen()
+    app.listener.listen(NOTIFICATION_CHANNEL)
+    app.listener.listen(EVENTS_NOTIFICATION_CHANNEL)
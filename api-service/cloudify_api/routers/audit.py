@@ -5,11 +5,13 @@ from typing import Sequence
 from fastapi import APIRouter, Depends, status
 from fastapi.exceptions import HTTPException
 from fastapi.responses import StreamingResponse
-from pydantic import parse_obj_as
-from sqlalchemy import delete, select
+from sqlalchemy import delete, or_, select
 
 from cloudify_api import db, CloudifyAPI
-from cloudify_api.common import common_parameters, get_app, make_db_session
+from cloudify_api.common import (common_parameters,
+                                 get_app,
+                                 make_db_session,
+                                 make_streaming_response)
 from cloudify_api.listener import NOTIFICATION_CHANNEL
 from cloudify_api.models import (AuditLog,
                                  DeletedResult,
@@ -89,42 +91,51 @@ async def truncate_audit_log(
     return await DeletedResult.executed(session, stmt)
 
 
+async def _fetch_audit_logs(app: CloudifyAPI,
+                            ranges: list[list[int]]) -> Sequence[db.AuditLog]:
+    """Fetch the audit log entries with _storage_id in the given ranges"""
+    query = select(db.AuditLog).where(or_(*[
+        db.AuditLog._storage_id.between(first_id, last_id)
+        for first_id, last_id in ranges
+    ])).order_by(db.AuditLog._storage_id)
+    async with app.db_session_maker() as session:
+        result = await session.execute(query)
+    return result.scalars().all()
+
+
 async def audit_log_streamer(app: CloudifyAPI,
                              params: SelectParams,
                              queue: asyncio.Queue,
                              ) -> Sequence[bytes]:
     streamed_ids = set()
 
-    if params.since is not None:
-        query = select(db.AuditLog)\
-            .order_by('created_at')\
-            .where(*params.as_filters())
-        async with app.db_session_maker() as session:
-            db_records = await session.execute(query)
-        for db_record in db_records.scalars().all():
-            record = AuditLog.from_orm(db_record)
-            yield make_streaming_response(record.json(exclude_none=True))
-            streamed_ids.add(record.id)
-    while True:
-        try:
+    try:
+        if params.since is not None:
+            query = select(db.AuditLog)\
+                .order_by('created_at')\
+                .where(*params.as_filters())
+            async with app.db_session_maker() as session:
+                db_records = await session.execute(query)
+            for db_record in db_records.scalars().all():
+                record = AuditLog.from_orm(db_record)
+                yield make_streaming_response(record.json(exclude_none=True))
+                streamed_ids.add(record.id)
+        while True:
+            # the notifications only contain the _storage_id ranges of the
+            # entries inserted by a single statement
             data = await queue.get()
-        except asyncio.CancelledError:
-            app.listener.remove_queue(NOTIFICATION_CHANNEL, queue)
-            break
-        record: AuditLog = parse_obj_as(AuditLog, data)
-        if not record.matches(params):
-            continue
-        await record.update_ref_identifier_tenant_name(
-                app.get_tenant_name)
-
-        yield make_streaming_response(record.json(exclude_none=True))
-        if not queue.empty():
-            streamed_ids.add(record.id)
-        else:
-            # At this point we can be sure, that the new streamed records do
-            # not duplicate records retrieved in the previous loop
-            streamed_ids.clear()
-
-
-def make_streaming_response(data: str) -> bytes:
-    return f"{data}\n\n".encode('utf-8', errors='ignore')
+            for db_record in await _fetch_audit_logs(app, data['ranges']):
+                record = AuditLog.from_orm(db_record)
+                if record.id in streamed_ids or not record.matches(params):
+                    continue
+                await record.update_ref_identifier_tenant_name(
+                        app.get_tenant_name)
+
+                yield make_streaming_response(
+                    record.json(exclude_none=True))
+            if queue.empty():
+                # At this point we can be sure, that the new streamed records
+                # do not duplicate records retrieved in the previous loop
+                streamed_ids.clear()
+    finally:
+        app.listener.remove_queue(NOTIFICATION_CHANNEL, queue)
@@ -0,0 +1,233 @@
+import asyncio
+import json
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Header, status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, desc, literal_column, null, or_, select
+from sqlalchemy import type_coerce, union_all
+
+from cloudify.models_states import ExecutionState, VisibilityState
+from manager_rest import manager_exceptions
+from manager_rest.constants import CLOUDIFY_TENANT_HEADER
+from manager_rest.storage import events_cursor
+
+from cloudify_api import db, CloudifyAPI
+from cloudify_api.common import get_app, make_streaming_response
+from cloudify_api.listener import EVENTS_NOTIFICATION_CHANNEL
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+# how many events to fetch from the db at once
+FETCH_SIZE = 1000
+# check for new events, and whether the execution has ended, at least this
+# often (seconds), even if no notifications were received. This also
+# catches events that were not stored by amqp-postgres, eg. ones sent
+# to the REST API directly.
+POLL_INTERVAL = 5
+
+EVENT_COLUMNS = [
+    'timestamp',
+    'reported_timestamp',
+    'message',
+    'message_code',
+    'event_type',
+    'error_causes',
+    'logger',
+    'level',
+    'operation',
+    'node_id',
+    'source_id',
+    'target_id',
+    'manager_name',
+    'agent_name',
+]
+
+
+def _select_events(model, execution_fk: int, cursor):
+    def column(name):
+        if hasattr(model, name):
+            return getattr(model, name).label(name)
+        return null().label(name)
+
+    event_type = f'cloudify_{model.__name__.lower()}'
+    query = select(
+        type_coerce(model.timestamp, DateTime).label('cursor_timestamp'),
+        model._storage_id,
+        literal_column(f"'{event_type}'").label('type'),
+        *[column(name) for name in EVENT_COLUMNS],
+    ).where(model._execution_fk == execution_fk)
+    if cursor:
+        query = query.where(*events_cursor.after_cursor(model, cursor))
+    return query
+
+
+async def _fetch_events(app: CloudifyAPI, execution_fk: int, cursor):
+    """Fetch the events and logs of the execution that follow the cursor"""
+    # events first, because the column types of the union are taken
+    # from the first select
+    subqueries = [
+        _select_events(db.Event, execution_fk, cursor),
+        _select_events(db.Log, execution_fk, cursor),
+    ]
+    query = union_all(*subqueries).subquery()
+    query = select(query).order_by(
+        query.c.cursor_timestamp, query.c._storage_id, query.c.type,
+    ).limit(FETCH_SIZE)
+    async with app.db_session_maker() as session:
+        result = await session.execute(query)
+    return result.all()
+
+
+async def _last_cursor(app: CloudifyAPI, execution_fk: int):
+    """The sort key of the last stored event or log of the execution"""
+    last = None
+    async with app.db_session_maker() as session:
+        for model in [db.Event, db.Log]:
+            query = select(
+                type_coerce(model.timestamp, DateTime),
+                model._storage_id,
+            ).where(model._execution_fk == execution_fk).order_by(
+                desc(model.timestamp), desc(model._storage_id),
+            ).limit(1)
+            row = (await session.execute(query)).first()
+            if row is None:
+                continue
+            key = (*row, f'cloudify_{model.__name__.lower()}')
+            if last is None or key > last:
+                last = key
+    return last
+
+
+async def _get_execution(app: CloudifyAPI,
+                         execution_id: str,
+                         tenant_name: str | None):
+    query = select(db.Execution).join(db.Execution.tenant).where(
+        db.Execution.id == execution_id,
+        or_(
+            db.Tenant.name == tenant_name,
+            db.Execution.visibility == VisibilityState.GLOBAL,
+        ),
+    )
+    async with app.db_session_maker() as session:
+        result = await session.execute(query)
+    return result.scalars().first()
+
+
+def _event_record(row, execution_id: str) -> dict:
+    record = {
+        'type': row.type,
+        'execution_id': execution_id,
+        'cursor': events_cursor.encode_cursor(
+            row.cursor_timestamp, row._storage_id, row.type),
+    }
+    for name in EVENT_COLUMNS:
+        record[name] = getattr(row, name)
+    # node_id of events and logs is actually the node instance id
+    record['node_instance_id'] = record.pop('node_id')
+    if row.type == 'cloudify_event':
+        del record['logger']
+        del record['level']
+    else:
+        del record['event_type']
+        del record['error_causes']
+    return record
+
+
+@router.get("/stream")
+async def stream_events(
+        execution_id: str,
+        cursor: str | None = None,
+        tenant: str | None = Header(default=None,
+                                    alias=CLOUDIFY_TENANT_HEADER),
+        app=Depends(get_app),
+) -> StreamingResponse:
+    """Stream the events and logs of an execution, as they are stored.
+
+    Without a cursor, only the events stored from now on are streamed.
+    With a cursor (eg. the `next_cursor` returned when listing events,
+    or the `cursor` of the last streamed event), the events following
+    it are streamed first. Pass an empty cursor to stream all the events
+    of the execution. The stream ends after the execution has ended,
+    and all its events were streamed.
+    """
+    app.logger.debug("Handling stream_events request, execution_id=%s",
+                     execution_id)
+    try:
+        # an empty cursor decodes to None as well, but it means that all
+        # the events are streamed, so keep the raw parameter to tell
+        after = events_cursor.decode_cursor(cursor)
+    except manager_exceptions.BadParametersError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    execution = await _get_execution(app, execution_id, tenant)
+    if execution is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Execution not found: {execution_id}")
+    if cursor is None:
+        after = await _last_cursor(app, execution._storage_id)
+
+    queue = asyncio.Queue()
+    app.listener.attach_queue(EVENTS_NOTIFICATION_CHANNEL, queue)
+    headers = {"Content-Type": "text/event-stream"}
+    return StreamingResponse(
+        events_streamer(app, execution, after, queue),
+        headers=headers)
+
+
+async def events_streamer(app: CloudifyAPI,
+                          execution: db.Execution,
+                          cursor,
+                          queue: asyncio.Queue,
+                          ) -> AsyncIterator[bytes]:
+    execution_fk = execution._storage_id
+    try:
+        while True:
+            rows = await _fetch_events(app, execution_fk, cursor)
+            for row in rows:
+                record = _event_record(row, execution.id)
+                yield make_streaming_response(
+                    json.dumps(record, default=str))
+            if rows:
+                last = rows[-1]
+                cursor = (last.cursor_timestamp, last._storage_id, last.type)
+            if len(rows) == FETCH_SIZE:
+                continue
+
+            if await _execution_ended(app, execution_fk):
+                # the execution's events might've been stored after
+                # the last fetch, but before it ended
+                rows = await _fetch_events(app, execution_fk, cursor)
+                if not rows:
+                    break
+                continue
+            await _wait_for_events(queue, execution_fk)
+    finally:
+        app.listener.remove_queue(EVENTS_NOTIFICATION_CHANNEL, queue)
+
+
+async def _execution_ended(app: CloudifyAPI, execution_fk: int) -> bool:
+    query = select(db.Execution.status)\
+        .where(db.Execution._storage_id == execution_fk)
+    async with app.db_session_maker() as session:
+        result = await session.execute(query)
+    status = result.scalars().first()
+    return status is None or status in ExecutionState.END_STATES
+
+
+async def _wait_for_events(queue: asyncio.Queue, execution_fk: int):
+    """Wait until events of the execution are stored, or POLL_INTERVAL"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + POLL_INTERVAL
+    while (timeout := deadline - loop.time()) > 0:
+        try:
+            notified_fk = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return
+        if notified_fk == execution_fk:
+            # skip the notifications that were already queued
+            while not queue.empty():
+                queue.get_nowait()
+            return
@@ -0,0 +1,151 @@
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+from manager_rest.storage import events_cursor
+
+from cloudify_api.listener import EVENTS_NOTIFICATION_CHANNEL
+from cloudify_api.routers import events
+from cloudify_api.routers.events import (
+    EVENT_COLUMNS,
+    _event_record,
+    events_streamer,
+    stream_events,
+)
+
+
+def _row(**kwargs):
+    columns = {name: None for name in EVENT_COLUMNS}
+    columns.update(kwargs)
+    return SimpleNamespace(**columns)
+
+
+def test_event_record():
+    timestamp = datetime(2023, 1, 1, 12, 0, 0, 123456)
+    row = _row(
+        cursor_timestamp=timestamp,
+        _storage_id=42,
+        type='cloudify_event',
+        event_type='task_started',
+        node_id='node1_abcdef',
+    )
+    record = _event_record(row, 'exc1')
+    assert record['execution_id'] == 'exc1'
+    assert record['event_type'] == 'task_started'
+    assert record['node_instance_id'] == 'node1_abcdef'
+    assert 'node_id' not in record
+    assert 'logger' not in record
+    assert events_cursor.decode_cursor(record['cursor']) == \
+        (timestamp, 42, 'cloudify_event')
+
+
+def test_log_record():
+    row = _row(
+        cursor_timestamp=datetime(2023, 1, 1),
+        _storage_id=1,
+        type='cloudify_log',
+        level='info',
+        message='hello',
+    )
+    record = _event_record(row, 'exc1')
+    assert record['level'] == 'info'
+    assert record['message'] == 'hello'
+    assert 'event_type' not in record
+    assert 'error_causes' not in record
+
+
+class _FakeDB(object):
+    """The events of a single execution, and whether it has ended"""
+    def __init__(self, rows, ended=False):
+        self.rows = rows
+        self.ended = ended
+
+    async def fetch_events(self, app, execution_fk, cursor):
+        return [
+            row for row in self.rows
+            if cursor is None
+            or (row.cursor_timestamp, row._storage_id, row.type) > cursor
+        ]
+
+    async def execution_ended(self, app, execution_fk):
+        return self.ended
+
+
+def _event_row(second):
+    return _row(
+        cursor_timestamp=datetime(2023, 1, 1, 12, 0, second),
+        _storage_id=second,
+        type='cloudify_event',
+        message=f'event {second}',
+    )
+
+
+def _stream(fake_db, cursor, on_record=None):
+    """Run events_streamer, and return the messages it streamed"""
+    app = mock.Mock()
+    queue = asyncio.Queue()
+    execution = SimpleNamespace(_storage_id=1, id='exc1')
+
+    async def _consume():
+        messages = []
+        async for data in events_streamer(app, execution, cursor, queue):
+            messages.append(json.loads(data)['message'])
+            if on_record:
+                on_record(queue)
+        return messages
+
+    with mock.patch.object(events, '_fetch_events', fake_db.fetch_events), \
+            mock.patch.object(events, '_execution_ended',
+                              fake_db.execution_ended):
+        messages = asyncio.run(_consume())
+    app.listener.remove_queue.assert_called_once_with(
+        EVENTS_NOTIFICATION_CHANNEL, queue)
+    return messages
+
+
+def test_stream_from_cursor():
+    rows = [_event_row(1), _event_row(2), _event_row(3)]
+    cursor = (rows[0].cursor_timestamp, rows[0]._storage_id, rows[0].type)
+    messages = _stream(_FakeDB(rows, ended=True), cursor)
+    assert messages == ['event 2', 'event 3']
+
+
+def test_stream_from_empty_cursor():
+    rows = [_event_row(1), _event_row(2), _event_row(3)]
+    messages = _stream(_FakeDB(rows, ended=True), None)
+    assert messages == ['event 1', 'event 2', 'event 3']
+
+
+def test_stream_ends_with_execution():
+    fake_db = _FakeDB([_event_row(1)])
+
+    def _on_record(queue):
+        if len(fake_db.rows) == 1:
+            # the last event is stored, and then the execution ends
+            fake_db.rows.append(_event_row(2))
+            fake_db.ended = True
+            queue.put_nowait(1)
+
+    messages = _stream(fake_db, None, on_record=_on_record)
+    assert messages == ['event 1', 'event 2']
+
+
+@mock.patch.object(events, 'events_streamer')
+@mock.patch.object(events, '_last_cursor')
+@mock.patch.object(events, '_get_execution')
+def test_stream_events_cursor(get_execution, last_cursor, streamer):
+    get_execution.return_value = SimpleNamespace(_storage_id=1, id='exc1')
+    last_cursor.return_value = (datetime(2023, 1, 1), 5, 'cloudify_log')
+    app = mock.Mock()
+
+    # without a cursor, only the events stored from now on are streamed
+    asyncio.run(stream_events('exc1', None, None, app))
+    assert streamer.call_args[0][2] == last_cursor.return_value
+
+    # with an empty cursor, all of them are
+    last_cursor.reset_mock()
+    asyncio.run(stream_events('exc1', '', None, app))
+    last_cursor.assert_not_called()
+    assert streamer.call_args[0][2] is None
@@ -1,15 +1,21 @@
 import time
+import heapq
+import select
 import logging
 import argparse
 
 import dateutil.parser
+import psycopg2
 from contextlib import contextmanager
 from datetime import datetime, timedelta
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 from cloudify.models_states import ExecutionState
 
 from manager_rest import config, workflow_executor
-from manager_rest.storage import models
+from manager_rest.storage import (events_partitions,
+                                  models,
+                                  operations_counts)
 from manager_rest.flask_utils import setup_flask_app, query_service_settings
 from manager_rest.maintenance import get_maintenance_state
 from manager_rest.constants import MAINTENANCE_MODE_ACTIVATED
@@ -21,42 +27,273 @@ from manager_rest.storage.storage_utils import (try_acquire_lock_on_table,
 
 logger = logging.getLogger(__name__)
 DEFAULT_INTERVAL = 60
+# even when notifications about schedule changes are received, re-read
+# all the schedules this often, in case a notification was missed
+REFRESH_INTERVAL = 600
+NOTIFICATION_CHANNEL = 'execution_schedules_changed'
 SCHEDULER_LOCK_BASE = 10000
 # so we won't conflict with usage collector, which uses lock numbers 1 and 2
+PARTITION_LOCK_BASE = 9000
+MEMBER_LOCK = PARTITION_LOCK_BASE - 1
+MAX_PARTITIONS = SCHEDULER_LOCK_BASE - PARTITION_LOCK_BASE
+# how often to rebalance the partitions between the schedulers
+LEASE_INTERVAL = 30
+# how often to create the upcoming events partitions, and drop expired ones
+EVENTS_PARTITIONS_INTERVAL = 3600
+# how often to fold the executions' pending operations counts changes.
+# Reading executions via the REST API adds the pending changes, but other
+# readers (eg. the deployments' latest_execution_finished_operations)
+# only see the folded counts
+OPERATIONS_COUNTS_INTERVAL = 10
 
 DEFAULT_LOG_PATH = '/var/log/cloudify/execution-scheduler/scheduler.log'
 
 
-class LoopTimer(object):
-    def __init__(self, interval=DEFAULT_INTERVAL):
-        self.interval = interval
+class ScheduleQueue(object):
+    """A min-heap of the upcoming occurrences of the enabled schedules.
 
-    def __enter__(self):
-        self.time = datetime.now()
-        return self
+    Entries are (next_occurrence, schedule _storage_id) tuples.
+    """
+    def __init__(self):
+        self._heap = []
 
-    def __exit__(self, type, value, traceback):
-        delta = (datetime.now() - self.time).total_seconds()
-        self.seconds_wait = (self.interval - delta) % self.interval
+    def __len__(self):
+        return len(self._heap)
 
+    def refresh(self, leases=None):
+        """Re-read the next occurrences of all enabled schedules
 
-def check_schedules():
+        :param leases: if given, only read the schedules of the partitions
+            these PartitionLeases hold
+        """
+        query = (
+            db.session.query(
+                models.ExecutionSchedule._storage_id,
+                models.ExecutionSchedule.next_occurrence,
+            )
+            .filter_by(enabled=True)
+            .filter(models.ExecutionSchedule.next_occurrence.isnot(None))
+        )
+        if leases is not None:
+            query = query.filter(
+                (models.ExecutionSchedule._storage_id % leases.partitions)
+                .in_(leases.owned)
+            )
+        rows = query.all()
+        db.session.rollback()
+        self._heap = [
+            (_parse_occurrence(next_occurrence), storage_id)
+            for storage_id, next_occurrence in rows
+        ]
+        heapq.heapify(self._heap)
+        logger.debug('Refreshed schedules: %d enabled', len(self._heap))
+
+    def push(self, storage_id, next_occurrence):
+        heapq.heappush(
+            self._heap, (_parse_occurrence(next_occurrence), storage_id))
+
+    def pop_due(self, now=None):
+        """Remove and return the ids of all schedules that are due"""
+        now = now or datetime.utcnow()
+        due = set()
+        while self._heap and self._heap[0][0] <= now:
+            due.add(heapq.heappop(self._heap)[1])
+        return due
+
+    def seconds_until_next(self, now=None):
+        """Seconds until the next schedule is due, or None if there's none"""
+        if not self._heap:
+            return None
+        now = now or datetime.utcnow()
+        return max((self._heap[0][0] - now).total_seconds(), 0)
+
+
+class ScheduleChangesListener(object):
+    """LISTEN for notifications about changes to the schedules.
+
+    The notifications are sent by a trigger on the execution_schedules
+    table, so they are sent no matter which manager changed the schedules.
+    """
+    def __init__(self, dsn, channel=NOTIFICATION_CHANNEL):
+        self._dsn = dsn
+        self._channel = channel
+        self._conn = None
+
+    def _connect(self):
+        conn = psycopg2.connect(self._dsn)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute('LISTEN {0}'.format(self._channel))
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def wait(self, timeout, ignore_pid=None):
+        """Wait up to timeout seconds for a notification.
+
+        Return True if a notification was received, or if the connection
+        failed - in which case the schedules must be re-read anyway.
+
+        :param ignore_pid: ignore the notifications sent by this db
+            backend, ie. about the scheduler's own changes
+        """
+        try:
+            if self._conn is None:
+                self._connect()
+            if select.select([self._conn], [], [], timeout) == ([], [], []):
+                return False
+            self._conn.poll()
+        except (psycopg2.Error, OSError) as e:
+            logger.warning('Error listening for schedule changes: %s', e)
+            self.close()
+            time.sleep(min(timeout, DEFAULT_INTERVAL))
+            return True
+        notified = any(
+            notify.pid != ignore_pid for notify in self._conn.notifies)
+        self._conn.notifies.clear()
+        return notified
+
+
+class PartitionLeases(object):
+    """Leases on partitions of the schedules, to spread them between managers.
+
+    Schedules are split into partitions by their _storage_id, modulo the
+    number of partitions, and each scheduler only handles the partitions
+    it holds a lease on. A lease is a session-level advisory lock, held on
+    a dedicated connection, so that when a scheduler (or its connection)
+    dies, its leases are released, and other schedulers take them over.
+
+    Every scheduler also holds a shared "member" lock, so that the number
+    of running schedulers is known, and each can take its fair share.
+    All the schedulers in a cluster must use the same number of partitions.
+    """
+    MEMBERS_QUERY = """
+        SELECT count(DISTINCT pid)
+        FROM pg_locks
+        WHERE locktype = 'advisory'
+            AND classid = 0
+            AND objid = %s
+            AND objsubid = 1
+            AND granted
+    """
+
+    def __init__(self, dsn, partitions):
+        if not 0 < partitions <= MAX_PARTITIONS:
+            raise ValueError(
+                f'Number of partitions must be between 1 and '
+                f'{MAX_PARTITIONS}, got {partitions}')
+        self._dsn = dsn
+        self.partitions = partitions
+        self.owned = set()
+        self._conn = None
+
+    def _connect(self):
+        conn = psycopg2.connect(self._dsn)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_advisory_lock_shared(%s)', (MEMBER_LOCK, ))
+        self._conn = conn
+
+    def close(self):
+        self.owned = set()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def rebalance(self):
+        """Take or give up leases, so that every scheduler has a fair share.
+
+        Partitions beyond the fair share are released, and then free
+        partitions are taken, up to the fair share. Released partitions
+        will be taken by other schedulers when they rebalance.
+
+        :return: whether the owned partitions have changed
+        """
+        owned_before = set(self.owned)
+        try:
+            if self._conn is None:
+                self._connect()
+            with self._conn.cursor() as cur:
+                cur.execute(self.MEMBERS_QUERY, (MEMBER_LOCK, ))
+                members = cur.fetchone()[0] or 1
+                fair_share = -(-self.partitions // members)
+
+                for partition in sorted(self.owned)[fair_share:]:
+                    cur.execute('SELECT pg_advisory_unlock(%s)',
+                                (PARTITION_LOCK_BASE + partition, ))
+                    self.owned.discard(partition)
+
+                for partition in range(self.partitions):
+                    if len(self.owned) >= fair_share:
+                        break
+                    if partition in self.owned:
+                        continue
+                    cur.execute('SELECT pg_try_advisory_lock(%s)',
+                                (PARTITION_LOCK_BASE + partition, ))
+                    if cur.fetchone()[0]:
+                        self.owned.add(partition)
+        except (psycopg2.Error, OSError) as e:
+            logger.warning('Error acquiring schedule partitions: %s', e)
+            self.close()
+
+        if self.owned != owned_before:
+            logger.info('Handling schedule partitions: %s',
+                        sorted(self.owned))
+            return True
+        return False
+
+
+def _parse_occurrence(occurrence):
+    if isinstance(occurrence, datetime):
+        return occurrence.replace(tzinfo=None)
+    return dateutil.parser.parse(occurrence, ignoretz=True)
+
+
+def _session_backend_pid():
+    """The pid of the db backend that the scheduler's own updates use"""
+    pid = db.session.execute('SELECT pg_backend_pid()').scalar()
+    db.session.rollback()
+    return pid
+
+
+def check_schedules(storage_ids=None, batch_size=0):
+    """Run the schedules that are due.
+
+    :param storage_ids: only check the schedules with these _storage_ids
+    :param batch_size: if set, run the schedules in batches of this size,
+        see run_batch
+    :return: the schedules that were checked
+    """
     maint_state = get_maintenance_state()
     if maint_state and maint_state['status'] == MAINTENANCE_MODE_ACTIVATED:
         logger.debug("Maintenance mode activated, schedules won't run")
         db.session.rollback()
-        return
+        return []
 
     logger.debug('Checking schedules...')
-    schedules = (
+    query = (
         models.ExecutionSchedule.query
         .filter_by(enabled=True)
         .filter(models.ExecutionSchedule.next_occurrence < datetime.utcnow())
-        .all()
     )
+    if storage_ids is not None:
+        query = query.filter(
+            models.ExecutionSchedule._storage_id.in_(storage_ids))
+    if batch_size:
+        query_service_settings()
+        schedules = []
+        while True:
+            batch = run_batch(query, batch_size)
+            schedules += batch
+            if len(batch) < batch_size:
+                return schedules
+    schedules = query.all()
     if not schedules:
         db.session.rollback()
-        return
+        return []
 
     # before running any schedules, let's see if anything changed in the
     # config, so that we start the executions with the most up-to-date
@@ -64,6 +301,7 @@ def check_schedules():
     query_service_settings()
     for schedule in schedules:
         try_run(schedule)
+    return schedules
 
 
 def try_run(schedule):
@@ -88,6 +326,81 @@ def try_run(schedule):
         db.session.commit()
 
 
+def run_batch(query, batch_size):
+    """Run up to batch_size of the schedules returned by query, at once.
+
+    The schedules are locked using a single SELECT ... FOR UPDATE SKIP
+    LOCKED, so that other schedulers skip them instead of waiting.
+    All the executions are created and prepared in a single transaction,
+    and then sent all together.
+    Note that this doesn't use the per-schedule advisory locks that
+    try_run uses, so all the schedulers in a cluster should use the same
+    mode.
+
+    :return: the schedules that were checked
+    """
+    rm = get_resource_manager()
+    executions_by_arguments = {}
+    messages = []
+    with rm.sm.transaction():
+        schedules = (
+            query
+            .with_for_update(skip_locked=True)
+            .limit(batch_size)
+            .all()
+        )
+        for schedule in schedules:
+            next_occurrence = schedule.compute_next_occurrence()
+            logger.info('Schedule: %s next in %s; old next was %s',
+                        schedule.id, next_occurrence,
+                        schedule.next_occurrence)
+            if should_run(schedule):
+                logger.info('Running: %s', schedule)
+                execution, start_arguments = _make_execution(schedule)
+                rm.sm.put(execution)
+                schedule.latest_execution = execution
+                executions_by_arguments.setdefault(
+                    tuple(sorted(start_arguments.items())), []
+                ).append(execution)
+            schedule.next_occurrence = next_occurrence
+        db.session.flush()
+
+        chunk_size = config.instance.default_page_size
+        for start_arguments, executions in executions_by_arguments.items():
+            for i in range(0, len(executions), chunk_size):
+                messages += _prepare_executions(
+                    rm, executions[i:i + chunk_size], dict(start_arguments))
+    workflow_executor.execute_workflow(messages)
+    return schedules
+
+
+def _prepare_executions(rm, executions, start_arguments):
+    try:
+        with db.session.begin_nested():
+            return rm.prepare_executions(
+                executions, commit=False, **start_arguments)
+    except Exception as e:
+        logger.error('Error preparing scheduled executions: %s', e)
+
+    # prepare_executions only raises after going through the whole batch,
+    # so the successful executions were already prepared, and the
+    # component executions of the cascading ones created. All of that
+    # was rolled back to the savepoint, so prepare them one by one
+    messages = []
+    for execution in executions:
+        try:
+            with db.session.begin_nested():
+                messages += rm.prepare_executions(
+                    [execution], commit=False, **start_arguments)
+        except Exception as e:
+            logger.error(
+                f'{e} for execution of deployment {execution.deployment.id}'
+            )
+            execution.status = ExecutionState.FAILED
+            execution.error = f'Error preparing execution: {e}'
+    return messages
+
+
 @contextmanager
 def scheduler_lock(lock_number):
     locked = try_acquire_lock_on_table(lock_number)
@@ -114,10 +427,11 @@ def should_run(schedule):
     return datetime.utcnow() - next_occurrence <= slip
 
 
-def execute_workflow(schedule):
-    rm = get_resource_manager()
-    logger.info('Running: %s', schedule)
+def _make_execution(schedule):
+    """Create an execution for the schedule (but don't store it yet).
 
+    :return: the execution, and the arguments for prepare_executions
+    """
     execution_arguments = schedule.execution_arguments or {}
     start_arguments = {'queue': True}
     for start_arg in ('force', 'wait_after_fail'):
@@ -132,6 +446,14 @@ def execute_workflow(schedule):
         status=ExecutionState.PENDING,
         **execution_arguments,
     )
+    return execution, start_arguments
+
+
+def execute_workflow(schedule):
+    rm = get_resource_manager()
+    logger.info('Running: %s', schedule)
+
+    execution, start_arguments = _make_execution(schedule)
     rm.sm.put(execution)
     try:
         messages = rm.prepare_executions([execution], **start_arguments)
@@ -146,11 +468,91 @@ def execute_workflow(schedule):
     return execution
 
 
-def main():
+def maintain_events_partitions():
+    try:
+        created, dropped = events_partitions.maintain_partitions(
+            config.instance.events_retention_days)
+    except Exception as e:
+        logger.error('Error maintaining the events partitions: %s', e)
+        db.session.rollback()
+        return
+    if created:
+        logger.info('Created events partitions: %s', ', '.join(created))
+    if dropped:
+        logger.info('Dropped expired events partitions: %s',
+                    ', '.join(dropped))
+
+
+def fold_operations_counts():
+    try:
+        operations_counts.fold_operations_counts()
+    except Exception as e:
+        logger.error('Error folding the operations counts: %s', e)
+        db.session.rollback()
+
+
+def main(batch_size=0, partitions=0):
+    schedules = ScheduleQueue()
+    listener = ScheduleChangesListener(config.instance.db_url)
+    leases = None
+    if partitions:
+        leases = PartitionLeases(config.instance.db_url, partitions)
+        leases.rebalance()
+    schedules.refresh(leases)
+    next_refresh = time.time() + REFRESH_INTERVAL
+    next_rebalance = time.time() + LEASE_INTERVAL
+    maintain_events_partitions()
+    next_partitions_maintenance = time.time() + EVENTS_PARTITIONS_INTERVAL
+    next_operations_counts = time.time() + OPERATIONS_COUNTS_INTERVAL
+    own_pid = None
     while True:
-        with LoopTimer() as t:
-            check_schedules()
-        time.sleep(t.seconds_wait)
+        due = schedules.pop_due()
+        if due:
+            rescheduled = set()
+            checked = check_schedules(due, batch_size=batch_size)
+            if checked:
+                # running the schedules updated their next_occurrence,
+                # which is already pushed here, so the notifications
+                # about that can be ignored
+                own_pid = _session_backend_pid()
+            for schedule in checked:
+                if schedule.enabled and schedule.next_occurrence and \
+                        _parse_occurrence(schedule.next_occurrence) > \
+                        datetime.utcnow():
+                    schedules.push(schedule._storage_id,
+                                   schedule.next_occurrence)
+                    rescheduled.add(schedule._storage_id)
+            if due - rescheduled:
+                # some schedules didn't run now, eg. because maintenance
+                # mode is active, or another manager is running them:
+                # check them again in a while
+                next_refresh = min(next_refresh,
+                                   time.time() + DEFAULT_INTERVAL)
+
+        timeout = max(next_refresh - time.time(), 0)
+        until_next = schedules.seconds_until_next()
+        if until_next is not None:
+            timeout = min(timeout, until_next)
+        if leases is not None:
+            timeout = min(timeout, max(next_rebalance - time.time(), 0))
+        timeout = min(
+            timeout, max(next_partitions_maintenance - time.time(), 0))
+        timeout = min(timeout, max(next_operations_counts - time.time(), 0))
+        notified = listener.wait(timeout, ignore_pid=own_pid)
+        if time.time() >= next_operations_counts:
+            fold_operations_counts()
+            next_operations_counts = time.time() + OPERATIONS_COUNTS_INTERVAL
+        if time.time() >= next_partitions_maintenance:
+            maintain_events_partitions()
+            next_partitions_maintenance = \
+                time.time() + EVENTS_PARTITIONS_INTERVAL
+        if leases is not None and time.time() >= next_rebalance:
+            if leases.rebalance():
+                notified = True
+            next_rebalance = time.time() + LEASE_INTERVAL
+        if notified or time.time() >= next_refresh:
+            schedules.refresh(leases)
+            next_refresh = time.time() + REFRESH_INTERVAL
 
 
 def cli():
@@ -161,13 +563,21 @@ def cli():
                         help='Path to the log file')
     parser.add_argument('--log-level', dest='loglevel', default='INFO',
                         help='Logging level')
+    parser.add_argument('--batch-size', dest='batch_size', type=int,
+                        default=0,
+                        help='Run due schedules in batches of this size, '
+                             'instead of one by one (0: disabled)')
+    parser.add_argument('--partitions', type=int, default=0,
+                        help='Split the schedules into this many partitions, '
+                             'and spread them between all the schedulers '
+                             'in the cluster (0: disabled)')
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel.upper(),
                         filename=args.logfile,
                         format="%(asctime)s %(message)s")
     logging.getLogger('pika').setLevel(logging.WARNING)
     with setup_flask_app().app_context():
-        main()
+        main(batch_size=args.batch_size, partitions=args.partitions)
 
 
 if __name__ == '__main__':
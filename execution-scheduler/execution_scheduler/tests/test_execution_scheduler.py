@@ -1,5 +1,5 @@
+from contextlib import contextmanager
 from unittest import mock
-import time
 
 from datetime import datetime, timedelta
 from dateutil import parser as date_parser
@@ -8,7 +8,14 @@ from manager_rest import utils
 from manager_rest.storage import models
 from manager_rest.flask_utils import setup_flask_app
 
-from execution_scheduler.main import try_run, should_run, LoopTimer
+from execution_scheduler.main import (
+    try_run,
+    should_run,
+    ScheduleQueue,
+    ScheduleChangesListener,
+    PartitionLeases,
+    _prepare_executions,
+)
 
 
 def _get_mock_schedule(schedule_id='default', next_occurrence=None,
@@ -123,17 +130,102 @@ def test_should_run_slip_shorter_than_downtime():
     assert not should_run(schedule)
 
 
-def test_loop_timer():
-    _assert_loop_interval(3.42, 5)
-    _assert_loop_interval(4.9, 5)
-    _assert_loop_interval(0, 5)
-    _assert_loop_interval(8.6, 10)
-
-
-def _assert_loop_interval(work_time, assert_val, interval=5):
-    a = time.time()
-    with LoopTimer(interval) as t:
-        time.sleep(work_time)  # imitate some job
-    time.sleep(t.seconds_wait)
-    b = time.time()
-    assert round(b - a, 2) == assert_val
+def test_schedule_queue():
+    now = datetime(2023, 1, 1, 12, 0, 0)
+    schedules = ScheduleQueue()
+    assert schedules.seconds_until_next(now) is None
+    schedules.push(1, '2023-01-01T12:00:30.000Z')
+    schedules.push(2, '2023-01-01T11:59:00.000Z')
+    schedules.push(3, now + timedelta(minutes=5))
+    assert schedules.seconds_until_next(now) == 0
+    assert schedules.pop_due(now) == {2}
+    assert schedules.seconds_until_next(now) == 30
+    assert schedules.pop_due(now + timedelta(minutes=10)) == {1, 3}
+    assert len(schedules) == 0
+
+
+class _FakeSession(object):
+    """Just enough of a session to roll back to savepoints"""
+    def __init__(self, executions):
+        self.executions = executions
+        self.added = []
+
+    @contextmanager
+    def begin_nested(self):
+        statuses = [(exc, exc.status) for exc in self.executions]
+        added_count = len(self.added)
+        try:
+            yield
+        except Exception:
+            for exc, status in statuses:
+                exc.status = status
+            del self.added[added_count:]
+            raise
+
+
+@mock.patch('execution_scheduler.main.db')
+def test_prepare_executions_batch_error(mock_db):
+    failed = models.Execution(id='e1', status='pending')
+    failed.deployment = models.Deployment(id='d1')
+    cascading = models.Execution(id='e2', status='pending')
+    session = mock_db.session = _FakeSession([failed, cascading])
+
+    def _prepare(executions, **kwargs):
+        # same as ResourceManager.prepare_executions, only raise the
+        # error after going through all the executions
+        errors, messages = [], []
+        for exc in executions:
+            if exc.id == 'e1':
+                exc.status = 'failed'
+                errors.append(RuntimeError('e1 dependencies are affected'))
+                continue
+            exc.status = 'pending'
+            messages.append({'id': exc.id})
+            session.added.append(
+                models.Execution(id=f'{exc.id}-component', status='pending'))
+        if errors:
+            raise errors[0]
+        return messages
+
+    rm = mock.Mock()
+    rm.prepare_executions.side_effect = _prepare
+    messages = _prepare_executions(rm, [failed, cascading], {'queue': True})
+    assert messages == [{'id': 'e2'}]
+    assert failed.status == 'failed'
+    # the component executions created by the failed batch were rolled back
+    assert [exc.id for exc in session.added] == ['e2-component']
+
+
+@mock.patch('execution_scheduler.main.psycopg2')
+def test_partition_leases_fair_share(mock_psycopg2):
+    cursor = mock_psycopg2.connect().cursor().__enter__()
+    # 2 schedulers are running, and the first partition is already taken
+    cursor.fetchone.side_effect = [(2, ), (False, ), (True, ), (True, )]
+    leases = PartitionLeases('postgresql://', 4)
+    assert leases.rebalance()
+    assert leases.owned == {1, 2}
+
+    # another scheduler died, so this one takes over the rest
+    cursor.fetchone.side_effect = [(1, ), (True, ), (True, )]
+    assert leases.rebalance()
+    assert leases.owned == {0, 1, 2, 3}
+
+    # 3 more schedulers joined, so some partitions are given up
+    cursor.fetchone.side_effect = [(4, )]
+    assert leases.rebalance()
+    assert leases.owned == {0}
+
+
+@mock.patch('execution_scheduler.main.select')
+@mock.patch('execution_scheduler.main.psycopg2')
+def test_listener_ignores_own_changes(mock_psycopg2, mock_select):
+    conn = mock_psycopg2.connect()
+    mock_select.select.return_value = ([conn], [], [])
+    listener = ScheduleChangesListener('postgresql://')
+
+    conn.notifies = [mock.Mock(pid=1)]
+    assert not listener.wait(1, ignore_pid=1)
+    conn.notifies = [mock.Mock(pid=1), mock.Mock(pid=2)]
+    assert listener.wait(1, ignore_pid=1)
+    conn.notifies = [mock.Mock(pid=1)]
+    assert listener.wait(1)
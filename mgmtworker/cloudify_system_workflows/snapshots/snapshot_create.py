@@ -4,7 +4,10 @@ import pathlib
 import queue
 import shutil
 import tempfile
+import threading
+import zipfile
 from collections import defaultdict
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Any
 
@@ -21,7 +24,8 @@ from cloudify_system_workflows.snapshots.ui_clients import (ComposerClient,
 from cloudify_system_workflows.snapshots.utils import (DictToAttributes,
                                                        get_manager_version,
                                                        get_composer_client,
-                                                       get_stage_client)
+                                                       get_stage_client,
+                                                       in_workflow_ctx)
 
 # DUMP_ENTITIES_BATCH_SIZE determines the limit of entities will be put into
 # one dump file.  It should be reasonably high (500 is a good compromise).
@@ -29,6 +33,10 @@ from cloudify_system_workflows.snapshots.utils import (DictToAttributes,
 DUMP_ENTITIES_BATCH_SIZE = 500
 EMPTY_B64_ZIP = 'UEsFBgAAAAAAAAAAAAAAAAAAAAAAAA=='
 DEFAULT_LISTENER_TIMEOUT = 10.0
+# how many tenants are dumped, and how many archives (of blueprints,
+# plugins and deployment workdirs) are downloaded, at the same time,
+# unless configured otherwise with snapshot_create_threads
+DEFAULT_CREATE_THREADS = 1
 
 
 class SnapshotCreate:
@@ -42,8 +50,9 @@ class SnapshotCreate:
     _composer_client: ComposerClient
     _stage_client: StageClient
     _archive_dest: Path
+    _archive: 'SnapshotArchive | None'
     _temp_dir: Path
-    _ids_dumped: dict[str, set[str]]
+    _filenums: dict[Path, int]
 
     def __init__(
             self,
@@ -76,7 +85,19 @@ class SnapshotCreate:
         snapshot_dir = _prepare_snapshot_dir(self._config.file_server_root,
                                              self._snapshot_id)
         self._archive_dest = snapshot_dir / f'{self._snapshot_id}'
+        self._archive = None
         self._temp_dir = _prepare_temp_dir()
+        self._filenums = {}
+
+        # Initialize worker pools
+        threads = int(self._config.get('snapshot_create_threads')
+                      or DEFAULT_CREATE_THREADS)
+        self._tenants_pool = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='snapshot-tenant')
+        self._downloads_pool = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='snapshot-download')
+        # the clients of each download worker, see _download_client
+        self._download_clients = threading.local()
 
         # Initialize tools
         self._agents_handler = Agents()
@@ -92,12 +113,14 @@ class SnapshotCreate:
                          'timeout %.1f seconds', timeout)
         self._auditlog_listener.start(self._tenant_clients)
         try:
+            self._archive = SnapshotArchive(
+                self._archive_dest.with_suffix('.zip'), self._temp_dir)
             self._dump_metadata()
             self._dump_management()
             self._dump_composer()
             self._dump_stage()
-            for tenant_name in self._tenants:
-                self._dump_tenant(tenant_name)
+            self._dump_tenants({tenant_name: None
+                                for tenant_name in self._tenants})
             self._append_from_auditlog(timeout)
             self._create_archive()
             self._upload_archive()
@@ -106,13 +129,28 @@ class SnapshotCreate:
         except BaseException as exc:
             self._update_snapshot_status(self._config.failed_status, str(exc))
             ctx.logger.error(f'Snapshot creation failed: {str(exc)}')
+            # the workers might still be adding files to the archive, so
+            # wait for them to finish before closing and removing it
+            self._shutdown_pools()
+            if self._archive:
+                self._archive.close()
             if os.path.exists(self._archive_dest.with_suffix('.zip')):
                 os.unlink(self._archive_dest.with_suffix('.zip'))
             raise
         finally:
+            self._shutdown_pools()
             ctx.logger.debug(f'Removing temp dir: {self._temp_dir}')
             shutil.rmtree(self._temp_dir)
 
+    def _shutdown_pools(self):
+        """Cancel the pending work, and wait for the running workers.
+
+        The tenants pool goes first, because the tenant workers submit
+        the downloads.
+        """
+        self._tenants_pool.shutdown(cancel_futures=True)
+        self._downloads_pool.shutdown(cancel_futures=True)
+
     def _get_tenants(self):
         return {
             tenant['name']: tenant
@@ -128,8 +166,10 @@ class SnapshotCreate:
             constants.M_VERSION: str(manager_version),
             constants.M_EXECUTION_ID: ctx.execution_id,
         }
-        with open(self._temp_dir / constants.METADATA_FILENAME, 'w') as f:
+        metadata_path = self._temp_dir / constants.METADATA_FILENAME
+        with open(metadata_path, 'w') as f:
             json.dump(metadata, f)
+        self._add_to_archive(metadata_path)
 
     def _dump_management(self):
         for dump_type in ['tenants', 'permissions', 'user_groups', 'users']:
@@ -144,6 +184,8 @@ class SnapshotCreate:
         for dump_type in ['blueprints', 'configuration', 'favorites']:
             ctx.logger.debug(f'Dumping composer\'s {dump_type}')
             getattr(self._composer_client, dump_type).dump(output_dir)
+        if self._archive:
+            self._archive.add_tree(output_dir)
 
     def _dump_stage(self):
         output_dir = self._temp_dir / 'stage'
@@ -159,13 +201,28 @@ class SnapshotCreate:
                                      tenant=tenant_name)
             else:
                 dump_client.dump(output_dir)
+        if self._archive:
+            self._archive.add_tree(output_dir)
+
+    def _dump_tenants(self, tenants: dict[str, dict[str, set] | None]):
+        """Dump the tenants in parallel, using the tenants worker pool.
+
+        :param tenants: a dict of tenant name, to the dump_type_ids_map
+            to dump it with (see _dump_tenant)
+        """
+        dump_tenant = in_workflow_ctx(self._dump_tenant)
+        _wait_for_all([
+            self._tenants_pool.submit(
+                dump_tenant, tenant_name, dump_type_ids_map)
+            for tenant_name, dump_type_ids_map in tenants.items()
+        ])
 
     def _dump_tenant(
             self,
             tenant_name: str,
             dump_type_ids_map: dict[str, set] | None = None
     ):
-        self._ids_dumped = defaultdict(set)
+        ids_dumped = defaultdict(set)
         if dump_type_ids_map:
             dump_types = dump_type_ids_map.keys()
         else:
@@ -184,9 +241,10 @@ class SnapshotCreate:
             api = getattr(self._tenant_clients[tenant_name], dump_type)
             ids = dump_type_ids_map.get(dump_type) if dump_type_ids_map else {}
             entities = api.dump(
-                **self._dump_call_extra_kwargs(tenant_name, dump_type, ids)
+                **self._dump_call_extra_kwargs(
+                    tenant_name, dump_type, ids, ids_dumped)
             )
-            self._ids_dumped[dump_type].update(
+            ids_dumped[dump_type].update(
                 self._write_files(tenant_name, dump_type, entities)
             )
 
@@ -195,23 +253,24 @@ class SnapshotCreate:
             tenant_name: str,
             dump_type: str,
             only_these_ids: set | None,
+            ids_dumped: dict[str, set[str]],
     ):
         kwargs = {}
         if dump_type in ['agents', 'nodes']:
-            kwargs.update({'deployment_ids': self._ids_dumped['deployments']})
+            kwargs.update({'deployment_ids': ids_dumped['deployments']})
         if dump_type == 'node_instances':
             kwargs.update({
-                'deployment_ids': self._ids_dumped['deployments'],
+                'deployment_ids': ids_dumped['deployments'],
                 'get_broker_conf': self._agents_handler.get_broker_conf
             })
         if dump_type == 'events':
             kwargs.update({
-                'execution_ids': self._ids_dumped['executions'],
-                'execution_group_ids': self._ids_dumped['execution_groups'],
+                'execution_ids': ids_dumped['executions'],
+                'execution_group_ids': ids_dumped['execution_groups'],
                 'include_logs': self._include_logs,
             })
         if dump_type == 'tasks_graphs':
-            execution_ids = self._ids_dumped['executions']
+            execution_ids = ids_dumped['executions']
             operations = defaultdict(list)
             for op in self._tenant_clients[tenant_name].operations\
                     .dump(execution_ids=execution_ids):
@@ -232,29 +291,40 @@ class SnapshotCreate:
             dump_type: str,
             data
     ) -> set[str]:
-        """Dumps all data of dump_type into JSON files inside output_dir."""
-        data_buckets = {}
+        """Dumps all data of dump_type into JSON files inside output_dir.
+
+        The entities are written in batches, as soon as a batch is full,
+        and the archives of blueprints, plugins and deployments are
+        downloaded using the downloads worker pool, while the rest of
+        the entities are still being read.
+        """
+        data_buckets = defaultdict(list)
         output_dir = self._prepare_output_dir(tenant_name)
         os.makedirs(output_dir, exist_ok=True)
         ids_added = set()
         latest_timestamp = None
+        downloads = []
+        download_archive = in_workflow_ctx(self._download_archive)
 
-        # Prepare data for dumping and create archives
         for entity_raw in data:
             source, source_id, entity_id, entity = _prepare_dump_entity(
                     dump_type, entity_raw)
-            if (source, source_id) not in data_buckets:
-                data_buckets[(source, source_id)] = []
-            data_buckets[(source, source_id)].append(entity)
+            items = data_buckets[(source, source_id)]
+            items.append(entity)
             latest_timestamp = _extract_latest_timestamp(dump_type, entity,
                                                          latest_timestamp)
+            if len(items) >= DUMP_ENTITIES_BATCH_SIZE:
+                self._write_batch(output_dir, dump_type, source, source_id,
+                                  latest_timestamp, items)
+                data_buckets[(source, source_id)] = []
             if dump_type in ['blueprints', 'deployments', 'plugins']:
-                _write_dump_archive(
-                        dump_type,
-                        entity_id,
-                        output_dir,
-                        self._tenant_clients[tenant_name]
-                )
+                downloads.append(self._downloads_pool.submit(
+                    download_archive,
+                    tenant_name,
+                    dump_type,
+                    entity_id,
+                    output_dir,
+                ))
             if entity_id:
                 ids_added.add(entity_id)
                 self._auditlog_listener.added_snapshot_entity(
@@ -262,37 +332,84 @@ class SnapshotCreate:
                 if _should_append_entity(dump_type, entity):
                     self._auditlog_listener.append_entity(
                         tenant_name, dump_type, entity)
-        # Dump the data as JSON files
-        filenum = _get_max_filenum_in_dir(output_dir) or 0
         for (source, source_id), items in data_buckets.items():
-            data = {'type': dump_type}
-            if source:
-                data['source'] = source
-            if source_id:
-                data['source_id'] = source_id
-            if latest_timestamp:
-                data['latest_timestamp'] = latest_timestamp
-            remainder = len(items) % DUMP_ENTITIES_BATCH_SIZE
-            file_count = len(items) // DUMP_ENTITIES_BATCH_SIZE
-            if remainder:
-                file_count += 1
-            for i in range(file_count):
-                filenum += 1
-                output_file = output_dir / f'{filenum:08d}.json'
-                start = i * DUMP_ENTITIES_BATCH_SIZE
-                finish = (i + 1) * DUMP_ENTITIES_BATCH_SIZE
-                data['items'] = items[start:finish]
-                with open(output_file, 'w') as handle:
-                    json.dump(data, handle)
+            if items:
+                self._write_batch(output_dir, dump_type, source, source_id,
+                                  latest_timestamp, items)
+        _wait_for_all(downloads)
         return ids_added
 
+    def _write_batch(
+            self,
+            output_dir: Path,
+            dump_type: str,
+            source: str | None,
+            source_id: str | None,
+            latest_timestamp: str | None,
+            items: list[dict[str, Any]],
+    ):
+        """Write a single JSON file of at most DUMP_ENTITIES_BATCH_SIZE items.
+
+        latest_timestamp is the latest of the timestamps of the entities
+        of dump_type that were dumped so far.
+        """
+        data = {'type': dump_type}
+        if source:
+            data['source'] = source
+        if source_id:
+            data['source_id'] = source_id
+        if latest_timestamp:
+            data['latest_timestamp'] = latest_timestamp
+        data['items'] = items
+        # the files are moved to the archive as soon as they're written,
+        # so the numbering can't be based on the files in output_dir
+        filenum = self._filenums.get(output_dir, 0) + 1
+        self._filenums[output_dir] = filenum
+        output_file = output_dir / f'{filenum:08d}.json'
+        with open(output_file, 'w') as handle:
+            json.dump(data, handle)
+        self._add_to_archive(output_file)
+
+    def _download_archive(
+            self,
+            tenant_name: str,
+            dump_type: str,
+            entity_id: str,
+            output_dir: pathlib.Path,
+    ):
+        entity_dest = _write_dump_archive(
+            dump_type, entity_id, output_dir,
+            self._download_client(tenant_name))
+        if entity_dest:
+            self._add_to_archive(entity_dest)
+
+    def _download_client(self, tenant_name: str) -> CloudifyClient:
+        """The current download worker's own client of the tenant.
+
+        The clients aren't thread-safe, so the download workers can't
+        share the client that the tenant's worker is dumping with.
+        """
+        if not hasattr(self._download_clients, 'clients'):
+            self._download_clients.clients = {}
+        clients = self._download_clients.clients
+        if tenant_name not in clients:
+            clients[tenant_name] = get_rest_client(tenant=tenant_name)
+        return clients[tenant_name]
+
+    def _add_to_archive(self, file_path: Path):
+        if self._archive:
+            self._archive.add(file_path)
+
     def _prepare_output_dir(self, tenant_name: str):
         return self._temp_dir / 'tenants' / tenant_name if tenant_name \
             else self._temp_dir / 'mgmt'
 
     def _create_archive(self):
         ctx.logger.debug('Creating snapshot archive')
-        shutil.make_archive(self._archive_dest, 'zip', self._temp_dir)
+        # most of the files were already added while they were dumped,
+        # so this only adds what's left, eg. empty directories
+        self._archive.add_tree(self._temp_dir)
+        self._archive.close()
 
     def _upload_archive(self):
         ctx.logger.debug('Uploading archive to manager')
@@ -332,8 +449,7 @@ class SnapshotCreate:
         self._dump_from_auditlog(tenant_table_identifiers_map)
 
     def _dump_from_auditlog(self, data: dict[str, dict[str, set]]):
-        for tenant_name, dump_type_ids_map in data.items():
-            self._dump_tenant(tenant_name, dump_type_ids_map)
+        self._dump_tenants(data)
 
     def _append_execution_events(self, data: dict[str, dict[str, set]]):
         for tenant_name, dump_type_ids_map in data.items():
@@ -455,26 +571,75 @@ def _write_dump_archive(
            include_workdir=True)
         b64_zip = data['workdir_zip']
         if b64_zip == EMPTY_B64_ZIP:
-            return
+            return None
         with open(entity_dest, 'w') as dump_handle:
             dump_handle.write(b64_zip)
     elif dump_type == 'plugins':
         client.download(entity_id, entity_dest, full_archive=True)
     else:
         client.download(entity_id, entity_dest)
+    return entity_dest
+
+
+def _wait_for_all(futures):
+    """Wait for all the futures, or until the first one fails.
+
+    If any of them failed, cancel the ones that haven't started yet, and
+    raise the exception.
+    """
+    done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+    for future in not_done:
+        future.cancel()
+    for future in done:
+        future.result()
+
+
+class SnapshotArchive:
+    """The snapshot zip file, with files added to it as they are dumped.
+
+    Each added file is removed from the temp dir right away, so that the
+    data isn't kept on the disk twice. Directories are stored as entries
+    of their own, the same as shutil.make_archive does: restoring relies
+    on the tenants' directory entries.
+    """
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self._root = root
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED,
+                                    allowZip64=True)
+        self._dirs: set[Path] = set()
+        # files are dumped by multiple threads, but a zip can only be
+        # written sequentially
+        self._lock = threading.Lock()
+
+    def add(self, file_path: Path):
+        """Move file_path, which is somewhere under root, to the archive"""
+        arcname = file_path.relative_to(self._root)
+        with self._lock:
+            for parent in reversed(arcname.parents):
+                self._add_dir(parent)
+            self._zip.write(file_path, arcname)
+        file_path.unlink()
+
+    def add_tree(self, dir_path: Path):
+        """Move everything that's under dir_path to the archive"""
+        for dirpath, dirnames, filenames in os.walk(dir_path):
+            dirpath = Path(dirpath)
+            dirnames.sort()
+            with self._lock:
+                self._add_dir(dirpath.relative_to(self._root))
+            for filename in sorted(filenames):
+                self.add(dirpath / filename)
+
+    def _add_dir(self, arcname: Path):
+        if arcname == Path('.') or arcname in self._dirs:
+            return
+        self._dirs.add(arcname)
+        self._zip.write(self._root / arcname, arcname)
 
-
-def _get_max_filenum_in_dir(dirname: pathlib.Path):
-    try:
-        max_file_name = max(
-                f for f in dirname.iterdir()
-                if f.is_file and f.name.endswith('.json')
-        )
-        if max_file_name:
-            return int(max_file_name.stem)
-    except (FileNotFoundError, ValueError):
-        pass
-    return None
+    def close(self):
+        with self._lock:
+            self._zip.close()
 
 
 def get_all(method, kwargs=None):
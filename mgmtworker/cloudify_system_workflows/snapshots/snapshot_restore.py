@@ -10,6 +10,8 @@ import zipfile
 import tempfile
 import threading
 import subprocess
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from functools import partial
 from typing import Any
@@ -69,10 +71,34 @@ from .constants import (
     COMPOSER_APP
 )
 from .ui_clients import UIClientError
-from .utils import is_later_than_now, parse_datetime_string, get_tenants_list
+from .utils import (
+    get_tenants_list,
+    in_workflow_ctx,
+    is_later_than_now,
+    parse_datetime_string,
+)
 
 EMPTY_B64_ZIP = 'UEsFBgAAAAAAAAAAAAAAAAAAAAAAAA=='
 
+# It is important to restore the entities in order: the entities of each
+# group only depend on the entities of the previous groups, so all the
+# entities of a single group can be restored at the same time.
+RESTORE_ORDER = [
+    ['tenants'],
+    ['permissions'],
+    ['user_groups'],
+    ['users'],
+    ['sites', 'plugins', 'secrets_providers'],
+    ['secrets', 'blueprints'],
+    ['deployments'],
+    ['deployment_groups', 'nodes'],
+    ['node_instances', 'inter_deployment_dependencies'],
+    ['agents', 'executions'],
+    ['execution_groups', 'deployment_updates', 'deployments_filters',
+     'blueprints_filters'],
+    ['events', 'plugins_update', 'tasks_graphs', 'execution_schedules'],
+]
+
 
 # Reproduced/modified from patch for https://bugs.python.org/issue15795
 class ZipFile(zipfile.ZipFile):
@@ -102,14 +128,15 @@ class ZipFile(zipfile.ZipFile):
         targetpath = os.path.join(targetpath, arcname)
         targetpath = os.path.normpath(targetpath)
 
-        # Create all upper directories if necessary.
+        # Create all upper directories if necessary. Files are extracted
+        # by multiple threads, so the directories might be created by
+        # another thread in the meantime.
         upperdirs = os.path.dirname(targetpath)
-        if upperdirs and not os.path.exists(upperdirs):
-            os.makedirs(upperdirs)
+        if upperdirs:
+            os.makedirs(upperdirs, exist_ok=True)
 
         if member.is_dir():
-            if not os.path.isdir(targetpath):
-                os.mkdir(targetpath)
+            os.makedirs(targetpath, exist_ok=True)
             return targetpath
 
         with self.open(member, pwd=pwd) as source, \
@@ -181,22 +208,71 @@ class SnapshotRestore(object):
         self._stage_client = utils.get_stage_client()
         self._manager_version = utils.get_manager_version(self._client)
         self._encryption_key = None
-        self._semaphore = threading.Semaphore(
-            self._config.snapshot_restore_threads)
+        self._restore_pool = ThreadPoolExecutor(
+            max_workers=max(1, self._config.snapshot_restore_threads or 1),
+            thread_name_prefix='snapshot-restore',
+        )
         self._new_tenants = set()
-        self._tenant_clients = {}
+        # the clients of each restore worker, see _restore_client
+        self._restore_clients = threading.local()
         self._snapshot_files = {}
         self._legacy = None
 
     def _new_restore(self, zip_file):
-        self._new_restore_parse_and_restore(zip_file)
+        self._new_restore_parse_and_restore(zip_file, [None])
         self._new_restore_composer(zip_file)
         self._new_restore_stage(zip_file)
-        for tenant in self._new_tenants:
-            self._new_restore_parse_and_restore(zip_file, tenant=tenant)
+        self._new_restore_parse_and_restore(zip_file, self._new_tenants)
         self._new_restore_update_execution_status()
 
-    def _new_restore_parse_and_restore(self, zip_file, tenant=None):
+    def _new_restore_parse_and_restore(self, zip_file, tenants):
+        """Restore the entities of the tenants (None: the mgmt entities).
+
+        Entities that don't depend on each other are restored at the same
+        time, using the restore worker pool: those of different tenants,
+        of the entity types of a single RESTORE_ORDER group, and of
+        different sources (eg. node instances of different deployments).
+        Each tenant moves on to its next group as soon as its previous
+        group is restored, regardless of the other tenants.
+        """
+        restore_groups = {
+            tenant: _new_restore_groups(
+                self._new_restore_index(zip_file, tenant))
+            for tenant in tenants
+        }
+        restore_entities = in_workflow_ctx(self._new_restore_entities)
+        running = {}
+
+        def _start_next_group(tenant):
+            for group in restore_groups[tenant]:
+                for data_key, filenames in group:
+                    future = self._restore_pool.submit(
+                        restore_entities,
+                        tenant, data_key, filenames, zip_file)
+                    running[future] = tenant
+                if group:
+                    return
+
+        for tenant in tenants:
+            _start_next_group(tenant)
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tenant = running.pop(future)
+                    future.result()
+                    if tenant not in running.values():
+                        _start_next_group(tenant)
+        finally:
+            for future in running:
+                future.cancel()
+
+    def _new_restore_index(self, zip_file, tenant=None):
+        """Find the dump files of each entity type and source.
+
+        :return: a dict of (type, source, source_id), to the names of
+            the files storing those entities, in the order of dumping
+        """
         if tenant:
             dump_files = [
                 f for f in self._snapshot_files['tenants'].get(tenant)
@@ -208,59 +284,93 @@ class SnapshotRestore(object):
                 if f.endswith('.json')
             ]
 
-        entities: dict[tuple, dict[str, dict]] = {}
-
+        index: dict[tuple, list[str]] = defaultdict(list)
         for filename in sorted(dump_files):
             ctx.logger.debug('Checking for data to restore in %s',
                              filename)
-            extract_path = os.path.join(self._tempdir, filename)
-            zip_file.extract(filename, self._tempdir)
-            with open(extract_path) as data_handle:
-                data = json.load(data_handle)
-                _new_restore_update_entities(entities, data)
-            os.unlink(extract_path)
-
-        # It is important to restore the entities in order
-        for dump_type in [
-            'tenants', 'permissions', 'user_groups', 'users', 'sites',
-            'plugins', 'secrets_providers', 'secrets', 'blueprints',
-            'deployments', 'deployment_groups', 'nodes', 'node_instances',
-            'agents', 'inter_deployment_dependencies', 'executions',
-            'execution_groups', 'events', 'deployment_updates',
-            'plugins_update', 'deployments_filters', 'blueprints_filters',
-            'tasks_graphs', 'execution_schedules'
-        ]:
-            for (_type, _source, _source_id), data in entities.items():
-                if _type != dump_type:
+            data = self._load_dump_file(zip_file, filename)
+            data_key = (data['type'], data.get('source'),
+                        data.get('source_id'))
+            index[data_key].append(filename)
+        return index
+
+    def _load_dump_file(self, zip_file, filename):
+        extract_path = os.path.join(self._tempdir, filename)
+        zip_file.extract(filename, self._tempdir)
+        with open(extract_path) as data_handle:
+            data = json.load(data_handle)
+        os.unlink(extract_path)
+        return data
+
+    def _new_restore_read_entities(self, zip_file, filenames):
+        """Read the entities from the dump files, one file at a time.
+
+        An entity which was changed while the snapshot was being created
+        is dumped again, to a later file. Its last version is returned,
+        but in the position of its first version, because the order of
+        the entities matters (eg. parent deployments before their
+        children). Finding these requires reading the files twice, but
+        only the identifiers of the entities, and the later versions of
+        the dumped-again entities, are kept in memory.
+        """
+        first_seen = {}
+        later_versions = {}
+        if len(filenames) > 1:
+            for file_index, filename in enumerate(filenames):
+                data = self._load_dump_file(zip_file, filename)
+                for entity in data['items']:
+                    unique_id = _entity_unique_id(data['type'], entity)
+                    if unique_id in first_seen:
+                        later_versions[unique_id] = entity
+                    else:
+                        first_seen[unique_id] = file_index
+
+        for file_index, filename in enumerate(filenames):
+            data = self._load_dump_file(zip_file, filename)
+            entities = {}
+            for entity in data['items']:
+                unique_id = _entity_unique_id(data['type'], entity)
+                if first_seen.get(unique_id, file_index) != file_index:
+                    # already returned, in the position of its first version
                     continue
-                self._new_restore_entities(
-                    tenant, _type, _source, _source_id,
-                    list(data.values()), zip_file)
+                entities[unique_id] = later_versions.get(unique_id, entity)
+            if entities:
+                yield list(entities.values())
 
     def _new_restore_entities(
             self,
             tenant_name: str,
-            dump_type: str,
-            source_type: str | None,
-            source_id: str | None,
-            entities: list[dict[str, Any]],
+            data_key: tuple[str, str | None, str | None],
+            filenames: list[str],
             zip_file,
     ):
-        if tenant_name:
-            client = self._tenant_clients.setdefault(
-                tenant_name, get_rest_client(tenant=tenant_name))
-        else:
-            client = self._client
+        dump_type, source_type, source_id = data_key
+        client = self._restore_client(tenant_name)
         ctx.logger.info(
             'Restoring %s on %s from %s', dump_type, tenant_name, source_id)
         api = getattr(client, dump_type)
         extra_args = _new_restore_entities_extra_args(
                 dump_type, source_type, source_id,
                 partial(self._get_associated_archive, zip_file, tenant_name))
-        post_restore_data = api.restore(entities, ctx.logger, **extra_args)
-        if post_restore_data:
-            self._new_restore_entities_post_process(dump_type, client,
-                                                    post_restore_data)
+        for entities in self._new_restore_read_entities(zip_file, filenames):
+            post_restore_data = api.restore(
+                entities, ctx.logger, **extra_args)
+            if post_restore_data:
+                self._new_restore_entities_post_process(
+                    dump_type, client, post_restore_data)
+
+    def _restore_client(self, tenant_name: str | None):
+        """The current restore worker's own client of the tenant.
+
+        The clients aren't thread-safe, so the restore workers, which
+        restore the entities of a tenant concurrently, can't share one.
+        """
+        if not hasattr(self._restore_clients, 'clients'):
+            self._restore_clients.clients = {}
+        clients = self._restore_clients.clients
+        if tenant_name not in clients:
+            clients[tenant_name] = get_rest_client(tenant=tenant_name)
+        return clients[tenant_name]
 
     def _get_associated_archive(
             self,
@@ -300,17 +410,17 @@ class SnapshotRestore(object):
                 for username, tenant_roles in record.items():
                     direct_roles = tenant_roles['direct']
                     for user_tenant, role in direct_roles.items():
-                        self._client.tenants.add_user(
+                        client.tenants.add_user(
                                 username,
                                 tenant_name=user_tenant,
                                 role=role)
                     for user_group in tenant_roles['groups']:
-                        self._client.user_groups.add_user(
+                        client.user_groups.add_user(
                                 username, user_group)
             elif entity_type == 'user_groups':
                 for group_name, group_tenants in record.items():
                     for group_tenant, group_role in group_tenants.items():
-                        self._client.tenants.add_user_group(
+                        client.tenants.add_user_group(
                                 group_name,
                                 tenant_name=group_tenant,
                                 role=group_role)
@@ -566,6 +676,7 @@ class SnapshotRestore(object):
 
             shutil.rmtree(self._get_snapshot_dir())
         finally:
+            self._restore_pool.shutdown(cancel_futures=True)
             if self._is_legacy_snapshot():
                 self._trigger_post_restore_commands()
             else:
@@ -1292,26 +1403,27 @@ class SnapshotRestoreValidator(object):
         raise NonRecoverableError(msg)
 
 
-def _new_restore_update_entities(
-        entities: dict[tuple, dict[str, dict]],
-        data: dict[str, Any]):
-    data_key = (data['type'], data.get('source'), data.get('source_id'))
-    if data_key not in entities:
-        entities[data_key] = {}
-    for entity in data['items']:
-        if data['type'] in ['sites', 'tenants', 'user_groups']:
-            unique_id = entity['name']
-        elif data['type'] == 'permissions':
-            unique_id = f"{entity['role']}:{entity['permission']}"
-        elif data['type'] == 'events':
-            unique_id = f"{entity['timestamp']}:{hash(entity['message'])}"
-        elif data['type'] == 'secrets':
-            unique_id = entity['key']
-        elif data['type'] == 'users':
-            unique_id = entity['username']
-        else:
-            unique_id = entity['id']
-        entities[data_key][unique_id] = entity
+def _new_restore_groups(index: dict[tuple, list[str]]):
+    """Split the index of dump files into groups, in RESTORE_ORDER"""
+    for dump_types in RESTORE_ORDER:
+        yield [
+            (data_key, filenames) for data_key, filenames in index.items()
+            if data_key[0] in dump_types
+        ]
+
+
+def _entity_unique_id(dump_type: str, entity: dict[str, Any]):
+    if dump_type in ['sites', 'tenants', 'user_groups']:
+        return entity['name']
+    elif dump_type == 'permissions':
+        return f"{entity['role']}:{entity['permission']}"
+    elif dump_type == 'events':
+        return f"{entity['timestamp']}:{hash(entity['message'])}"
+    elif dump_type == 'secrets':
+        return entity['key']
+    elif dump_type == 'users':
+        return entity['username']
+    return entity['id']
 
 
 def _new_restore_entities_extra_args(
@@ -1,6 +1,7 @@
 import os
 import json
 import shlex
+import functools
 import shutil
 import subprocess
 import contextlib
@@ -11,6 +12,7 @@ import pytz
 
 from cloudify.workflows import ctx
 from cloudify import constants, manager
+from cloudify.state import NotInContext, current_workflow_ctx
 from . import constants as snapshot_constants
 from .constants import SECURITY_FILE_LOCATION, SECURITY_FILENAME
 from .ui_clients import ComposerClient, StageClient
@@ -405,3 +407,21 @@ def is_split_services_environment():
         'k8s',
         'kubernetes',
     ]
+
+
+def in_workflow_ctx(func):
+    """Make func run in the current workflow context, in any thread.
+
+    The workflow context is thread-local, so it needs to be set in the
+    worker threads explicitly.
+    """
+    try:
+        workflow_context = current_workflow_ctx.get_ctx()
+    except NotInContext:
+        return func
+
+    @functools.wraps(func)
+    def _with_ctx(*args, **kwargs):
+        with current_workflow_ctx.push(workflow_context):
+            return func(*args, **kwargs)
+    return _with_ctx
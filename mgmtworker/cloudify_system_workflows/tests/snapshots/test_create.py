@@ -562,3 +562,48 @@ def test_create_tasks_graphs():
         e1_tasks_graphs = snapshot['tenants']['tenant1'][e1_key]
 
         assert len(e1_tasks_graphs['items']) == 1
+
+
+def test_create_parallel_tenants():
+    with prepare_snapshot_create_with_mocks(
+        'test-create-parallel-tenants',
+        rest_mocks=[
+            (mock.Mock, (dump_type, 'dump'), [[]])
+            for dump_type in ['user_groups', 'tenants', 'users', 'permissions',
+                              'sites', 'plugins', 'secrets_providers',
+                              'secrets', 'blueprints',
+                              'inter_deployment_dependencies',
+                              'deployment_groups', 'deployment_updates',
+                              'executions', 'execution_groups',
+                              'plugins_update', 'deployments_filters',
+                              'blueprints_filters', 'execution_schedules',
+                              'nodes', 'node_instances', 'agents', 'events',
+                              'operations', 'tasks_graphs']
+        ] + [
+            (mock.Mock, ('tenants', 'list'), TWO_TENANTS_LIST_SE),
+            (mock.Mock, ('deployments', 'dump'),
+             [[{'id': 'd1'}, {'id': 'd2'}]]),
+            (mock.Mock, ('deployments', 'get'),
+             {'workdir_zip': 'non-empty-workdir-content'}),
+            (mock.AsyncMock, ('auditlog', 'stream'), AuditLogResponse([])),
+        ],
+        config={'snapshot_create_threads': 2},
+    ) as sc:
+        sc.create(timeout=0.2)
+        # the download workers use their own clients
+        for tenant_name in ['tenant1', 'tenant2']:
+            sc._tenant_clients[tenant_name].deployments.get.assert_not_called()
+        with zipfile.ZipFile(sc._archive_dest.with_suffix('.zip'), 'r') as zf:
+            names = zf.namelist()
+            for tenant_name in ['tenant1', 'tenant2']:
+                assert f'tenants/{tenant_name}/' in names
+                for deployment_id in ['d1', 'd2']:
+                    assert zf.read(
+                        f'tenants/{tenant_name}/deployments/'
+                        f'{deployment_id}.b64zip'
+                    ) == b'non-empty-workdir-content'
+        snapshot = load_snapshot_to_dict(sc._archive_dest.with_suffix('.zip'))
+        for tenant_name in ['tenant1', 'tenant2']:
+            deployments = snapshot['tenants'][tenant_name][
+                ('deployments', None, None)]
+            assert set(deployments['items']) == {'d1', 'd2'}
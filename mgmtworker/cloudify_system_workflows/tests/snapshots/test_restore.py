@@ -2,6 +2,8 @@ from dataclasses import dataclass
 import json
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import mkdtemp
 from unittest import mock
 
@@ -1363,6 +1365,85 @@ def _test_restore(snap_id, snap_contents_dir, calls, tenants,
         shutil.rmtree(tempdir)
 
 
+def test_restore_entities_in_order(mock_ctx, mock_get_composer_client,
+                                   mock_get_stage_client):
+    tempdir = mkdtemp('-test-snap-restore-data')
+    snapshot_dir = os.path.join(tempdir, 'snapshot')
+    os.makedirs(os.path.join(snapshot_dir, 'tenants', 'tenant1'))
+    dump_files = []
+    for filenum, data in enumerate([
+        {'type': 'deployments', 'items': [{'id': 'd1'}, {'id': 'd2'}]},
+        {'type': 'node_instances', 'source': 'deployments',
+         'source_id': 'd1', 'items': [{'id': 'ni1'}]},
+        # d1 was changed while the snapshot was being created
+        {'type': 'deployments', 'items': [{'id': 'd1', 'changed': True}]},
+    ], start=1):
+        dump_file = os.path.join('tenants', 'tenant1', f'{filenum:08d}.json')
+        with open(os.path.join(snapshot_dir, dump_file), 'w') as f:
+            json.dump(data, f)
+        dump_files.append(dump_file)
+    client = mock.Mock()
+    client.manager.get_version.return_value = {'version': '7.1.0'}
+
+    try:
+        with mock.patch(
+            'cloudify_system_workflows.snapshots.snapshot_restore'
+            '.get_rest_client',
+            return_value=client,
+        ):
+            snap_res = SnapshotRestore(
+                snapshot_id='testsnapshot',
+                config={
+                    'snapshot_restore_threads': 2,
+                    'file_server_root': tempdir,
+                },
+                force=None,
+                timeout=None,
+                premium_enabled=None,
+                user_is_bootstrap_admin=None,
+                restore_certificates=None,
+                no_reboot=None,
+            )
+            snap_res._tempdir = os.path.join(tempdir, 'extracted')
+            snap_res._snapshot_files = {'tenants': {'tenant1': dump_files}}
+            snap_res._new_restore_parse_and_restore(
+                FakeZipFile(snapshot_dir, 'r'), ['tenant1'])
+
+        restore_calls = [
+            call for call in client.mock_calls
+            if call[0].endswith('.restore')
+        ]
+        # d1 is restored in its original position, but in its last version
+        assert restore_calls == [
+            mock.call.deployments.restore(
+                [{'id': 'd1', 'changed': True}, {'id': 'd2'}], mock.ANY,
+                path_func=mock.ANY),
+            mock.call.node_instances.restore(
+                [{'id': 'ni1'}], mock.ANY,
+                deployment_id='d1', inject_broker_conf=mock.ANY),
+        ]
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_restore_clients_per_thread():
+    snap_res = SnapshotRestore.__new__(SnapshotRestore)
+    snap_res._restore_clients = threading.local()
+    with mock.patch(
+        'cloudify_system_workflows.snapshots.snapshot_restore'
+        '.get_rest_client',
+        side_effect=lambda **_: mock.Mock(),
+    ) as get_rest_client:
+        client = snap_res._restore_client('tenant1')
+        assert snap_res._restore_client('tenant1') is client
+        assert snap_res._restore_client('tenant2') is not client
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            other_thread_client = pool.submit(
+                snap_res._restore_client, 'tenant1').result()
+        assert other_thread_client is not client
+    assert get_rest_client.call_count == 3
+
+
 def _assert_cleanup(zipfile, tempdir, unlink):
     # The actual unlinks should happen after each file is extracted, but we
     # can't trivially check that, so we'll make sure each file is unlinked and
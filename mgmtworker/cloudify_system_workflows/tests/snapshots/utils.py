@@ -170,6 +170,7 @@ def prepare_snapshot_create_with_mocks(
         rest_mocks: list[tuple[Type[mock.Mock], tuple, list]] | None = None,
         composer_mocks: list[tuple[tuple, list]] | None = None,
         stage_mocks: list[tuple[tuple, list]] | None = None,
+        config: dict | None = None,
         **kwargs
 ):
     with mock.patch(
@@ -214,6 +215,7 @@ def prepare_snapshot_create_with_mocks(
                                     'created_status': 'created',
                                     'failed_status': 'failed',
                                     'file_server_root': temp_dir,
+                                    **(config or {}),
                                 },
                                 **kwargs,
                             )
@@ -7,8 +7,7 @@ from cloudify.cluster_status import (ServiceStatus,
                                      CloudifyNodeType,
                                      NodeServiceStatus)
 
-from manager_rest.config import instance as config
-from manager_rest.prometheus_client import query as prometheus_query
+from manager_rest.prometheus_snapshot import query as prometheus_query
 from manager_rest.storage import models, get_storage_manager
 
 
@@ -164,7 +163,6 @@ def _add_monitoring_data(cluster_nodes: typing.Dict[str, dict]) -> None:
     prometheus_results = prometheus_query(
         query_string=query_string,
         logger=current_app.logger,
-        timeout=config.monitoring_timeout,
     )
 
     warning_msg_prefix = \
@@ -5,9 +5,8 @@ from cloudify.cluster_status import CloudifyNodeType
 from flask import current_app
 from pydantic import BaseModel
 
-from manager_rest.config import instance as config
 from manager_rest.constants import StrEnum
-from manager_rest.prometheus_client import query as prometheus_query
+from manager_rest.prometheus_snapshot import query as prometheus_query
 
 QUERY_STRINGS = {
     CloudifyNodeType.DB: "(postgres_healthy) or (postgres_service)",
@@ -214,7 +213,6 @@ def get_cluster_status() -> dict[str, Any]:
     prometheus_results = prometheus_query(
         query_string=query_string,
         logger=current_app.logger,
-        timeout=config.monitoring_timeout,
     )
     status = (
         ClusterStatus()
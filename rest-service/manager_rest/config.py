@@ -102,6 +102,27 @@ class Config(object):
     amqp_password = Setting('amqp_password', from_db=False)
     amqp_ca = Setting('amqp_ca', from_db=False)
 
+    # amqp-postgres (logs & events ingestion) settings
+    amqp_postgres_batch_size = Setting('amqp_postgres_batch_size',
+                                       default=100, from_db=False)
+    amqp_postgres_batch_delay = Setting('amqp_postgres_batch_delay',
+                                        default=0.5, from_db=False)
+    amqp_postgres_use_copy = Setting('amqp_postgres_use_copy',
+                                     default=False, from_db=False)
+    amqp_postgres_workers = Setting('amqp_postgres_workers',
+                                    default=1, from_db=False)
+    amqp_postgres_executions_cache_size = Setting(
+        'amqp_postgres_executions_cache_size', default=1000, from_db=False)
+    amqp_postgres_executions_cache_ttl = Setting(
+        'amqp_postgres_executions_cache_ttl', default=300, from_db=False)
+    amqp_postgres_executions_cache_negative_ttl = Setting(
+        'amqp_postgres_executions_cache_negative_ttl', default=1,
+        from_db=False)
+    amqp_postgres_metrics_port = Setting('amqp_postgres_metrics_port',
+                                         default=None, from_db=False)
+    amqp_postgres_metrics_host = Setting('amqp_postgres_metrics_host',
+                                         default='127.0.0.1', from_db=False)
+
     # LDAP settings
     ldap_server = Setting('ldap_server')
     ldap_username = Setting('ldap_username')
@@ -146,6 +167,15 @@ class Config(object):
     marketplace_api_url = Setting('marketplace_api_url')
 
     monitoring_timeout = Setting('monitoring_timeout')
+    monitoring_refresh_interval = Setting('monitoring_refresh_interval',
+                                          default=10, from_db=False)
+    monitoring_max_staleness = Setting('monitoring_max_staleness',
+                                       default=60, from_db=False)
+    prometheus_snapshot_dir = Setting(
+        'prometheus_snapshot_dir',
+        default='/opt/manager/prometheus-snapshots',
+        from_db=False,
+    )
 
     test_mode = Setting('test_mode', default=False)
 
@@ -173,11 +203,35 @@ class Config(object):
     failed_logins_before_account_lock = Setting(
         'failed_logins_before_account_lock', default=4)
     account_lock_period = Setting('account_lock_period')
+    # verified API tokens are cached, to avoid re-hashing the secret on
+    # every request. Set the TTL to 0 to disable the cache.
+    token_cache_size = Setting('token_cache_size', default=1000,
+                               from_db=False)
+    token_cache_ttl = Setting('token_cache_ttl', default=60, from_db=False)
+    # decrypted secret values are cached, to avoid decrypting them, or
+    # fetching them from their secrets provider, on every use. Secrets
+    # providers can override the TTL with the cache_ttl connection
+    # parameter. Set the TTL to 0 to disable the cache.
+    secrets_cache_size = Setting('secrets_cache_size', default=1000,
+                                 from_db=False)
+    secrets_cache_ttl = Setting('secrets_cache_ttl', default=60,
+                                from_db=False)
 
     # max number of threads that will be used in a `restore snapshot` wf
     snapshot_restore_threads = Setting('snapshot_restore_threads', default=15)
+    # max number of threads that will be used in a `create snapshot` wf
+    snapshot_create_threads = Setting('snapshot_create_threads', default=4)
     max_concurrent_workflows = Setting('max_concurrent_workflows', default=20)
     warnings = Setting('warnings', default=[])
+    # config changes are pushed to the rest-service workers using
+    # LISTEN/NOTIFY; additionally, check for changes this often (seconds).
+    # Set to 0 to check on every request instead.
+    config_check_interval = Setting('config_check_interval', default=300,
+                                    from_db=False)
+    # events and logs older than this many days are dropped, a whole
+    # month at a time; None to keep them forever
+    events_retention_days = Setting('events_retention_days', default=None,
+                                    from_db=False)
 
     prometheus_url = Setting('prometheus_url')
 
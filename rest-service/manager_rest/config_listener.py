@@ -0,0 +1,115 @@
+"""Push-based invalidation of the config loaded from the db.
+
+Triggers on the config, roles, permissions and certificates tables
+send a notification on the CONFIG_CHANGED_CHANNEL channel. Every
+rest-service worker process runs a thread that LISTENs on that channel,
+so that a request only needs to check the db for config changes when
+a notification was received (or, as a fallback, once in a while).
+"""
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from manager_rest import config
+
+CONFIG_CHANGED_CHANNEL = 'config_changed'
+RECONNECT_DELAY = 5
+# when no notifications arrive for this long, check that the connection
+# is still alive, so that a broken one doesn't go unnoticed
+LIVENESS_CHECK_INTERVAL = 30
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigChangesListener(object):
+    """Keep track of whether the config stored in the db might've changed.
+
+    While the listener is not connected (eg. before the first connection,
+    or after a db failover), it cannot tell, so the config must be
+    checked on every request, same as without the listener.
+    """
+    def __init__(self, check_interval):
+        self._check_interval = check_interval
+        self._changed = threading.Event()
+        self._connected = False
+        self._last_check = 0
+        self._thread = threading.Thread(
+            target=self._listen, name='config-listener', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def should_check(self):
+        """Should the config in the db be checked for changes now?"""
+        now = time.monotonic()
+        if (
+            self._changed.is_set()
+            or not self._connected
+            or now - self._last_check > self._check_interval
+        ):
+            self._changed.clear()
+            self._last_check = now
+            return True
+        return False
+
+    def _connect(self):
+        conn = psycopg2.connect(config.instance.db_url)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute('LISTEN {0}'.format(CONFIG_CHANGED_CHANNEL))
+        return conn
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                self._connected = True
+                # changes might've been missed while not listening
+                self._changed.set()
+                while True:
+                    if select.select([conn], [], [],
+                                     LIVENESS_CHECK_INTERVAL) == ([], [], []):
+                        with conn.cursor() as cur:
+                            cur.execute('SELECT 1')
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self._changed.set()
+            except Exception as e:
+                # whatever went wrong, the thread must keep listening,
+                # so reconnect
+                logger.warning('Error listening for config changes: %s', e)
+            finally:
+                self._connected = False
+                if conn is not None:
+                    conn.close()
+            time.sleep(RECONNECT_DELAY)
+
+
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def get_listener():
+    """Get the listener of the current process, starting it if needed.
+
+    The listener is started lazily, so that when the rest-service runs
+    in a preforking server, each worker process starts its own thread.
+    """
+    global _listener, _listener_pid
+    pid = os.getpid()
+    if _listener is None or _listener_pid != pid:
+        with _listener_lock:
+            if _listener is None or _listener_pid != pid:
+                _listener = ConfigChangesListener(
+                    config.instance.config_check_interval)
+                _listener.start()
+                _listener_pid = pid
+    return _listener
@@ -14,10 +14,15 @@
 import json
 import os
 import tempfile
+import threading
+import time
 import requests
 
 from collections import namedtuple
 
+from cachetools import LRUCache
+from flask import g, has_request_context
+
 from dsl_parser import functions
 from dsl_parser import exceptions as parser_exceptions
 from dsl_parser.constants import CAPABILITIES, EVAL_FUNCS_PATH_PREFIX_KEY
@@ -37,6 +42,7 @@ from cloudify_rest_client.exceptions import (
 )
 
 from manager_rest import (
+    config,
     manager_exceptions,
 )
 
@@ -62,6 +68,7 @@ SECRETS_PROVIDER_SCHEMA = {
             'url',
             'token',
             'path',
+            'cache_ttl',
         ],
     },
     'cloudify': {
@@ -70,6 +77,7 @@ SECRETS_PROVIDER_SCHEMA = {
             'username',
             'password',
             'tenant',
+            'cache_ttl',
         ],
     },
     'local': {
@@ -78,13 +86,44 @@ SECRETS_PROVIDER_SCHEMA = {
 }
 
 
+class FunctionEvaluationCache(object):
+    """Entities fetched while evaluating intrinsic functions.
+
+    Only entities looked up by their id are kept here. Those are the same
+    objects that the db session returns anyway, so the cache can be shared
+    by all the evaluations done while handling a single request.
+    """
+    def __init__(self):
+        self.deployments = {}
+        self.nodes = {}
+        self.node_instances = {}
+
+
+def get_evaluation_cache():
+    """The evaluation cache of the current request.
+
+    Outside of a request, a new cache is returned, so it is only shared
+    by a single evaluation.
+    """
+    if not has_request_context():
+        return FunctionEvaluationCache()
+    if 'function_evaluation_cache' not in g:
+        g.function_evaluation_cache = FunctionEvaluationCache()
+    return g.function_evaluation_cache
+
+
+def reset_evaluation_cache():
+    """Forget the entities cached while handling the previous request"""
+    g.pop('function_evaluation_cache', None)
+
+
 def evaluate_node(node, instance_context=None):
     # dsl-parser uses name in plans, while the db storage uses id :(
     node['name'] = node['id']
     deployment_id = node['deployment_id']
     sm = get_storage_manager()
-    sm.get(Deployment, deployment_id, include=['id'])
     storage = FunctionEvaluationStorage(deployment_id, sm)
+    storage.get_deployment()
     try:
         return functions.evaluate_node_functions(
             node, storage, instance_context=instance_context)
@@ -95,8 +134,8 @@ def evaluate_node(node, instance_context=None):
 def evaluate_node_instance(instance):
     deployment_id = instance['deployment_id']
     sm = get_storage_manager()
-    sm.get(Deployment, deployment_id, include=['id'])
     storage = FunctionEvaluationStorage(deployment_id, sm)
+    storage.get_deployment()
 
     try:
         return functions.evaluate_node_instance_functions(instance, storage)
@@ -109,12 +148,13 @@ def evaluate_intrinsic_functions(
     deployment_id,
     context=None,
     sm=None,
+    cache=None,
 ):
     context = context or {}
     if sm is None:
         sm = get_storage_manager()
-    sm.get(Deployment, deployment_id, include=['id'])
-    storage = FunctionEvaluationStorage(deployment_id, sm)
+    storage = FunctionEvaluationStorage(deployment_id, sm, cache=cache)
+    storage.get_deployment()
 
     try:
         return functions.evaluate_functions(payload, context, storage)
@@ -124,8 +164,8 @@ def evaluate_intrinsic_functions(
 
 def evaluate_deployment_outputs(deployment_id):
     sm = get_storage_manager()
-    deployment = sm.get(Deployment, deployment_id, include=['outputs'])
     storage = FunctionEvaluationStorage(deployment_id, sm)
+    deployment = storage.get_deployment()
     if not deployment.outputs:
         return {}
 
@@ -137,8 +177,8 @@ def evaluate_deployment_outputs(deployment_id):
 
 def evaluate_deployment_capabilities(deployment_id):
     sm = get_storage_manager()
-    deployment = sm.get(Deployment, deployment_id, include=['capabilities'])
     storage = FunctionEvaluationStorage(deployment_id, sm)
+    deployment = storage.get_deployment()
 
     if not deployment.capabilities:
         return {}
@@ -150,16 +190,91 @@ def evaluate_deployment_capabilities(deployment_id):
         raise DeploymentCapabilitiesEvaluationError(str(e))
 
 
+class _SecretValuesCache(object):
+    """Decrypted values of recently used secrets.
+
+    This only saves decrypting the value, or fetching it from the secrets
+    provider: the secret itself is still fetched from the db every time,
+    and a cached value is only used while the secret and its provider
+    stay unchanged. A value stored by an external provider might still
+    change there, so it's only kept for the provider's cache_ttl.
+    """
+    def __init__(self):
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def _get_cache(self):
+        if self._cache is None:
+            self._cache = LRUCache(maxsize=config.instance.secrets_cache_size)
+        return self._cache
+
+    @staticmethod
+    def _version(secret):
+        provider = secret.provider
+        return (
+            secret.value,
+            secret.provider_options,
+            provider.connection_parameters if provider else None,
+        )
+
+    def get(self, secret):
+        with self._lock:
+            cached = self._get_cache().get(secret._storage_id)
+        if cached is None:
+            return None
+        version, value, expires_at = cached
+        if version != self._version(secret) or time.monotonic() > expires_at:
+            return None
+        return value
+
+    def set(self, secret, value, ttl):
+        if not ttl:
+            return
+        cached = (self._version(secret), value, time.monotonic() + ttl)
+        with self._lock:
+            self._get_cache()[secret._storage_id] = cached
+
+    def invalidate(self, secret=None):
+        """Drop the cached value of the secret, or of all the secrets"""
+        with self._lock:
+            if self._cache is None:
+                return
+            if secret is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(secret._storage_id, None)
+
+
+secret_values = _SecretValuesCache()
+
+
+def _get_secret_cache_ttl(secret):
+    ttl = config.instance.secrets_cache_ttl
+    if secret.provider and secret.provider.connection_parameters:
+        try:
+            connection_parameters = json.loads(
+                decrypt(secret.provider.connection_parameters),
+            ) or {}
+            ttl = float(connection_parameters.get('cache_ttl', ttl))
+        except (ValueError, TypeError):
+            pass
+    return ttl
+
+
 def get_secret_method(secret_key, sm=None):
     if sm is None:
         sm = get_storage_manager()
 
     secret = sm.get(Secret, secret_key)
 
-    if secret.provider:
-        decrypted_value = get_secret_from_provider(secret)
-    else:
-        decrypted_value = cryptography_utils.decrypt(secret.value)
+    decrypted_value = secret_values.get(secret)
+    if decrypted_value is None:
+        if secret.provider:
+            decrypted_value = get_secret_from_provider(secret)
+        else:
+            decrypted_value = cryptography_utils.decrypt(secret.value)
+        secret_values.set(
+            secret, decrypted_value, _get_secret_cache_ttl(secret))
 
     return SecretType(secret_key, decrypted_value)
 
@@ -332,8 +447,20 @@ def _get_value_from_cloudify(
     return secret['value']
 
 
+_vault_sessions = {}
+_vault_sessions_lock = threading.Lock()
+
+
+def _get_vault_session(url):
+    """The session used for the Vault server, so it reuses connections"""
+    with _vault_sessions_lock:
+        if url not in _vault_sessions:
+            _vault_sessions[url] = requests.Session()
+        return _vault_sessions[url]
+
+
 def _get_vault_response(url, token, path):
-    response = requests.get(
+    response = _get_vault_session(url).get(
         f'{url}/v1/secret/data/{path}',
         headers={
             "X-Vault-Token": token,
@@ -415,25 +542,49 @@ class FunctionEvaluationStorage(object):
 
     This has to be passed to dsl-parser's functions that evaluate intrinsic
     functions.
+
+    Each entity is only fetched once per evaluation: entities fetched by
+    id are kept in the (usually request-wide) cache, and the results of
+    listing node instances and labels, of fetching secrets, and of
+    evaluating capabilities, are kept for as long as this storage is used.
     """
-    def __init__(self, deployment_id, storage_manager):
+    def __init__(self, deployment_id, storage_manager, cache=None):
         self.sm = storage_manager
         self._deployment_id = deployment_id
         self.secret_method = get_secret_method
+        self._cache = cache or get_evaluation_cache()
+        self._node_instances = {}
+        self._labels = {}
+        self._capabilities = {}
+        self._secrets = {}
+
+    def get_deployment(self, deployment_id=None):
+        deployment_id = deployment_id or self._deployment_id
+        if deployment_id not in self._cache.deployments:
+            self._cache.deployments[deployment_id] = \
+                self.sm.get(Deployment, deployment_id)
+        return self._cache.deployments[deployment_id]
 
     def get_node_instances(self, node_id=None):
-        filters = dict(deployment_id=self._deployment_id)
-        if node_id:
-            filters['node_id'] = node_id
-        instances = self.sm.list(NodeInstance, filters=filters,
-                                 get_all_results=True).items
-        return [ni.to_dict() for ni in instances]
+        if node_id not in self._node_instances:
+            filters = dict(deployment_id=self._deployment_id)
+            if node_id:
+                filters['node_id'] = node_id
+            instances = self.sm.list(NodeInstance, filters=filters,
+                                     get_all_results=True).items
+            for ni in instances:
+                self._cache.node_instances[ni.id] = ni
+            self._node_instances[node_id] = instances
+        return [ni.to_dict() for ni in self._node_instances[node_id]]
 
     def get_node_instance(self, node_instance_id):
-        return self.sm.get(NodeInstance, node_instance_id).to_dict()
+        if node_instance_id not in self._cache.node_instances:
+            self._cache.node_instances[node_instance_id] = \
+                self.sm.get(NodeInstance, node_instance_id)
+        return self._cache.node_instances[node_instance_id].to_dict()
 
     def get_input(self, input_name):
-        deployment = self.sm.get(Deployment, self._deployment_id)
+        deployment = self.get_deployment()
         if not deployment.inputs:
             raise FunctionsEvaluationError(
                 'Inputs are not yet evaluated for deployment '
@@ -441,19 +592,31 @@ class FunctionEvaluationStorage(object):
         return deployment.inputs[input_name]
 
     def get_node(self, node_id):
-        node = get_storage_node(self._deployment_id, node_id)
-        return node.to_dict()
+        key = (self._deployment_id, node_id)
+        if key not in self._cache.nodes:
+            self._cache.nodes[key] = \
+                get_storage_node(self._deployment_id, node_id)
+        return self._cache.nodes[key].to_dict()
 
     def get_secret(self, secret_key):
-        return get_secret_method(
-            secret_key,
-            sm=self.sm,
-        )
+        if secret_key not in self._secrets:
+            self._secrets[secret_key] = get_secret_method(
+                secret_key,
+                sm=self.sm,
+            )
+        return self._secrets[secret_key]
 
     def get_capability(self, capability_path):
         shared_dep_id, element_id = capability_path[0], capability_path[1]
-
-        deployment = self.sm.get(Deployment, shared_dep_id)
+        key = (shared_dep_id, element_id)
+        if key not in self._capabilities:
+            self._capabilities[key] = self._evaluate_capability(
+                shared_dep_id, element_id)
+        return self._get_capability_by_path(
+            self._capabilities[key], capability_path)
+
+    def _evaluate_capability(self, shared_dep_id, element_id):
+        deployment = self.get_deployment(shared_dep_id)
         capabilities = deployment.capabilities or {}
         capability = capabilities.get(element_id)
 
@@ -468,13 +631,13 @@ class FunctionEvaluationStorage(object):
         # We need to evaluate any potential intrinsic functions in the
         # capability's value in the context of the *shared* deployment,
         # instead of the current deployment, so we manually call the function
-        capability = evaluate_intrinsic_functions(
+        return evaluate_intrinsic_functions(
             payload=capability,
             deployment_id=shared_dep_id,
             context={EVAL_FUNCS_PATH_PREFIX_KEY: CAPABILITIES},
             sm=self.sm,
+            cache=self._cache,
         )['value']
-        return self._get_capability_by_path(capability, capability_path)
 
     def _get_capability_by_path(self, value, path):
         if len(path) <= 2:
@@ -522,7 +685,7 @@ class FunctionEvaluationStorage(object):
                     sorted(capabilities.items(), key=lambda item: item[0])]
 
     def get_sys(self, entity, prop):
-        deployment = self.sm.get(Deployment, self._deployment_id)
+        deployment = self.get_deployment()
         if (entity, prop) == ('tenant', 'name'):
             return deployment.tenant.name
         elif (entity, prop) == ('deployment', 'blueprint'):
@@ -537,7 +700,7 @@ class FunctionEvaluationStorage(object):
                                        f'pair: {entity}-{prop}')
 
     def get_consumers(self, prop):
-        deployment = self.sm.get(Deployment, self._deployment_id)
+        deployment = self.get_deployment()
         consumers_list = [lbl.value for lbl in deployment.labels
                           if lbl.key == 'csys-consumer-id']
         if prop == 'ids':
@@ -579,17 +742,19 @@ class FunctionEvaluationStorage(object):
         return cap_values
 
     def get_label(self, label_key, values_list_index):
-        deployment = self.sm.get(Deployment, self._deployment_id)
-        results = self.sm.list(
-            DeploymentLabel,
-            include=['value'],
-            distinct=['value'],
-            filters={'key': label_key,
-                     '_labeled_model_fk': deployment._storage_id},
-            get_all_results=True,
-            sort={'created_at': 'asc', 'value': 'asc'}
-        )
-        label_values = [label.value for label in results]
+        if label_key not in self._labels:
+            deployment = self.get_deployment()
+            results = self.sm.list(
+                DeploymentLabel,
+                include=['value'],
+                distinct=['value'],
+                filters={'key': label_key,
+                         '_labeled_model_fk': deployment._storage_id},
+                get_all_results=True,
+                sort={'created_at': 'asc', 'value': 'asc'}
+            )
+            self._labels[label_key] = [label.value for label in results]
+        label_values = self._labels[label_key]
         if not label_values:
             raise FunctionsEvaluationError(
                 f'The deployment `{self._deployment_id}` does not have a '
@@ -2,7 +2,7 @@ from flask import Flask, current_app
 from flask_migrate import Migrate
 from flask_security import Security
 
-from manager_rest import config, utils
+from manager_rest import config, config_listener, utils
 from manager_rest.storage import user_datastore, db, models
 from manager_rest.storage.models import Tenant
 from manager_rest.config import instance as manager_config
@@ -105,3 +105,18 @@ def query_service_settings():
         current_app.logger.warning('Config has changed - reloading')
         config.instance.load_from_db()
         current_app.logger.setLevel(config.instance.rest_service_log_level)
+
+
+def reload_changed_config():
+    """Reload the config if it was changed in the db.
+
+    Instead of checking the db on every request, only check it if
+    the config listener was notified about a change. In test mode, or
+    if the config_check_interval is 0, always check.
+    """
+    if (
+        config.instance.test_mode
+        or not config.instance.config_check_interval
+        or config_listener.get_listener().should_check()
+    ):
+        query_service_settings()
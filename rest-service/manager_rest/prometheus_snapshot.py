@@ -0,0 +1,192 @@
+"""Periodically refreshed results of Prometheus queries.
+
+Querying Prometheus can take up to monitoring_timeout, so instead of
+querying it when handling a request, the results are stored in a
+snapshot file, which the requests only read.
+
+Every rest-service worker process runs a refresher thread for each query
+it was asked about, but all of these wait for an exclusive lock on the
+query's lock file, so only one of them per host actually queries
+Prometheus, every monitoring_refresh_interval seconds. When the process
+holding the lock exits, another one takes over.
+
+The snapshots are stored in prometheus_snapshot_dir, which must only be
+accessible by the rest-service user, because the snapshots are trusted.
+"""
+import copy
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from manager_rest import config
+from manager_rest.prometheus_client import query as prometheus_query
+
+RETRY_DELAY = 5
+# used when monitoring_timeout is not set, same as its default
+DEFAULT_TIMEOUT = 4
+# how often to check whether the first snapshot was stored
+FIRST_SNAPSHOT_POLL_INTERVAL = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+class PrometheusSnapshot(object):
+    """The latest results of a single Prometheus query.
+
+    Results older than max_staleness are not returned at all, because
+    that means the refresher is stuck (eg. Prometheus is not responding),
+    and so the monitored services' status is not known.
+    """
+    def __init__(self, query_string, refresh_interval, max_staleness,
+                 snapshot_dir):
+        self._query_string = query_string
+        self._refresh_interval = refresh_interval
+        self._max_staleness = max_staleness
+        name = hashlib.sha1(query_string.encode('utf-8')).hexdigest()
+        self._snapshot_dir = snapshot_dir
+        self._snapshot_path = os.path.join(snapshot_dir, f'{name}.json')
+        self._lock_path = os.path.join(snapshot_dir, f'{name}.lock')
+        self._loaded_mtime = None
+        self._loaded = None
+        self._thread = threading.Thread(
+            target=self._refresh_forever,
+            name='prometheus-snapshot',
+            daemon=True,
+        )
+
+    def start(self):
+        _ensure_private_dir(self._snapshot_dir)
+        self._thread.start()
+
+    def exists(self):
+        return os.path.exists(self._snapshot_path)
+
+    def wait_for_results(self, timeout):
+        """Wait for up to timeout seconds for the first snapshot"""
+        deadline = time.monotonic() + timeout
+        while not self.exists() and time.monotonic() < deadline:
+            time.sleep(FIRST_SNAPSHOT_POLL_INTERVAL)
+        return self.get_results()
+
+    def get_results(self):
+        """The results of the query, or None if they're not known.
+
+        The snapshot file is only parsed again after it was replaced.
+        """
+        try:
+            mtime = os.stat(self._snapshot_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._loaded_mtime:
+            try:
+                with open(self._snapshot_path) as f:
+                    self._loaded = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._loaded_mtime = mtime
+        if time.time() - self._loaded['fetched_at'] > self._max_staleness:
+            return None
+        return self._loaded['results']
+
+    def refresh(self):
+        results = prometheus_query(
+            query_string=self._query_string,
+            logger=logger,
+            timeout=_query_timeout(),
+        )
+        snapshot = {'fetched_at': time.time(), 'results': results}
+        # write to a temp file first, so that readers never see a partial
+        # snapshot
+        with tempfile.NamedTemporaryFile(
+            'w', dir=self._snapshot_dir, delete=False,
+        ) as f:
+            json.dump(snapshot, f)
+        os.replace(f.name, self._snapshot_path)
+
+    def _refresh_forever(self):
+        while True:
+            try:
+                _ensure_private_dir(self._snapshot_dir)
+                with open(self._lock_path, 'a') as lock_file:
+                    # wait until this process is the refresher of this host
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    while True:
+                        self.refresh()
+                        time.sleep(self._refresh_interval)
+            except Exception as e:
+                logger.warning('Error refreshing Prometheus results: %s', e)
+            time.sleep(RETRY_DELAY)
+
+
+def _query_timeout():
+    return config.instance.monitoring_timeout or DEFAULT_TIMEOUT
+
+
+def _ensure_private_dir(path):
+    """Create the directory, and check that only this user can access it.
+
+    Otherwise, other users could store fake snapshots, or hold the locks.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() \
+            or st.st_mode & 0o077:
+        raise RuntimeError(
+            f'{path} must be a directory owned by the current user, '
+            f'and only accessible by them')
+
+
+_snapshots = {}
+_snapshots_pid = None
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(query_string):
+    """Get the snapshot of the query, starting its refresher if needed.
+
+    Same as the config listener, the refreshers are started lazily, so
+    that each worker process of a preforking server starts its own.
+    """
+    global _snapshots, _snapshots_pid
+    pid = os.getpid()
+    with _snapshots_lock:
+        if _snapshots_pid != pid:
+            _snapshots = {}
+            _snapshots_pid = pid
+        if query_string not in _snapshots:
+            snapshot = PrometheusSnapshot(
+                query_string,
+                refresh_interval=config.instance.monitoring_refresh_interval,
+                max_staleness=config.instance.monitoring_max_staleness,
+                snapshot_dir=config.instance.prometheus_snapshot_dir,
+            )
+            snapshot.start()
+            _snapshots[query_string] = snapshot
+        return _snapshots[query_string]
+
+
+def query(query_string, logger):
+    """Like prometheus_client.query, but using the snapshot of the results.
+
+    This doesn't query Prometheus. If there are no recent results,
+    the result is empty, same as when Prometheus can't be queried.
+    Only before the first snapshot was stored (ie. right after startup),
+    this waits for it, for up to monitoring_timeout.
+    """
+    snapshot = get_snapshot(query_string)
+    results = snapshot.get_results()
+    if results is None and not snapshot.exists():
+        results = snapshot.wait_for_results(_query_timeout())
+    if results is None:
+        logger.error(
+            'No Prometheus results from the last %s seconds for: %s',
+            config.instance.monitoring_max_staleness, query_string)
+        return []
+    # callers are free to modify the results, so give each a copy
+    return copy.deepcopy(results)
@@ -603,7 +603,9 @@ class ResourceManager(object):
             'db_host': config.instance.db_host,
             'default_tenant_name': DEFAULT_TENANT_NAME,
             'snapshot_restore_threads':
-                config_instance.snapshot_restore_threads
+                config_instance.snapshot_restore_threads,
+            'snapshot_create_threads':
+                config_instance.snapshot_create_threads,
         }
 
     def create_snapshot_model(self,
@@ -1368,8 +1370,7 @@ class ResourceManager(object):
         return executions
 
     def _find_all_components_deployment_id(self, deployment_id):
-        runtime_props_col = db.cast(
-            models.NodeInstance.runtime_properties, JSONB)
+        runtime_props_col = models.NodeInstance.runtime_properties
         node_type_hierarchy_col = db.cast(models.Node.type_hierarchy, JSONB)
 
         # select ni.runtime_props['deployment']['id'] for all NIs of all
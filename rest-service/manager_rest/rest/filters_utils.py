@@ -14,7 +14,14 @@ from manager_rest.constants import (ATTRS_OPERATORS,
 class FilterRule(dict):
     def __init__(self, key, values, operator, filter_rule_type):
         super().__init__()
-        self['key'] = key.lower()
+        if filter_rule_type == FilterRuleType.ATTRIBUTE:
+            # keys inside of JSON attributes (attribute.path) are
+            # case-sensitive
+            attribute, sep, path = key.partition('.')
+            key = attribute.lower() + sep + path
+        else:
+            key = key.lower()
+        self['key'] = key
         self['values'] = values
         self['operator'] = operator
         self['type'] = filter_rule_type
@@ -109,7 +116,7 @@ def create_filter_rules_list(raw_filter_rules: List[dict],
                         filter_rule,
                         f"Values list must be empty if the operator is "
                         f"{AttrsOperator.IS_NOT_EMPTY}")
-            if filter_rule_key not in resource_model.allowed_filter_attrs:
+            if not _is_allowed_attr(resource_model, filter_rule_key):
                 raise BadFilterRule(filter_rule, err_attr_msg)
             if (filter_rule_key == 'schedules' and
                     filter_rule_operator != AttrsOperator.IS_NOT_EMPTY):
@@ -143,6 +150,14 @@ def create_filter_rules_list(raw_filter_rules: List[dict],
     return filter_rules_list
 
 
+def _is_allowed_attr(resource_model, filter_rule_key):
+    if filter_rule_key in resource_model.allowed_filter_attrs:
+        return True
+    attribute, _, path = filter_rule_key.partition('.')
+    return bool(path) and attribute.lower() in getattr(
+        resource_model, 'allowed_filter_json_attrs', [])
+
+
 def _assert_filter_rule_structure(filter_rule):
     if not isinstance(filter_rule, dict):
         raise BadFilterRule(filter_rule, 'The filter rule is not a dictionary')
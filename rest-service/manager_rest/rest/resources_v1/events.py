@@ -21,7 +21,8 @@ from sqlalchemy import (
     bindparam,
     desc,
     literal_column,
-    or_ as sql_or
+    or_ as sql_or,
+    type_coerce,
 )
 from cloudify.models_states import VisibilityState
 
@@ -29,6 +30,7 @@ from manager_rest import manager_exceptions, utils
 from manager_rest.rest.rest_decorators import insecure_rest_method
 from manager_rest.security import SecuredResource
 from manager_rest.security.authorization import authorize
+from manager_rest.storage import events_cursor
 from manager_rest.storage.models_base import db
 from manager_rest.storage.resource_models import (
     Blueprint,
@@ -207,7 +209,17 @@ class Events(SecuredResource):
         return query
 
     @staticmethod
-    def _build_select_query(filters, sort, range_filters, tenant_id):
+    def _encode_cursor(sql_event):
+        """Encode the position of the event as an opaque cursor."""
+        return events_cursor.encode_cursor(
+            sql_event.cursor_timestamp,
+            sql_event._storage_id,
+            sql_event.type,
+        )
+
+    @staticmethod
+    def _build_select_query(filters, sort, range_filters, tenant_id,
+                            cursor=None, include_total=True):
         """Build query used to list events for a given execution.
 
         :param filters:
@@ -239,47 +251,82 @@ class Events(SecuredResource):
             `@` inherited from the old Elasticsearch implementation):
                 {'timestamp': {'from': <iso8601-date>, 'to': <iso8601-date>}}
         :type range_filters: dict(str, str)
+        :param cursor:
+            Keyset pagination: if not None, return the events following
+            the one this cursor was created from (see _encode_cursor), or
+            the first events for an empty cursor. The query is then only
+            limited, and not offset, and it only supports sorting by
+            timestamp.
+        :type cursor: str
+        :param include_total:
+            Whether to count all the matching events. This requires
+            going over all of them, so it's best skipped when tailing.
+        :type include_total: bool
         :returns:
             A SQL query that returns the events found that match the conditions
-            passed as arguments.
+            passed as arguments, and the count of those events (or None, if
+            include_total is False).
         :rtype: :class:`sqlalchemy.orm.query.Query`
 
         """
         assert isinstance(filters, dict), \
             'Filters is expected to be a dictionary'
 
+        use_cursor = cursor is not None
+        if sort:
+            _, sort_direction = dict(sort).popitem()
+        else:
+            sort_direction = 'asc'
+        if use_cursor:
+            if any(field.lstrip('@') != 'timestamp' for field in sort):
+                raise manager_exceptions.BadParametersError(
+                    'Only sorting by timestamp is supported when using '
+                    'a cursor')
+            cursor = events_cursor.decode_cursor(cursor)
+
         subqueries = []
-        if (('type' not in filters or 'cloudify_event' in filters['type']) and
-                ('level' not in filters)):
-            events_query = Events._build_select_subquery(
-                Event, filters, range_filters, tenant_id)
-            subqueries.append(events_query)
-
-        if (('type' not in filters or 'cloudify_log' in filters['type']) and
-                ('event_type' not in filters)):
-            logs_query = Events._build_select_subquery(
-                Log, filters, range_filters, tenant_id)
-            subqueries.append(logs_query)
+        for model, type_filter, excluding_filter in [
+            (Event, 'cloudify_event', 'level'),
+            (Log, 'cloudify_log', 'event_type'),
+        ]:
+            if 'type' in filters and type_filter not in filters['type']:
+                continue
+            if excluding_filter in filters:
+                continue
+            subquery = Events._build_select_subquery(
+                model, filters, range_filters, tenant_id)
+            if use_cursor:
+                subquery = subquery.add_columns(
+                    type_coerce(model.timestamp, db.DateTime)
+                    .label('cursor_timestamp'))
+                if cursor:
+                    subquery = subquery.filter(*events_cursor.after_cursor(
+                        model, cursor, sort_direction))
+            subqueries.append(subquery)
 
         if subqueries:
             query = reduce(
                 lambda left, right: left.union_all(right),
                 subqueries,
             )
-            total = query.count()
-            query = Events._apply_sort(query, sort)
-            if sort:
-                _, sort_direction = dict(sort).popitem()
+            total = query.count() if include_total else None
+            if use_cursor:
+                query = Events._apply_sort(query, {
+                    'cursor_timestamp': sort_direction,
+                    '_storage_id': sort_direction,
+                    'type': sort_direction,
+                })
+                query = query.limit(bindparam('limit'))
             else:
-                sort_direction = 'asc'
-            query = Events._apply_sort(query, {
-                'timestamp': sort_direction, '_storage_id': sort_direction
-            })
-            query = (
-                query
-                .limit(bindparam('limit'))
-                .offset(bindparam('offset'))
-            )
+                query = Events._apply_sort(query, sort)
+                query = Events._apply_sort(query, {
+                    'timestamp': sort_direction, '_storage_id': sort_direction
+                })
+                query = (
+                    query
+                    .limit(bindparam('limit'))
+                    .offset(bindparam('offset'))
+                )
         else:
             # Simple query that returns no results
             # Used when filtering by a field that doesn't exist for a type
@@ -287,7 +334,7 @@ class Events(SecuredResource):
                 db.session.query(Event.timestamp)
                 .filter(Event.timestamp is None)
             )
-            total = query.count()
+            total = query.count() if include_total else None
 
         return query, total
 
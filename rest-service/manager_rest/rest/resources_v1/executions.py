@@ -30,6 +30,9 @@ from manager_rest.storage import (
     get_storage_manager,
     models,
 )
+from manager_rest.storage.operations_counts import (
+    add_pending_operations_counts,
+)
 
 
 class Executions(SecuredResource):
@@ -65,10 +68,12 @@ class Executions(SecuredResource):
         )
         deployment_id_filter = ResourceManager.create_filters_dict(
             deployment_id=args.deployment_id)
-        return get_resource_manager().list_executions(
+        executions = get_resource_manager().list_executions(
             is_include_system_workflows=args.include_system_workflows,
             include=_include,
             filters=deployment_id_filter).items
+        add_pending_operations_counts(executions)
+        return executions
 
     @authorize('execution_start')
     @not_while_cancelling
@@ -285,11 +290,13 @@ class ExecutionsId(SecuredResource):
         """
         Get execution by id
         """
-        return get_storage_manager().get(
+        execution = get_storage_manager().get(
             models.Execution,
             execution_id,
             include=_include
         )
+        add_pending_operations_counts([execution])
+        return execution
 
     @swagger.operation(
         responseClass=models.Execution,
@@ -14,6 +14,7 @@
 #  * limitations under the License.
 #
 
+from flask import request
 from sqlalchemy import bindparam
 from datetime import datetime
 import errno
@@ -23,6 +24,7 @@ from manager_rest import manager_exceptions
 from manager_rest.rest import (
     resources_v1,
     rest_decorators,
+    rest_utils,
     swagger,
 )
 from manager_rest.storage.models_base import db
@@ -78,6 +80,11 @@ class Events(resources_v1.Events):
             Parameters used to limit results returned in a single query.
             Expected values `size` and `offset` are mapped into SQL as `LIMIT`
             and `OFFSET`.
+            Alternatively, pass the `_cursor` request argument (empty at
+            first, and then the `next_cursor` returned in the pagination
+            metadata) to resume listing after the last returned event,
+            without scanning the ones before it. In that mode, the total
+            is only counted if `_include_total` is passed.
         :type pagination: dict(str, int)
         :param sort:
             Result sorting order. The only allowed and expected value is to
@@ -96,6 +103,17 @@ class Events(resources_v1.Events):
         """
         size = pagination.get('size', self.DEFAULT_SEARCH_SIZE)
         offset = pagination.get('offset', 0)
+        cursor = request.args.get('_cursor')
+        if cursor is not None:
+            if offset:
+                raise manager_exceptions.BadParametersError(
+                    '_offset cannot be used together with _cursor')
+            include_total = rest_utils.verify_and_convert_bool(
+                '_include_total', request.args.get('_include_total', False))
+            return self._list_with_cursor(
+                _include, filters, size, sort, range_filters, cursor,
+                include_total)
+
         params = {
             'limit': size,
             'offset': offset,
@@ -119,6 +137,39 @@ class Events(resources_v1.Events):
         }
         return ListResult(results, metadata)
 
+    def _list_with_cursor(self, _include, filters, size, sort,
+                          range_filters, cursor, include_total):
+        """List events using keyset pagination.
+
+        The returned next_cursor points at the last returned event, so
+        that the next page can be fetched starting right after it. If no
+        events were returned, the cursor passed in is returned, so that
+        a client tailing an execution can keep polling with it.
+        """
+        select_query, total = self._build_select_query(
+            filters, sort, range_filters, self.current_tenant.id,
+            cursor=cursor, include_total=include_total,
+        )
+        events = select_query.params(limit=size).all()
+        if events:
+            cursor = self._encode_cursor(events[-1])
+
+        results = []
+        for event in events:
+            result = self._map_event_to_dict(_include, event)
+            result.pop('cursor_timestamp', None)
+            results.append(result)
+
+        metadata = {
+            'pagination': {
+                'size': size,
+                'offset': 0,
+                'total': total,
+                'next_cursor': cursor,
+            }
+        }
+        return ListResult(results, metadata)
+
     def post(self):
         raise manager_exceptions.MethodNotAllowedError()
 
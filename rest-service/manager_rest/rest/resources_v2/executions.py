@@ -26,6 +26,10 @@ from manager_rest.rest import (
 from manager_rest.storage import (
     models,
 )
+from manager_rest.storage.operations_counts import (
+    add_pending_operations_counts,
+    project_operations_counts,
+)
 from manager_rest.security.authorization import authorize
 from manager_rest.utils import create_filter_params_list_description
 
@@ -48,7 +52,7 @@ class Executions(resources_v1.Executions):
         ]
     )
     @authorize('execution_list', allow_all_tenants=True)
-    @rest_decorators.marshal_with(models.Execution)
+    @rest_decorators.marshal_with(models.Execution, project_columns=True)
     @rest_decorators.create_filters(models.Execution)
     @rest_decorators.paginate
     @rest_decorators.sortable(models.Execution)
@@ -69,12 +73,14 @@ class Executions(resources_v1.Executions):
             '_get_all_results',
             request.args.get('_get_all_results', False)
         )
-        return get_resource_manager().list_executions(
+        executions = get_resource_manager().list_executions(
             filters=filters,
             pagination=pagination,
             sort=sort,
             is_include_system_workflows=is_include_system_workflows,
-            include=_include,
+            include=project_operations_counts(_include),
             all_tenants=all_tenants,
             get_all_results=get_all_results,
         )
+        add_pending_operations_counts(executions.items)
+        return executions
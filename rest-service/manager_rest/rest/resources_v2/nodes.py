@@ -96,7 +96,7 @@ class NodeInstances(resources_v1.NodeInstances):
         )
     )
     @authorize('node_instance_list', allow_all_tenants=True)
-    @rest_decorators.marshal_with(models.NodeInstance)
+    @rest_decorators.marshal_with(models.NodeInstance, project_columns=True)
     @rest_decorators.create_filters(models.NodeInstance)
     @rest_decorators.paginate
     @rest_decorators.sortable(models.NodeInstance)
@@ -18,6 +18,7 @@ from manager_rest.manager_exceptions import (BadParametersError,
                                              NotListeningLDAPServer)
 from manager_rest.workflow_executor import restart_restservice
 from manager_rest.constants import (
+    CLOUDIFY_TENANT_HEADER,
     FILE_SERVER_BLUEPRINTS_FOLDER,
     FILE_SERVER_DEPLOYMENTS_FOLDER,
     FILE_SERVER_TENANT_RESOURCES_FOLDER,
@@ -87,6 +88,20 @@ class FileServerAuth(SecuredResource):
             return False
         return blueprint.visibility == VisibilityState.GLOBAL
 
+    @staticmethod
+    def _verify_events(uri, method):
+        # only the events stream is served by the api-service
+        if method == 'GET':
+            check_user_action_allowed(
+                'event_list', request.headers.get(CLOUDIFY_TENANT_HEADER))
+        else:
+            # This must be a 401 or 403 to work with nginx's auth_check
+            raise ForbiddenError(
+                'Method {} is not permitted on this {}.'.format(
+                    method, uri,
+                )
+            )
+
     @staticmethod
     def _verify_audit(uri, method):
         if method == 'GET':
@@ -117,6 +132,8 @@ class FileServerAuth(SecuredResource):
 
             if resource.startswith('audit'):
                 self._verify_audit(uri, method)
+            elif resource.startswith('events'):
+                self._verify_events(uri, method)
         self._verify_tenant(uri)
 
         # verified successfully
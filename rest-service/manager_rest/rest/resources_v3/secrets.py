@@ -22,6 +22,7 @@ from ..responses_v3 import SecretsListResponse
 from manager_rest import manager_exceptions
 from manager_rest.dsl_functions import (
     get_secret_method,
+    secret_values,
 )
 from manager_rest.utils import current_tenant
 from manager_rest.security import SecuredResource
@@ -110,6 +111,7 @@ class SecretsKey(SecuredResource):
         except manager_exceptions.ConflictError:
             if secret['update_if_exists']:
                 existing_secret = get_storage_manager().get(models.Secret, key)
+                secret_values.invalidate(existing_secret)
                 return update_secret(existing_secret, secret)
             raise
 
@@ -133,6 +135,7 @@ class SecretsKey(SecuredResource):
         self._update_provider(secret)
         self._update_provider_options(secret)
         secret.updated_at = utils.get_formatted_timestamp()
+        secret_values.invalidate(secret)
         return get_storage_manager().update(secret, validate_global=True)
 
     @authorize('secret_delete')
@@ -144,6 +147,7 @@ class SecretsKey(SecuredResource):
         storage_manager = get_storage_manager()
         secret = storage_manager.get(models.Secret, key)
         self._validate_secret_modification_permitted(secret)
+        secret_values.invalidate(secret)
         storage_manager.delete(secret, validate_global=True)
         return None, 204
 
@@ -612,6 +616,7 @@ class SecretsImport(SecuredResource):
         except manager_exceptions.ConflictError:
             if override_collisions:
                 existing_secret = self._get_secret_object(secret)
+                secret_values.invalidate(existing_secret)
                 update_imported_secret(existing_secret, secret)
             add_to_dict_values(colliding_secrets, secret['tenant_name'],
                                secret['key'])
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import datetime
 from flask import request
 from flask_restful.reqparse import Argument
@@ -23,6 +24,7 @@ from manager_rest.storage import (
     models,
     db,
 )
+from manager_rest.storage.operations_counts import record_operations_counts
 from manager_rest.security.authorization import authorize
 from manager_rest.resource_manager import get_resource_manager
 from manager_rest.security import SecuredResource
@@ -30,7 +32,166 @@ from manager_rest.security.authorization import check_user_action_allowed
 from manager_rest.execution_token import current_execution
 
 
-class Operations(SecuredResource):
+class OperationStateUpdateMixin(object):
+    """Applying the state updates reported by workflows to operations"""
+    STATE_UPDATE_PARAMS = {
+        'state': {'type': str},
+        'result': {'optional': True},
+        'exception': {'optional': True},
+        'exception_causes': {'optional': True},
+        'manager_name': {'optional': True},
+        'agent_name': {'optional': True},
+    }
+
+    def _update_operation_state(self, sm, instance, update):
+        """Apply the state update to the (locked) operation.
+
+        The event describing the update is not inserted, but returned,
+        so that the caller can insert events in bulk.
+
+        :return: a tuple of (values of the event to insert, or None;
+            the change in the number of finished operations)
+        """
+        old_state = instance.state
+        instance.manager_name = update.get('manager_name')
+        instance.agent_name = update.get('agent_name')
+        instance.state = update.get('state', instance.state)
+        if instance.state == common_constants.TASK_SUCCEEDED:
+            self._on_task_success(sm, instance)
+        event = self._operation_event(
+            instance,
+            update.get('result'),
+            update.get('exception'),
+            update.get('exception_causes')
+        )
+        finished_delta = 0
+        if not instance.is_nop and \
+                old_state not in common_constants.TERMINATED_STATES and \
+                instance.state in common_constants.TERMINATED_STATES:
+            finished_delta = 1
+        sm.update(
+            instance,
+            modified_attrs=('state', 'manager_name', 'agent_name')
+        )
+        return event, finished_delta
+
+    def _on_task_success(self, sm, operation):
+        handler = getattr(self, f'_on_success_{operation.type}', None)
+        if handler:
+            handler(sm, operation)
+
+    def _on_success_SetNodeInstanceStateTask(self, sm, operation):
+        required_permission = 'node_instance_update'
+        tenant_name = current_execution.tenant.name
+        check_user_action_allowed(required_permission,
+                                  tenant_name=tenant_name)
+        try:
+            kwargs = operation.parameters['task_kwargs']
+            node_instance_id = kwargs['node_instance_id']
+            state = kwargs['state']
+        except KeyError:
+            return
+        node_instance = sm.get(
+            models.NodeInstance, node_instance_id, locking=True)
+        if node_instance.system_properties is None:
+            node_instance.system_properties = {}
+        if state == 'configured':
+            node_instance.system_properties['configuration_drift'] = {
+                    'ok': True,
+                    'result': None,
+                    'task': None,
+                    'timestamp': datetime.utcnow().isoformat(),
+                }
+            node_instance.update_configuration_drift()
+        elif state == 'started':
+            node_instance.system_properties['previous_status'] = None
+            node_instance.system_properties['status'] = {
+                    'ok': True,
+                    'result': None,
+                    'task': None,
+                    'timestamp': datetime.utcnow().isoformat(),
+                }
+            node_instance.update_status_check()
+        node_instance.state = state
+        sm.update(node_instance, modified_attrs=('state', 'system_properties'))
+
+    def _on_success_SendNodeEventTask(self, sm, operation):
+        try:
+            kwargs = operation.parameters['task_kwargs']
+        except KeyError:
+            return
+        db.session.execute(models.Event.__table__.insert().values(
+            timestamp=datetime.utcnow(),
+            reported_timestamp=datetime.utcnow(),
+            event_type='workflow_node_event',
+            message=kwargs['event'],
+            message_code=None,
+            operation=None,
+            node_id=kwargs['node_instance_id'],
+            manager_name=operation.manager_name,
+            agent_name=operation.agent_name,
+            _execution_fk=current_execution._storage_id,
+            _tenant_id=current_execution._tenant_id,
+            _creator_id=current_execution._creator_id,
+            visibility=current_execution.visibility,
+        ))
+
+    def _operation_event(self, operation, result=None, exception=None,
+                         exception_causes=None):
+        if operation.type not in ('RemoteWorkflowTask', 'SubgraphTask'):
+            return None
+        if not current_execution:
+            return None
+        try:
+            context = operation.parameters['task_kwargs']['kwargs'][
+                '__cloudify_context']
+        except (KeyError, TypeError):
+            context = {}
+        if exception is not None:
+            operation.parameters.setdefault('error', str(exception))
+        current_retries = operation.parameters.get('current_retries') or 0
+        total_retries = operation.parameters.get('total_retries') or 0
+
+        try:
+            message = common_events.format_event_message(
+                operation.name,
+                operation.type,
+                operation.state,
+                result,
+                exception,
+                current_retries,
+                total_retries,
+            )
+            event_type = common_events.get_event_type(operation.state)
+        except RuntimeError:
+            return None
+
+        return dict(
+            timestamp=datetime.utcnow(),
+            reported_timestamp=datetime.utcnow(),
+            event_type=event_type,
+            message=message,
+            message_code=None,
+            operation=context.get('operation', {}).get('name'),
+            node_id=context.get('node_id'),
+            source_id=context.get('source_id'),
+            target_id=context.get('target_id'),
+            error_causes=exception_causes,
+            manager_name=operation.manager_name,
+            agent_name=operation.agent_name,
+            _execution_fk=current_execution._storage_id,
+            _tenant_id=current_execution._tenant_id,
+            _creator_id=current_execution._creator_id,
+            visibility=current_execution.visibility,
+        )
+
+    def _insert_events(self, events):
+        events = [event for event in events if event]
+        if events:
+            db.session.execute(models.Event.__table__.insert(), events)
+
+
+class Operations(OperationStateUpdateMixin, SecuredResource):
     @authorize('operations')
     @marshal_with(models.Operation)
     @paginate
@@ -80,6 +241,75 @@ class Operations(SecuredResource):
             self._update_stored_operations()
         return None, 204
 
+    @authorize('operations', allow_if_execution=True)
+    @detach_globals
+    def patch(self, **kwargs):
+        """Update the state of many operations at once.
+
+        This is the bulk version of PATCH /operations/<id>: all the
+        updates are applied in a single transaction, the events are
+        inserted together, and the changes to the executions'
+        finished_operations are recorded once per tasks graph.
+        """
+        request_dict = get_json_and_verify_params({
+            'operations': {'type': list},
+        })
+        updates = request_dict['operations']
+        for update in updates:
+            if not isinstance(update, dict) or not update.get('id'):
+                raise manager_exceptions.BadParametersError(
+                    'Each operation update must be a dict with an id, '
+                    'got: {0}'.format(update))
+            for param_name, param_spec in self.STATE_UPDATE_PARAMS.items():
+                if param_name not in update:
+                    if param_spec.get('optional', False):
+                        continue
+                    raise manager_exceptions.BadParametersError(
+                        '{0}: missing {1}'.format(update['id'], param_name))
+                param_type = param_spec.get('type')
+                if param_type and not isinstance(
+                        update[param_name], param_type):
+                    raise manager_exceptions.BadParametersError(
+                        '{0}: {1} must be of type {2}'.format(
+                            update['id'], param_name, param_type.__name__))
+        if not updates:
+            return {}, 200
+
+        sm = get_storage_manager()
+        with sm.transaction():
+            # lock the operations in a consistent order, so that
+            # concurrent bulk updates can't deadlock
+            operation_ids = sorted({update['id'] for update in updates})
+            operations = {
+                op.id: op for op in sm.list(
+                    models.Operation,
+                    filters={'id': operation_ids},
+                    sort={'id': 'asc'},
+                    get_all_results=True,
+                    locking=True,
+                )
+            }
+            missing = set(operation_ids) - set(operations)
+            if missing:
+                raise manager_exceptions.NotFoundError(
+                    'Requested `Operation`s were not found: {0}'.format(
+                        ', '.join(sorted(missing))))
+
+            events = []
+            finished_by_graph = defaultdict(int)
+            for update in updates:
+                instance = operations[update['id']]
+                event, finished_delta = self._update_operation_state(
+                    sm, instance, update)
+                events.append(event)
+                finished_by_graph[instance._tasks_graph_fk] += finished_delta
+            self._insert_events(events)
+            record_operations_counts({
+                graph_fk: (finished_delta, 0)
+                for graph_fk, finished_delta in finished_by_graph.items()
+            })
+        return {}, 200
+
     def _update_stored_operations(self):
         """Recompute operation inputs, for resumable ops of the given node
 
@@ -179,7 +409,7 @@ class Operations(SecuredResource):
         sm.update(operation, modified_attrs=['parameters'])
 
 
-class OperationsId(SecuredResource):
+class OperationsId(OperationStateUpdateMixin, SecuredResource):
     @authorize('operations')
     @marshal_with(models.Operation)
     def get(self, operation_id, **kwargs):
@@ -208,177 +438,18 @@ class OperationsId(SecuredResource):
     @authorize('operations', allow_if_execution=True)
     @detach_globals
     def patch(self, operation_id, **kwargs):
-        request_dict = get_json_and_verify_params({
-            'state': {'type': str},
-            'result': {'optional': True},
-            'exception': {'optional': True},
-            'exception_causes': {'optional': True},
-            'manager_name': {'optional': True},
-            'agent_name': {'optional': True},
-        })
+        request_dict = get_json_and_verify_params(self.STATE_UPDATE_PARAMS)
         sm = get_storage_manager()
         with sm.transaction():
             instance = sm.get(models.Operation, operation_id, locking=True)
-            old_state = instance.state
-            instance.manager_name = request_dict.get('manager_name')
-            instance.agent_name = request_dict.get('agent_name')
-            instance.state = request_dict.get('state', instance.state)
-            if instance.state == common_constants.TASK_SUCCEEDED:
-                self._on_task_success(sm, instance)
-            self._insert_event(
-                instance,
-                request_dict.get('result'),
-                request_dict.get('exception'),
-                request_dict.get('exception_causes')
-            )
-            if not instance.is_nop and \
-                    old_state not in common_constants.TERMINATED_STATES and \
-                    instance.state in common_constants.TERMINATED_STATES:
-                self._modify_execution_operations_counts(instance, 1)
-            sm.update(
-                instance,
-                modified_attrs=('state', 'manager_name', 'agent_name')
-            )
+            event, finished_delta = self._update_operation_state(
+                sm, instance, request_dict)
+            self._insert_events([event])
+            record_operations_counts({
+                instance._tasks_graph_fk: (finished_delta, 0),
+            })
         return {}, 200
 
-    def _on_task_success(self, sm, operation):
-        handler = getattr(self, f'_on_success_{operation.type}', None)
-        if handler:
-            handler(sm, operation)
-
-    def _on_success_SetNodeInstanceStateTask(self, sm, operation):
-        required_permission = 'node_instance_update'
-        tenant_name = current_execution.tenant.name
-        check_user_action_allowed(required_permission,
-                                  tenant_name=tenant_name)
-        try:
-            kwargs = operation.parameters['task_kwargs']
-            node_instance_id = kwargs['node_instance_id']
-            state = kwargs['state']
-        except KeyError:
-            return
-        node_instance = sm.get(
-            models.NodeInstance, node_instance_id, locking=True)
-        if node_instance.system_properties is None:
-            node_instance.system_properties = {}
-        if state == 'configured':
-            node_instance.system_properties['configuration_drift'] = {
-                    'ok': True,
-                    'result': None,
-                    'task': None,
-                    'timestamp': datetime.utcnow().isoformat(),
-                }
-            node_instance.update_configuration_drift()
-        elif state == 'started':
-            node_instance.system_properties['previous_status'] = None
-            node_instance.system_properties['status'] = {
-                    'ok': True,
-                    'result': None,
-                    'task': None,
-                    'timestamp': datetime.utcnow().isoformat(),
-                }
-            node_instance.update_status_check()
-        node_instance.state = state
-        sm.update(node_instance, modified_attrs=('state', 'system_properties'))
-
-    def _on_success_SendNodeEventTask(self, sm, operation):
-        try:
-            kwargs = operation.parameters['task_kwargs']
-        except KeyError:
-            return
-        db.session.execute(models.Event.__table__.insert().values(
-            timestamp=datetime.utcnow(),
-            reported_timestamp=datetime.utcnow(),
-            event_type='workflow_node_event',
-            message=kwargs['event'],
-            message_code=None,
-            operation=None,
-            node_id=kwargs['node_instance_id'],
-            manager_name=operation.manager_name,
-            agent_name=operation.agent_name,
-            _execution_fk=current_execution._storage_id,
-            _tenant_id=current_execution._tenant_id,
-            _creator_id=current_execution._creator_id,
-            visibility=current_execution.visibility,
-        ))
-
-    def _insert_event(self, operation, result=None, exception=None,
-                      exception_causes=None):
-        if operation.type not in ('RemoteWorkflowTask', 'SubgraphTask'):
-            return
-        if not current_execution:
-            return
-        try:
-            context = operation.parameters['task_kwargs']['kwargs'][
-                '__cloudify_context']
-        except (KeyError, TypeError):
-            context = {}
-        if exception is not None:
-            operation.parameters.setdefault('error', str(exception))
-        current_retries = operation.parameters.get('current_retries') or 0
-        total_retries = operation.parameters.get('total_retries') or 0
-
-        try:
-            message = common_events.format_event_message(
-                operation.name,
-                operation.type,
-                operation.state,
-                result,
-                exception,
-                current_retries,
-                total_retries,
-            )
-            event_type = common_events.get_event_type(operation.state)
-        except RuntimeError:
-            return
-
-        db.session.execute(models.Event.__table__.insert().values(
-            timestamp=datetime.utcnow(),
-            reported_timestamp=datetime.utcnow(),
-            event_type=event_type,
-            message=message,
-            message_code=None,
-            operation=context.get('operation', {}).get('name'),
-            node_id=context.get('node_id'),
-            source_id=context.get('source_id'),
-            target_id=context.get('target_id'),
-            error_causes=exception_causes,
-            manager_name=operation.manager_name,
-            agent_name=operation.agent_name,
-            _execution_fk=current_execution._storage_id,
-            _tenant_id=current_execution._tenant_id,
-            _creator_id=current_execution._creator_id,
-            visibility=current_execution.visibility,
-        ))
-
-    def _modify_execution_operations_counts(self, operation, finished_delta,
-                                            total_delta=0):
-        """Increase finished_operations for this operation's execution
-
-        This is a separate sql-level update query, rather than ORM-level
-        calls, for performance: the operation state-update call is on
-        the critical path for all operations in a workflow; this saves
-        about 3ms over the ORM approach (which requires fetching the
-        execution; more if the DB is not local).
-        """
-        exc_table = models.Execution.__table__
-        tg_table = models.TasksGraph.__table__
-        values = {}
-        if finished_delta:
-            values['finished_operations'] =\
-                exc_table.c.finished_operations + finished_delta
-        if total_delta:
-            values['total_operations'] =\
-                exc_table.c.total_operations + total_delta
-        db.session.execute(
-            exc_table.update()
-            .where(db.and_(
-                tg_table.c._execution_fk == exc_table.c._storage_id,
-                tg_table.c._storage_id == operation._tasks_graph_fk,
-            ))
-            .values(**values)
-        )
-
     @authorize('operations')
     @marshal_with(models.Operation)
     def delete(self, operation_id, **kwargs):
@@ -391,8 +462,9 @@ class OperationsId(SecuredResource):
                     if instance.state in common_constants.TERMINATED_STATES
                     else 0
                 )
-                self._modify_execution_operations_counts(
-                    instance, finished_delta, total_delta=-1)
+                record_operations_counts({
+                    instance._tasks_graph_fk: (finished_delta, -1),
+                })
             sm.delete(instance)
         return instance, 200
 
@@ -10,6 +10,7 @@ from manager_rest.rest import swagger
 from manager_rest.security import SecuredResource
 from manager_rest.security.authorization import authorize
 from manager_rest.storage import models, get_storage_manager
+from manager_rest.storage.filters import capabilities_filter
 from manager_rest.constants import (ATTRS_OPERATORS,
                                     FILTER_RULE_TYPES,
                                     LABELS_OPERATORS)
@@ -354,7 +355,8 @@ class CapabilitiesSearches(ResourceSearches):
         responseClass=f'List[{responses_v3.DeploymentCapabilities.__name__}]',
         nickname="list",
         notes="Returns a filtered list of existing capabilities of a specific "
-              "deployment.",
+              "deployment. The deployments are paginated after the ones "
+              "that can't have matching capabilities are skipped.",
         parameters=[
             {
                 'in': 'query',
@@ -415,15 +417,38 @@ class CapabilitiesSearches(ResourceSearches):
             request.args.get('_get_all_results', False)
         )
 
+        # narrow down the deployments in the db, so that only the ones
+        # that might have matching capabilities are fetched
+        filters = {}
+        matching_capabilities = capabilities_filter(
+            key_specs=constraints.get('capability_key_specs'),
+            valid_values=constraints.get('valid_values'),
+            search_value=search,
+        )
+        if matching_capabilities:
+            filters['capabilities'] = matching_capabilities
+
         deployments = get_storage_manager().list(
             models.Deployment,
             include=_include,
+            filters=filters,
             substr_filters={'id': deployment_id},
             pagination=pagination,
             all_tenants=all_tenants,
             get_all_results=get_all_results,
         )
         metadata = deployments.metadata
+        total_deployments = metadata['pagination']['total']
+        if filters:
+            # filtered counts all the deployments without matching
+            # capabilities, including the ones skipped in the db
+            total_deployments = get_storage_manager().list(
+                models.Deployment,
+                include=['id'],
+                substr_filters={'id': deployment_id},
+                pagination={'size': 0},
+                all_tenants=all_tenants,
+            ).metadata['pagination']['total']
 
         dep_capabilities = defaultdict(lambda: [])
         for dep in deployments:
@@ -438,8 +463,7 @@ class CapabilitiesSearches(ResourceSearches):
                 if capability_matches(key, capability, constraints, search):
                     dep_capabilities[dep.id].append({key: capability})
 
-        metadata['filtered'] = \
-            metadata['pagination']['total'] - len(dep_capabilities)
+        metadata['filtered'] = total_deployments - len(dep_capabilities)
         metadata['pagination']['total'] = len(dep_capabilities)
         return ListResponse(
             items=[{'deployment_id': k, 'capabilities': v}
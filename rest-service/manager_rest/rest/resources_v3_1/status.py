@@ -15,7 +15,7 @@ from manager_rest.security.authorization import authorize
 from manager_rest.rest.rest_decorators import marshal_with
 from manager_rest.rest.rest_utils import verify_and_convert_bool
 from manager_rest.syncthing_status_manager import get_syncthing_status
-from manager_rest.prometheus_client import query as prometheus_query
+from manager_rest.prometheus_snapshot import query as prometheus_query
 
 try:
     from cloudify_premium.ha import utils as ha_utils
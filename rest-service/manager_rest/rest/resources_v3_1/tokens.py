@@ -7,6 +7,7 @@ from flask_security import current_user
 from manager_rest.manager_exceptions import NotFoundError
 from manager_rest.rest import responses
 from manager_rest.security import SecuredResource
+from manager_rest.security.user_handler import verified_tokens
 from manager_rest.security.authorization import (authorize,
                                                  is_user_action_allowed)
 from manager_rest.storage import models, get_storage_manager
@@ -65,7 +66,9 @@ class TokensId(SecuredResource):
         sm = get_storage_manager()
         token = sm.get(models.Token, token_id, fail_silently=True)
         if token and _can_manage_token(token):
+            secret_hash = token.secret_hash
             sm.delete(token)
+            verified_tokens.invalidate(secret_hash)
             return None, 204
         else:
             raise NotFoundError(f'Could not find token {token_id}')
@@ -96,6 +99,9 @@ def _purge_expired_user_tokens():
         models.Token.expiration_date <= datetime.utcnow()
     ).all()
     if expired:
+        secret_hashes = [token.secret_hash for token in expired]
         for token in expired:
             db.session.delete(token)
         db.session.commit()
+        for secret_hash in secret_hashes:
+            verified_tokens.invalidate(secret_hash)
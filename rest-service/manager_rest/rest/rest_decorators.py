@@ -1,5 +1,6 @@
 import inspect
 from functools import wraps
+from operator import attrgetter
 from collections import OrderedDict
 from typing import Dict
 from datetime import datetime
@@ -12,8 +13,12 @@ from cloudify.models_states import ExecutionState
 from manager_rest import config, manager_exceptions
 from manager_rest.utils import current_tenant
 from manager_rest.security.authorization import is_user_action_allowed
-from manager_rest.storage.models_base import SQLModelBase, db
+from manager_rest.storage.models_base import (SQLModelBase,
+                                              SerializationPlan,
+                                              db)
 from manager_rest.storage.management_models import User
+from manager_rest.storage.resource_models_base import SQLResourceBase
+from manager_rest.storage.storage_manager import Projection
 from manager_rest.execution_token import current_execution
 from manager_rest.rest.rest_utils import (
     normalize_value,
@@ -72,11 +77,110 @@ def insecure_rest_method(func):
     return wrapper
 
 
+# how flask-restful's simple fields format non-None values
+_FIELD_FORMATTERS = {
+    fields.Raw: None,
+    fields.String: str,
+    fields.Integer: int,
+    fields.Boolean: bool,
+    fields.Float: float,
+}
+
+
+def _compile_field(field):
+    """A function formatting a value the same way the field would.
+
+    :return: the function, or None if the field is not a simple one
+    """
+    field_class = field if isinstance(field, type) else type(field)
+    if field_class not in _FIELD_FORMATTERS:
+        return None
+    if isinstance(field, type):
+        field = field()
+    if field.attribute is not None:
+        return None
+    formatter = _FIELD_FORMATTERS[field_class]
+    default = field.default
+    if formatter is None:
+        return lambda value: default if value is None else value
+    return lambda value: default if value is None else formatter(value)
+
+
+class CompiledSerializer(object):
+    """Serialize list items, the same as to_response & marshal would.
+
+    This avoids creating the intermediate to_response dicts, and going
+    through flask-restful's generic marshalling of every field of every
+    item. It's only usable when all the fields are simple ones, and the
+    model doesn't customize its to_response.
+    """
+    def __init__(self, model_class, fields_to_include):
+        self.model_class = model_class
+        self.field_names = list(fields_to_include)
+        formatters = [_compile_field(field)
+                      for field in fields_to_include.values()]
+        self.usable = (
+            all(formatters)
+            and self._default_to_response(model_class)
+            # marshal would get these from the dict's attributes, if
+            # missing from the item
+            and not any(hasattr(dict, name) for name in self.field_names)
+        )
+        if not self.usable:
+            return
+        # the fields to_response would return
+        if issubclass(model_class, SQLResourceBase):
+            source_fields = model_class.response_fields
+        else:
+            source_fields = model_class.serialization_plan().resource_fields
+        self._fields = [
+            (
+                name,
+                formatter,
+                attrgetter(name) if name in source_fields else None,
+            )
+            for name, formatter in zip(self.field_names, formatters)
+        ]
+        # can the items be queried as dicts of just these fields?
+        self.projectable = set(self.field_names) <= \
+            model_class.serialization_plan().plain_columns
+
+    @staticmethod
+    def _default_to_response(model_class):
+        if not isinstance(model_class, type) or \
+                not issubclass(model_class, SQLModelBase):
+            return False
+        return model_class.to_response in (
+            SQLModelBase.to_response, SQLResourceBase.to_response)
+
+    def serialize(self, items):
+        """Serialize the items, or return None if they're not supported"""
+        serialized = []
+        for item in items:
+            if isinstance(item, dict):
+                serialized.append({
+                    name: formatter(item.get(name))
+                    for name, formatter, _ in self._fields
+                })
+            elif type(item) is self.model_class:
+                serialized.append({
+                    name: formatter(getter(item) if getter else None)
+                    for name, formatter, getter in self._fields
+                })
+            else:
+                return None
+        return serialized
+
+
 class marshal_with(object):
-    def __init__(self, response_class, force_get_data=False):
+    def __init__(self, response_class, force_get_data=False,
+                 project_columns=False):
         """
         :param response_class: response class to marshal result with.
          class must have a "resource_fields" class variable
+        :param project_columns: the decorated function returns the
+         list from SQLStorageManager.list, as is, so it can handle the
+         items being listed as dicts of just the included columns
         """
         try:
             self._fields = response_class.response_fields
@@ -85,6 +189,11 @@ class marshal_with(object):
 
         self.response_class = response_class
         self.force_get_data = force_get_data
+        self.project_columns = project_columns
+        # (api version, _include) -> the fields to include
+        self._fields_to_include_cache = {}
+        # names of the fields to include -> their CompiledSerializer
+        self._serializers = {}
 
     def __call__(self, f):
         # pass _include to the function if it accepts that parameter
@@ -95,17 +204,28 @@ class marshal_with(object):
             if hasattr(request, '__skip_marshalling'):
                 return f(*args, **kwargs)
             fields_to_include = self._get_fields_to_include()
+            serializer = self._get_serializer(fields_to_include)
             if supports_include:
-                kwargs['_include'] = list(fields_to_include.keys())
+                if self.project_columns and serializer.usable and \
+                        serializer.projectable:
+                    kwargs['_include'] = Projection(fields_to_include)
+                else:
+                    kwargs['_include'] = list(fields_to_include.keys())
 
             response = f(*args, **kwargs)
 
             def wrap_list_items(response):
-                wrapped_items = self.wrap_with_response_object(
-                    response.items, fields_to_include)
-                if self._include_hash():
-                    fields_to_include['password_hash'] = fields.String
-                response.items = marshal(wrapped_items, fields_to_include)
+                items = None
+                include_hash = self._include_hash()
+                if serializer.usable and not include_hash:
+                    items = serializer.serialize(response.items)
+                if items is None:
+                    wrapped_items = self.wrap_with_response_object(
+                        response.items, fields_to_include)
+                    if include_hash:
+                        fields_to_include['password_hash'] = fields.String
+                    items = marshal(wrapped_items, fields_to_include)
+                response.items = items
                 return response
 
             if isinstance(response, ListResponse):
@@ -135,6 +255,17 @@ class marshal_with(object):
 
         return wrapper
 
+    def _get_serializer(self, fields_to_include):
+        key = tuple(fields_to_include)
+        serializer = self._serializers.get(key)
+        if serializer is None:
+            serializer = CompiledSerializer(
+                self.response_class, fields_to_include)
+            if len(self._serializers) < \
+                    SerializationPlan.MAX_CACHED_INCLUDES:
+                self._serializers[key] = serializer
+        return serializer
+
     def wrap_with_response_object(self, data, fields_to_include):
         if isinstance(data, dict):
             return data
@@ -174,12 +305,27 @@ class marshal_with(object):
         return False
 
     def _get_fields_to_include(self):
+        include_param = None
+        if self._is_include_parameter_in_request():
+            include_param = request.args['_include']
+        cache_key = (self._get_api_version(), include_param)
+        fields_to_include = self._fields_to_include_cache.get(cache_key)
+        if fields_to_include is None:
+            fields_to_include = self._compute_fields_to_include(include_param)
+            # _include is user input, so don't let the cache grow unbounded
+            if len(self._fields_to_include_cache) < \
+                    SerializationPlan.MAX_CACHED_INCLUDES:
+                self._fields_to_include_cache[cache_key] = fields_to_include
+        # the caller might modify the returned dict
+        return dict(fields_to_include)
+
+    def _compute_fields_to_include(self, include_param):
         skipped_fields = self._get_skipped_fields()
         model_fields = {k: v for k, v in self._fields.items()
                         if k not in skipped_fields}
 
-        if self._is_include_parameter_in_request():
-            include = set(request.args['_include'].split(','))
+        if include_param:
+            include = set(include_param.split(','))
             _validate_fields(model_fields, include, INCLUDE)
             include_fields = {k: v for k, v in model_fields.items()
                               if k in include}
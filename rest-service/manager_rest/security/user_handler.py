@@ -1,7 +1,10 @@
 from datetime import datetime
+import hashlib
 import string
+import threading
 from typing import Optional
 
+from cachetools import TTLCache
 from flask import current_app, Response, abort, Request
 from flask_security.utils import verify_password
 
@@ -14,13 +17,14 @@ from manager_rest.manager_exceptions import (
     NoAuthProvided,
     UnauthorizedError,
 )
-from manager_rest.storage import user_datastore, get_storage_manager
+from manager_rest.storage import user_datastore
 from manager_rest.execution_token import (
     set_current_execution,
     get_current_execution_by_token,
     get_execution_token_from_request,
     current_execution,
 )
+from manager_rest import config
 from manager_rest.security import audit
 from manager_rest.utils import (
     is_expired,
@@ -175,6 +179,63 @@ def get_token_from_request(request):
     return request.headers.get(token_auth_header, '')
 
 
+class _VerifiedTokensCache(object):
+    """Cache of the tokens that were already verified.
+
+    Verifying a token secret requires computing its (deliberately slow)
+    hash, so for tokens that were recently verified, only the digest of
+    the token value is stored, together with the secret_hash it was
+    verified against.
+    The token is still fetched from the db on every request, and its
+    secret_hash compared to the cached one, so that a deleted or
+    re-created token is never authenticated from the cache. The user is
+    loaded from the db as well, so locking or deactivating them applies
+    immediately.
+    """
+    def __init__(self):
+        self._cache = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token_value):
+        return hashlib.sha256(token_value.encode('utf-8')).hexdigest()
+
+    def _get_cache(self):
+        if self._cache is None:
+            self._cache = TTLCache(
+                maxsize=config.instance.token_cache_size,
+                ttl=config.instance.token_cache_ttl,
+            )
+        return self._cache
+
+    def get(self, token_value):
+        if not config.instance.token_cache_ttl:
+            return None
+        with self._lock:
+            return self._get_cache().get(self._key(token_value))
+
+    def set(self, token_value, secret_hash):
+        if not config.instance.token_cache_ttl:
+            return
+        with self._lock:
+            self._get_cache()[self._key(token_value)] = secret_hash
+
+    def invalidate(self, secret_hash=None):
+        """Drop cached tokens with the given secret_hash, or all of them"""
+        with self._lock:
+            if self._cache is None:
+                return
+            if secret_hash is None:
+                self._cache.clear()
+                return
+            for key, cached_hash in list(self._cache.items()):
+                if cached_hash == secret_hash:
+                    self._cache.pop(key, None)
+
+
+verified_tokens = _VerifiedTokensCache()
+
+
 def get_token_status(token):
     user = None
     error = None
@@ -182,21 +243,33 @@ def get_token_status(token):
     token_parts = token.split('-', 2)
     if len(token_parts) == 3:
         _, tok_id, tok_secret = token_parts
+        token_value = token
 
-        sm = get_storage_manager()
-        token = sm.get(Token, tok_id, fail_silently=True)
+        # fetch the token and its user at once
+        token, user = (
+            db.session.query(Token, User)
+            .join(User, Token._user_fk == User.id)
+            .filter(Token.id == tok_id)
+            .first()
+        ) or (None, None)
 
         error = 'Unauthorized'
+        cached = False
         if token:
-            if verify_password(tok_secret, token.secret_hash):
-                user = user_datastore.find_user(id=token._user_fk)
+            cached = verified_tokens.get(token_value) == token.secret_hash
+            if cached or verify_password(tok_secret, token.secret_hash):
                 error = None
+            else:
+                user = None
 
             if token.expiration_date is not None:
                 if is_expired(token.expiration_date):
                     error = 'Token is expired'
 
-        if not error:
+        if not error and not cached:
+            # last_used is only updated when the token isn't cached, so
+            # it's only as precise as the cache TTL
+            verified_tokens.set(token_value, token.secret_hash)
             token.last_used = datetime.utcnow()
             db.session.commit()
     else:
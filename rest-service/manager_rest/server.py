@@ -21,13 +21,15 @@ from manager_rest import (config,
                           manager_exceptions)
 from manager_rest import persistent_storage
 from manager_rest.storage import db, user_datastore
+from manager_rest.storage.models_base import build_serialization_plans
 from manager_rest.security.user_handler import user_loader
 from manager_rest.security import audit
+from manager_rest.dsl_functions import reset_evaluation_cache
 from manager_rest.maintenance import maintenance_mode_handler
 from manager_rest.rest.endpoint_mapper import setup_resources
 from manager_rest.flask_utils import (
     set_flask_security_config,
-    query_service_settings,
+    reload_changed_config,
 )
 from manager_rest.configure_manager import _create_permissions
 from manager_rest.manager_exceptions import INTERNAL_SERVER_ERROR_CODE
@@ -145,11 +147,12 @@ class CloudifyFlaskApp(Flask):
             self.external_auth = None
 
         self.before_request(log_request)
-        self.before_request(query_service_settings)
+        self.before_request(reload_changed_config)
         self.before_request(init_storage_handler)
         self.before_request(maintenance_mode_handler)
         self.after_request(log_response)
         self.before_request(audit.reset)
+        self.before_request(reset_evaluation_cache)
         self.after_request(audit.extend_headers)
         self._set_flask_security()
 
@@ -169,6 +172,7 @@ class CloudifyFlaskApp(Flask):
         with self._prevent_flask_restful_error_handling():
             setup_resources(Api(self))
         self.register_blueprint(app_errors)
+        build_serialization_plans()
 
     def _set_flask_security(self):
         """Set Flask-Security specific configurations and init the extension
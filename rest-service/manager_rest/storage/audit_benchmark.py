@@ -0,0 +1,224 @@
+"""Benchmark the write amplification of the audit log triggers.
+
+A scratch table is modified in bulk (a single INSERT, UPDATE and DELETE
+of all its rows), while audited by:
+    - none: no triggers at all, as the baseline
+    - row: the row-level triggers used up to 7.0, which write an
+      audit_log row, and send a notification, per modified row
+    - statement: the statement-level triggers, which write all the
+      audit_log rows of a statement at once, and send a single
+      notification per statement
+
+For each operation, the WAL bytes written, the audit_log rows and the
+notifications sent are reported.
+
+While the row-level triggers are benchmarked, the audit_log notification
+trigger is replaced with the row-level one, so don't run this on a
+manager that is in use.
+
+Example:
+    python -m manager_rest.storage.audit_benchmark --rows 10000
+"""
+import argparse
+import json
+import select
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from manager_rest import config
+
+SCRATCH_TABLE = 'audit_benchmark'
+NOTIFICATION_CHANNEL = 'audit_log_inserted'
+OPERATIONS = [
+    ('create', f"""
+        INSERT INTO {SCRATCH_TABLE} (_tenant_id, id)
+        SELECT 0, 'row-' || n FROM generate_series(1, %(rows)s) n
+    """),
+    ('update', f'UPDATE {SCRATCH_TABLE} SET updated = true'),
+    ('delete', f'DELETE FROM {SCRATCH_TABLE}'),
+]
+# the arguments of write_audit_log and write_audit_log_for_statement
+AUDIT_ARGS = "'_storage_id', '{_tenant_id,id}'"
+
+
+def _install_row(cur):
+    cur.execute(f"""
+        CREATE TRIGGER audit_{SCRATCH_TABLE}
+        AFTER INSERT OR UPDATE OR DELETE ON {SCRATCH_TABLE} FOR EACH ROW
+        EXECUTE PROCEDURE write_audit_log({AUDIT_ARGS})
+    """)
+    cur.execute('ALTER TABLE audit_log DISABLE TRIGGER audit_log_inserted')
+    cur.execute(f"""
+        CREATE TRIGGER {SCRATCH_TABLE}_inserted
+        AFTER INSERT ON audit_log FOR EACH ROW
+        EXECUTE PROCEDURE notify_new_audit_log()
+    """)
+
+
+def _uninstall_row(cur):
+    cur.execute(f'DROP TRIGGER IF EXISTS {SCRATCH_TABLE}_inserted '
+                f'ON audit_log')
+    cur.execute('ALTER TABLE audit_log ENABLE TRIGGER audit_log_inserted')
+
+
+def _install_statement(cur):
+    for operation, transition in [
+        ('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'),
+    ]:
+        cur.execute(f"""
+            CREATE TRIGGER audit_{SCRATCH_TABLE}_{operation.lower()}
+            AFTER {operation} ON {SCRATCH_TABLE}
+            REFERENCING {transition} TABLE AS changed_rows
+            FOR EACH STATEMENT
+            EXECUTE PROCEDURE write_audit_log_for_statement({AUDIT_ARGS})
+        """)
+
+
+# the functions installing and uninstalling the triggers of each variant
+VARIANTS = {
+    'none': (None, None),
+    'row': (_install_row, _uninstall_row),
+    'statement': (_install_statement, None),
+}
+
+
+def _is_own_notification(payload, audit_ids):
+    """Was the notification sent for one of the benchmark's audit_log rows"""
+    data = json.loads(payload)
+    if 'ranges' in data:
+        return any(first_id in audit_ids
+                   for first_id, _ in data['ranges'])
+    return data.get('_storage_id') in audit_ids
+
+
+def _receive_notifications(conn, timeout):
+    """Receive the notifications, until none arrive for timeout seconds"""
+    notifications = []
+    while select.select([conn], [], [], timeout)[0]:
+        conn.poll()
+        notifications += conn.notifies
+        conn.notifies.clear()
+    return notifications
+
+
+def run_operation(conn, listen_conn, operation, statement, rows,
+                  notify_timeout=1):
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_current_wal_insert_lsn()')
+        lsn_before = cur.fetchone()[0]
+        started = time.time()
+        cur.execute(statement, {'rows': rows})
+        conn.commit()
+        duration = time.time() - started
+        cur.execute(
+            'SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)',
+            (lsn_before, ))
+        wal_bytes = int(cur.fetchone()[0])
+        cur.execute(
+            'SELECT _storage_id FROM audit_log '
+            'WHERE ref_table = %s AND operation = %s',
+            (SCRATCH_TABLE, operation))
+        audit_ids = {audit_id for (audit_id, ) in cur.fetchall()}
+        conn.commit()
+
+    notifications = [
+        n for n in _receive_notifications(listen_conn, notify_timeout)
+        if _is_own_notification(n.payload, audit_ids)
+    ]
+    return {
+        'operation': operation,
+        'duration': duration,
+        'wal_bytes': wal_bytes,
+        'audit_rows': len(audit_ids),
+        'notifications': len(notifications),
+        'notify_bytes': sum(len(n.payload) for n in notifications),
+    }
+
+
+def run_variant(conn, listen_conn, variant, rows):
+    install, uninstall = VARIANTS[variant]
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TABLE {SCRATCH_TABLE} (
+                _storage_id serial PRIMARY KEY,
+                _tenant_id integer,
+                id text,
+                updated boolean DEFAULT false
+            )
+        """)
+        if install:
+            install(cur)
+        conn.commit()
+    try:
+        return [
+            run_operation(conn, listen_conn, operation, statement, rows)
+            for operation, statement in OPERATIONS
+        ]
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            if uninstall:
+                uninstall(cur)
+            cur.execute(f'DROP TABLE {SCRATCH_TABLE}')
+            cur.execute('DELETE FROM audit_log WHERE ref_table = %s',
+                        (SCRATCH_TABLE, ))
+        conn.commit()
+
+
+def print_results(rows, results):
+    baseline = {
+        result['operation']: result['wal_bytes']
+        for result in results.get('none', [])
+    }
+    print(f'Rows modified per statement: {rows}')
+    print('{0:<10} {1:<8} {2:>10} {3:>12} {4:>7} {5:>11} {6:>9} {7:>13}'
+          .format('variant', 'op', 'time', 'WAL bytes', 'WAL x',
+                  'audit rows', 'notifies', 'notify bytes'))
+    for variant, variant_results in results.items():
+        for result in variant_results:
+            base = baseline.get(result['operation'])
+            amplification = \
+                f"{result['wal_bytes'] / base:.2f}" if base else '-'
+            print('{0:<10} {1:<8} {2:>9.3f}s {3:>12} {4:>7} {5:>11} {6:>9} '
+                  '{7:>13}'.format(
+                      variant, result['operation'], result['duration'],
+                      result['wal_bytes'], amplification,
+                      result['audit_rows'], result['notifications'],
+                      result['notify_bytes']))
+
+
+def main(args):
+    config.instance.load_configuration(from_db=False)
+    conn = psycopg2.connect(config.instance.db_url)
+    listen_conn = psycopg2.connect(config.instance.db_url)
+    listen_conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    with listen_conn.cursor() as cur:
+        cur.execute(f'LISTEN {NOTIFICATION_CHANNEL}')
+    results = {}
+    try:
+        for variant in args['variants']:
+            results[variant] = run_variant(
+                conn, listen_conn, variant, args['rows'])
+    finally:
+        conn.close()
+        listen_conn.close()
+    print_results(args['rows'], results)
+
+
+def cli():
+    """Parse arguments and run main"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the write amplification of audit triggers')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='Number of rows modified by each statement')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS),
+                        default=list(VARIANTS),
+                        help='Which triggers to benchmark')
+    args = parser.parse_args()
+    main(vars(args))
+
+
+if __name__ == '__main__':
+    cli()
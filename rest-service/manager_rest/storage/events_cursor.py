@@ -0,0 +1,88 @@
+"""Keyset pagination of events and logs.
+
+A cursor is an opaque encoding of the sort key of an event or a log:
+(timestamp, _storage_id, type). The type is needed because events and
+logs are numbered separately.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from sqlalchemy import and_, false, or_, true
+
+from manager_rest import manager_exceptions
+
+
+def encode_cursor(timestamp, storage_id, event_type):
+    """Encode the position of an event or a log as an opaque cursor.
+
+    :param timestamp: the raw timestamp, as stored in the db (the one
+        returned to the user is truncated to milliseconds)
+    """
+    key = [timestamp.isoformat(), storage_id, event_type]
+    return urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor returned by encode_cursor.
+
+    :returns: The sort key, or None for an empty cursor (ie. to start
+        from the first event)
+    """
+    if not cursor:
+        return None
+    try:
+        timestamp, storage_id, event_type = json.loads(
+            urlsafe_b64decode(cursor.encode('ascii')))
+        return (
+            datetime.fromisoformat(timestamp),
+            int(storage_id),
+            str(event_type),
+        )
+    except (ValueError, TypeError):
+        raise manager_exceptions.BadParametersError(
+            'Invalid cursor: {0}'.format(cursor))
+
+
+def after_cursor(model, cursor, sort_direction='asc'):
+    """Conditions selecting the rows of model that follow the cursor.
+
+    :param model: Event or Log
+    :param cursor: a sort key, as returned by decode_cursor
+    :return: a list of conditions, to be applied to a query on model
+    """
+    timestamp, storage_id, event_type = cursor
+    model_type = 'cloudify_{0}'.format(model.__name__.lower())
+    if sort_direction == 'asc':
+        is_after = or_(
+            model.timestamp > timestamp,
+            and_(
+                model.timestamp == timestamp,
+                or_(
+                    model._storage_id > storage_id,
+                    and_(
+                        model._storage_id == storage_id,
+                        true() if model_type > event_type else false(),
+                    ),
+                ),
+            ),
+        )
+        # this is redundant, but simple enough to let postgres use
+        # the timestamp index, and skip the older partitions
+        bound = model.timestamp >= timestamp
+    else:
+        is_after = or_(
+            model.timestamp < timestamp,
+            and_(
+                model.timestamp == timestamp,
+                or_(
+                    model._storage_id < storage_id,
+                    and_(
+                        model._storage_id == storage_id,
+                        true() if model_type < event_type else false(),
+                    ),
+                ),
+            ),
+        )
+        bound = model.timestamp <= timestamp
+    return [bound, is_after]
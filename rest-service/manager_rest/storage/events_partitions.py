@@ -0,0 +1,139 @@
+"""Maintenance of the events and logs table partitions.
+
+The events and logs tables are partitioned by month, by their timestamp.
+Each table has monthly partitions named <table>_pYYYYMM, and a default
+partition, <table>_default, which holds all the rows that don't belong
+in any of the monthly partitions.
+
+Partitions for the upcoming months are created ahead of time, and when
+a retention period is configured, partitions that only contain rows
+older than that are dropped as a whole, instead of deleting the rows.
+"""
+import re
+from datetime import datetime, timedelta
+
+from manager_rest.storage import db
+
+PARTITIONED_TABLES = ['events', 'logs']
+# how many months ahead to create the partitions
+MONTHS_AHEAD = 3
+# so we won't conflict with usage collector, which uses lock numbers 1 and 2
+PARTITIONS_LOCK = 3
+PARTITION_NAME = re.compile(
+    r'^(?P<table>\w+)_p(?P<year>\d{4})(?P<month>\d{2})$')
+
+
+def _month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def _next_month(dt):
+    return _month_start(_month_start(dt) + timedelta(days=32))
+
+
+def partition_name(table_name, month):
+    return '{0}_p{1:%Y%m}'.format(table_name, month)
+
+
+def list_partitions(table_name):
+    """Months of the existing monthly partitions of the table"""
+    partition_names = db.session.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table_name AS regclass)
+    """, {'table_name': table_name}).scalars()
+    months = []
+    for name in partition_names:
+        match = PARTITION_NAME.match(name)
+        if match and match.group('table') == table_name:
+            months.append(datetime(
+                int(match.group('year')), int(match.group('month')), 1))
+    return sorted(months)
+
+
+def create_partition(table_name, month):
+    """Create the partition of the table for the given month.
+
+    Rows that were stored in the default partition, because this
+    partition didn't exist yet, are moved over to it.
+    """
+    name = partition_name(table_name, month)
+    params = {'start': month, 'end': _next_month(month)}
+    db.session.execute(f"""
+        CREATE TABLE {name}
+        (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    """)
+    db.session.execute(f"""
+        WITH moved AS (
+            DELETE FROM {table_name}_default
+            WHERE "timestamp" >= :start AND "timestamp" < :end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, params)
+    db.session.execute(f"""
+        ALTER TABLE {table_name} ATTACH PARTITION {name}
+        FOR VALUES FROM ('{params['start']}') TO ('{params['end']}')
+    """)
+
+
+def ensure_partitions(now=None, months_ahead=MONTHS_AHEAD):
+    """Create the partitions for the current and the upcoming months"""
+    now = now or datetime.utcnow()
+    created = []
+    for table_name in PARTITIONED_TABLES:
+        existing = set(list_partitions(table_name))
+        month = _month_start(now)
+        for _ in range(months_ahead + 1):
+            if month not in existing:
+                create_partition(table_name, month)
+                created.append(partition_name(table_name, month))
+            month = _next_month(month)
+    return created
+
+
+def drop_expired_partitions(retention_days, now=None):
+    """Drop the partitions that only contain expired rows.
+
+    :param retention_days: rows older than this many days are expired
+    :return: names of the dropped partitions
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=retention_days)
+    dropped = []
+    for table_name in PARTITIONED_TABLES:
+        # the default partition is expected to be small, so expired rows
+        # can be deleted from it directly
+        db.session.execute(
+            f'DELETE FROM {table_name}_default WHERE "timestamp" < :cutoff',
+            {'cutoff': cutoff},
+        )
+        for month in list_partitions(table_name):
+            if _next_month(month) > cutoff:
+                continue
+            name = partition_name(table_name, month)
+            db.session.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+    return dropped
+
+
+def maintain_partitions(retention_days=None, now=None):
+    """Create the upcoming partitions, and drop the expired ones.
+
+    Only one manager in a cluster will do this at a time; when another
+    one is already doing it, return without waiting for it.
+
+    :return: names of the created and the dropped partitions
+    """
+    created, dropped = [], []
+    locked = db.session.execute(
+        'SELECT pg_try_advisory_xact_lock(:lock_number)',
+        {'lock_number': PARTITIONS_LOCK},
+    ).scalar()
+    if locked:
+        created = ensure_partitions(now)
+        if retention_days:
+            dropped = drop_expired_partitions(retention_days, now)
+    db.session.commit()
+    return created, dropped
@@ -1,3 +1,6 @@
+import json
+import re
+
 from sqlalchemy import and_, or_
 from sqlalchemy.ext.associationproxy import AssociationProxyInstance
 
@@ -43,7 +46,9 @@ def add_filter_rules_to_query(query, model_class, filter_rules,
 def add_attrs_filter_to_query(query, model_class, filter_rule,
                               joined_columns_set):
     filter_rule_operator = filter_rule['operator']
-    column_name = filter_rule['key']
+    # a key of the form column.path refers to a value inside of
+    # a JSONB column
+    column_name, _, json_path = filter_rule['key'].partition('.')
     filter_rule_values = filter_rule['values']
 
     joins = get_joins(model_class, [column_name])
@@ -62,6 +67,18 @@ def add_attrs_filter_to_query(query, model_class, filter_rule,
             joined_columns_set.add(target_mapper)
             query = query.outerjoin(joined_attr)
 
+    if json_path:
+        path = tuple(json_path.split('.'))
+        # all the operators only match string values, because any_of
+        # and not_any_of can't match the others by their text
+        query = query.filter(db.func.jsonb_typeof(column[path]) == 'string')
+        json_filter = _json_path_filter(
+            column, path, filter_rule_operator, filter_rule_values)
+        if json_filter is not None:
+            return query.filter(json_filter)
+        # the other operators compare the text of the value
+        column = column[path].astext
+
     if filter_rule_operator == AttrsOperator.ANY_OF:
         query = query.filter(column.in_(filter_rule_values))
 
@@ -115,6 +132,93 @@ def add_attrs_filter_to_query(query, model_class, filter_rule,
     return query
 
 
+def _json_path_filter(column, path, operator, values):
+    """Filter expressions for the value at path, in a JSONB column.
+
+    any_of and not_any_of are checked by containment, so that they can
+    use the column's GIN index, if it has one. This means that they
+    only match string values, exactly, so the query must already be
+    restricted to those.
+    Returns None for the operators that should compare the value's text.
+    """
+    if operator in (AttrsOperator.ANY_OF, AttrsOperator.NOT_ANY_OF):
+        contained = or_(*(
+            column.contains(_nest(path, value)) for value in values
+        ))
+        if operator == AttrsOperator.ANY_OF:
+            return contained
+        return ~contained
+    if operator == AttrsOperator.IS_NOT_EMPTY:
+        return column[path].astext != ''
+    return None
+
+
+def _nest(path, value):
+    """The object that has value at path, eg. {'a': {'b': value}}"""
+    for key in reversed(path):
+        value = {key: value}
+    return value
+
+
+def capabilities_filter(key_specs=None, valid_values=None, search_value=None):
+    """Narrow down a query by the capabilities stored in a JSONB column.
+
+    Selects the rows with at least one capability whose name matches
+    key_specs (a name_pattern constraint), and whose value is one of
+    valid_values, and equal to search_value. Capabilities whose value
+    is an intrinsic function can only be matched once it's evaluated, so
+    those always pass the value conditions, and the capabilities of the
+    selected rows still need to be matched one by one.
+
+    :return: a function, to be used as the value of a storage manager
+        filter, or None if there's nothing to filter by
+    """
+    key_conditions = []
+    for operator, value in (key_specs or {}).items():
+        value = str(value)
+        if operator == 'contains':
+            key_conditions.append(
+                f'@.key like_regex {_jsonpath_string(re.escape(value))}')
+        elif operator == 'starts_with':
+            key_conditions.append(
+                f'@.key starts with {_jsonpath_string(value)}')
+        elif operator == 'ends_with':
+            key_conditions.append(
+                f'@.key like_regex {_jsonpath_string(re.escape(value) + "$")}')
+        elif operator == 'equals_to':
+            key_conditions.append(f'@.key == {_jsonpath_string(value)}')
+
+    value_conditions = []
+    # only string values are compared in SQL, because jsonpath equality
+    # of other types differs from python's (eg. 1 == True)
+    if valid_values and isinstance(valid_values, list) \
+            and all(isinstance(v, str) for v in valid_values):
+        value_conditions.append(' || '.join(
+            f'@.value.value == {_jsonpath_string(v)}' for v in valid_values))
+    if search_value:
+        value_conditions.append(
+            f'@.value.value == {_jsonpath_string(search_value)}')
+
+    conditions = [f'({condition})' for condition in key_conditions]
+    if value_conditions:
+        conditions.append(
+            '(@.value.value.type() == "object" '
+            '|| @.value.value.type() == "array" '
+            '|| ({0}))'.format(
+                ' && '.join(f'({c})' for c in value_conditions)))
+    if not conditions:
+        return None
+
+    path = '$.keyvalue() ? ({0})'.format(' && '.join(conditions))
+    # silent, so that rows that don't contain an object simply don't match
+    return lambda column: db.func.jsonb_path_exists(column, path, '{}', True)
+
+
+def _jsonpath_string(value):
+    # jsonpath string literals are escaped the same as in json
+    return json.dumps(value)
+
+
 def add_labels_filter_to_query(query, model_class, labels_model, filter_rule):
     filter_rule_operator = filter_rule['operator']
     filter_rule_key = filter_rule['key']
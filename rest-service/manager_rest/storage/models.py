@@ -55,6 +55,7 @@ from .resource_models import (
     SecretsProvider,
     Agent,
     Operation,
+    ExecutionOperationsCount,
     TasksGraph,
     Site,
     PluginsUpdate,
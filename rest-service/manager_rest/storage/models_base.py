@@ -1,5 +1,6 @@
 from datetime import datetime
 import json
+from operator import attrgetter
 from typing import Any
 
 from collections import OrderedDict
@@ -9,7 +10,7 @@ from dateutil import parser as date_parser
 from sqlalchemy import inspect
 from flask_sqlalchemy import SQLAlchemy, BaseQuery
 from flask_restful import fields as flask_fields
-from sqlalchemy import MetaData
+from sqlalchemy import JSON, MetaData
 from sqlalchemy.ext.associationproxy import (ASSOCIATION_PROXY,
                                              AssociationProxyInstance)
 from sqlalchemy.ext.hybrid import HYBRID_PROPERTY
@@ -165,6 +166,7 @@ class SQLModelBase(Model):
         'Boolean': flask_fields.Boolean,
         'ARRAY': flask_fields.Raw,
         'JSONString': flask_fields.Raw,
+        'JSONB': flask_fields.Raw,
         'LargeBinary': flask_fields.Raw,
         'Float': flask_fields.Float
     }
@@ -194,9 +196,10 @@ class SQLModelBase(Model):
         it's unable to retrieve (e.g., if a relationship wasn't established
         yet, and so it's impossible to access a property through it)
         """
+        field_names = self.serialization_plan().field_names
         if suppress_error:
             res = dict()
-            for field in self.resource_fields:
+            for field in field_names:
                 try:
                     field_value = getattr(self, field)
                 except AttributeError:
@@ -205,7 +208,7 @@ class SQLModelBase(Model):
         else:
             # Can't simply call here `self.to_response()` because inheriting
             # class might override it, but we always need the same code here
-            res = {f: getattr(self, f) for f in self.resource_fields}
+            res = {f: getattr(self, f) for f in field_names}
             full_response = self.to_response()
 
             # resource_availability is deprecated.
@@ -216,16 +219,39 @@ class SQLModelBase(Model):
         return res
 
     def to_response(self, include=None, **kwargs):
-        include = include or self.resource_fields
         return {
-            f: getattr(self, f) for f in self.resource_fields if f in include
+            f: getter(self)
+            for f, getter in self.serialization_plan().getters(include)
         }
 
+    @classmethod
+    def serialization_plan(cls):
+        """The SerializationPlan of this class, created on first use"""
+        # not inherited: subclasses might have different fields
+        plan = cls.__dict__.get('_serialization_plan')
+        if plan is None:
+            plan = SerializationPlan(cls)
+            cls._serialization_plan = plan
+        return plan
+
     @classproperty
     def resource_fields(cls):
         """Return a mapping of available field names and their corresponding
         flask types
         """
+        # subclasses modify the returned dict, so it must be a copy
+        return dict(cls._introspect_fields())
+
+    @classmethod
+    def _introspect_fields(cls):
+        """The fields of this class' columns and ORM descriptors.
+
+        Introspecting the model is expensive, so it is only done once
+        per class.
+        """
+        fields = cls.__dict__.get('_introspected_fields')
+        if fields is not None:
+            return fields
         fields = dict()
         columns = inspect(cls).columns
         columns_dict = {col.name: col.type for col in columns
@@ -234,6 +260,7 @@ class SQLModelBase(Model):
         for field_name, field_type in columns_dict.items():
             field_type_name = field_type.__class__.__name__
             fields[field_name] = cls._sql_to_flask_type_map[field_type_name]
+        cls._introspected_fields = fields
         return fields
 
     @classmethod
@@ -296,6 +323,70 @@ class SQLModelBase(Model):
         return hasattr(cls, 'labeled_model')
 
 
+class SerializationPlan(object):
+    """How to serialize the instances of a model class.
+
+    Holds the class' resource fields, and a getter for each field, so
+    that serializing many instances doesn't need to re-compute the
+    fields of the class for each one of them.
+    """
+    MAX_CACHED_INCLUDES = 100
+
+    def __init__(self, model_class):
+        self.resource_fields = model_class.resource_fields
+        self.field_names = tuple(self.resource_fields)
+        # fields that can be selected as they are, without loading
+        # any relationships
+        column_attrs = inspect(model_class).column_attrs.keys()
+        self.plain_columns = frozenset(
+            name for name in self.field_names if name in column_attrs)
+        # columns that are potentially large, and expensive to decode
+        self.json_columns = tuple(
+            attr.key for attr in inspect(model_class).column_attrs
+            if isinstance(attr.columns[0].type, (JSONString, JSON))
+        )
+        self._getters = tuple(
+            (name, attrgetter(name)) for name in self.field_names)
+        self._included_getters = {}
+
+    def getters(self, include=None):
+        """Names and getters of the fields that are in include.
+
+        :param include: names of the fields to include; if empty, all
+            the fields are included
+        """
+        if not include:
+            return self._getters
+        include = frozenset(include)
+        getters = self._included_getters.get(include)
+        if getters is None:
+            getters = tuple(
+                (name, getter) for name, getter in self._getters
+                if name in include
+            )
+            # _include is user input, so don't let the cache grow unbounded
+            if len(self._included_getters) < self.MAX_CACHED_INCLUDES:
+                self._included_getters[include] = getters
+        return getters
+
+
+def build_serialization_plans(base=SQLModelBase):
+    """Create the serialization plans of all the concrete model classes.
+
+    The plans are otherwise created lazily, on first use, so this allows
+    doing it at startup, before any requests are served.
+    """
+    for model_class in base.__subclasses__():
+        if not model_class.__dict__.get('__abstract__', False):
+            try:
+                model_class.serialization_plan()
+            except (KeyError, AttributeError):
+                # a model that can't be serialized automatically: it
+                # would fail the same way when used, so leave it be
+                pass
+        build_serialization_plans(model_class)
+
+
 def is_orm_attribute(item):
     if isinstance(item, AssociationProxyInstance):
         return False
@@ -0,0 +1,158 @@
+"""Contention-free counting of the finished & total operations of executions.
+
+Every operation state update changes its execution's finished_operations.
+Updating the execution row directly would make all the concurrent task
+completions of an execution wait for each other on that row's lock, so
+instead, the changes are appended to the executions_operations_counts
+table, and folded into the execution row periodically, by the
+execution-scheduler. When the executions are read via the REST API,
+the pending changes are added to the returned counts, without folding
+them.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+
+from manager_rest.storage import db
+from manager_rest.storage.storage_manager import Projection
+
+# so we won't conflict with usage collector (1 and 2) and with events
+# partitions maintenance (3)
+FOLD_LOCK = 4
+OPERATIONS_COUNTS_COLUMNS = ('finished_operations', 'total_operations')
+
+_RECORD_QUERY = """
+    INSERT INTO executions_operations_counts
+        (_execution_fk, finished_delta, total_delta)
+    SELECT tg._execution_fk, :finished_delta, :total_delta
+    FROM tasks_graphs tg
+    WHERE tg._storage_id = :tasks_graph_fk
+"""
+
+_PENDING_QUERY = """
+    SELECT
+        _execution_fk,
+        sum(finished_delta) AS finished_delta,
+        sum(total_delta) AS total_delta
+    FROM executions_operations_counts
+    WHERE _execution_fk = ANY(:execution_fks)
+    GROUP BY _execution_fk
+"""
+
+_FOLD_QUERY = """
+    WITH deltas AS (
+        DELETE FROM executions_operations_counts
+        RETURNING _execution_fk, finished_delta, total_delta
+    ), summed AS (
+        SELECT
+            _execution_fk,
+            sum(finished_delta) AS finished_delta,
+            sum(total_delta) AS total_delta
+        FROM deltas
+        GROUP BY _execution_fk
+    )
+    UPDATE executions e
+    SET
+        finished_operations =
+            coalesce(e.finished_operations, 0) + summed.finished_delta,
+        total_operations =
+            coalesce(e.total_operations, 0) + summed.total_delta
+    FROM summed
+    WHERE e._storage_id = summed._execution_fk
+"""
+
+
+def record_operations_counts(deltas):
+    """Store changes to the operations counts of executions.
+
+    This doesn't lock the execution rows, and is cheap enough to be
+    called on every operation state update.
+
+    :param deltas: a dict of tasks graph _storage_id, to a tuple of
+        (finished_delta, total_delta): how many operations of that
+        graph became finished, and how many were created (or deleted)
+    """
+    params = [
+        {
+            'tasks_graph_fk': tasks_graph_fk,
+            'finished_delta': finished_delta,
+            'total_delta': total_delta,
+        }
+        for tasks_graph_fk, (finished_delta, total_delta) in deltas.items()
+        if finished_delta or total_delta
+    ]
+    if params:
+        db.session.execute(_RECORD_QUERY, params)
+
+
+def project_operations_counts(include):
+    """Make sure that projected executions can have the pending changes added.
+
+    When the executions are listed as dicts of just the included columns,
+    and the operations counts are included, their _storage_id is needed
+    too, to look up the pending changes.
+
+    :param include: the include that the executions will be listed with
+    """
+    if isinstance(include, Projection) \
+            and '_storage_id' not in include \
+            and set(include) & set(OPERATIONS_COUNTS_COLUMNS):
+        include.append('_storage_id')
+    return include
+
+
+def add_pending_operations_counts(executions):
+    """Add the pending changes to the loaded operations counts of executions.
+
+    This only reads the pending changes, so it doesn't take any locks,
+    and doesn't need to commit. The counts are set as if they were loaded
+    that way, so they won't be written back to the db.
+
+    :param executions: Execution instances, or dicts of projected columns
+        (see project_operations_counts)
+    """
+    by_fk = {}
+    for execution in executions:
+        if isinstance(execution, dict):
+            # without _storage_id, the counts weren't included
+            if '_storage_id' in execution:
+                by_fk[execution['_storage_id']] = execution
+        else:
+            by_fk[execution._storage_id] = execution
+    if not by_fk:
+        return
+    pending = db.session.execute(
+        _PENDING_QUERY,
+        {'execution_fks': list(by_fk)},
+    )
+    for execution_fk, finished_delta, total_delta in pending:
+        execution = by_fk[execution_fk]
+        deltas = zip(OPERATIONS_COUNTS_COLUMNS, (finished_delta, total_delta))
+        if isinstance(execution, dict):
+            for attr, delta in deltas:
+                if attr in execution:
+                    execution[attr] = (execution[attr] or 0) + delta
+            continue
+        unloaded = inspect(execution).unloaded
+        for attr, delta in deltas:
+            if attr not in unloaded:
+                set_committed_value(
+                    execution, attr, (getattr(execution, attr) or 0) + delta)
+
+
+def fold_operations_counts():
+    """Apply all the stored changes to the executions' operations counts.
+
+    This commits the session.
+    """
+    pending = db.session.execute(
+        'SELECT EXISTS (SELECT 1 FROM executions_operations_counts)'
+    ).scalar()
+    if pending:
+        # folds are serialized, so that concurrent folds can't deadlock
+        # updating the same executions in a different order
+        db.session.execute(
+            'SELECT pg_advisory_xact_lock(:lock_number)',
+            {'lock_number': FOLD_LOCK},
+        )
+        db.session.execute(_FOLD_QUERY)
+    db.session.commit()
@@ -483,7 +483,7 @@ class Deployment(CreatedAtMixin, SQLResourceBase):
     outputs = db.Column(JSONString)
     capabilities_p = db.Column(db.PickleType(
         protocol=2, comparator=lambda *a: False))
-    capabilities = db.Column(JSONString)
+    capabilities = db.Column(JSONB)
     scaling_groups_p = db.Column(db.PickleType(protocol=2))
     scaling_groups = db.Column(JSONString)
     updated_at = db.Column(UTCDateTime)
@@ -1750,17 +1750,24 @@ class Event(SQLResourceBase):
             'events_node_id_visibility_idx',
             'node_id', 'visibility'
         ),
+        db.Index(
+            'events__execution_fk_timestamp_storage_id_idx',
+            '_execution_fk', 'timestamp', '_storage_id'
+        ),
         CheckConstraint(
             '(_execution_fk IS NOT NULL) != (_execution_group_fk IS NOT NULL)',
             name='events__one_fk_not_null'
         ),
     )
     id = None  # this is just to override the parent class attribute
+    # the table is partitioned by timestamp, and the partition key must
+    # be a part of the primary key
     timestamp = db.Column(
         UTCDateTime,
         default=datetime.utcnow,
         nullable=False,
         index=True,
+        primary_key=True,
     )
     reported_timestamp = db.Column(UTCDateTime, nullable=False)
     message = db.Column(db.Text)
@@ -1811,17 +1818,24 @@ class Log(SQLResourceBase):
             'logs_node_id_visibility_execution_fk_idx',
             'node_id', 'visibility', '_execution_fk'
         ),
+        db.Index(
+            'logs__execution_fk_timestamp_storage_id_idx',
+            '_execution_fk', 'timestamp', '_storage_id'
+        ),
         CheckConstraint(
             '(_execution_fk IS NOT NULL) != (_execution_group_fk IS NOT NULL)',
             name='logs__one_fk_not_null'
         ),
     )
     id = None  # this is just to override the parent class attribute
+    # the table is partitioned by timestamp, and the partition key must
+    # be a part of the primary key
     timestamp = db.Column(
         UTCDateTime,
         default=datetime.utcnow,
         nullable=False,
         index=True,
+        primary_key=True,
     )
     reported_timestamp = db.Column(UTCDateTime, nullable=False)
     message = db.Column(db.Text)
@@ -2217,6 +2231,12 @@ class NodeInstance(SQLResourceBase):
             'node_instances_state_visibility_idx',
             'state', 'visibility'
         ),
+        db.Index(
+            'node_instances_runtime_properties_idx',
+            'runtime_properties',
+            postgresql_using='gin',
+            postgresql_ops={'runtime_properties': 'jsonb_path_ops'},
+        ),
     )
     skipped_fields = dict(
         SQLResourceBase.skipped_fields,
@@ -2238,7 +2258,7 @@ class NodeInstance(SQLResourceBase):
     relationships_p = db.Column(db.PickleType(protocol=2))
     relationships = db.Column(JSONString)
     runtime_properties_p = db.Column(db.PickleType(protocol=2))
-    runtime_properties = db.Column(JSONString)
+    runtime_properties = db.Column(JSONB)
     system_properties = db.Column(JSONString)
     scaling_groups_p = db.Column(db.PickleType(protocol=2))
     scaling_groups = db.Column(JSONString)
@@ -2282,6 +2302,12 @@ class NodeInstance(SQLResourceBase):
     def allowed_filter_attrs(cls):
         return ['id']
 
+    @classproperty
+    def allowed_filter_json_attrs(cls):
+        # filter rules can refer to keys inside of these, eg.
+        # runtime_properties.ip
+        return ['runtime_properties']
+
     def update_status_check(self):
         """Has the last status check for this NI succeeded?
 
@@ -2438,6 +2464,27 @@ class Operation(CreatedAtMixin, SQLResourceBase):
         return
 
 
+class ExecutionOperationsCount(SQLModelBase):
+    """A pending change to the operation counts of an execution.
+
+    Operation state updates append these rows, instead of updating the
+    execution itself, so that concurrent updates of a large execution
+    don't contend on its row lock. The rows are periodically folded into
+    the execution's finished_operations and total_operations (see
+    manager_rest.storage.operations_counts).
+    """
+    __tablename__ = 'executions_operations_counts'
+
+    _storage_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    _execution_fk = foreign_key(Execution._storage_id)
+    finished_delta = db.Column(db.Integer, nullable=False, default=0)
+    total_delta = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def unique_id(cls):
+        return '_storage_id'
+
+
 class BaseDeploymentDependencies(CreatedAtMixin, SQLResourceBase):
     __abstract__ = True
     _source_deployment = None
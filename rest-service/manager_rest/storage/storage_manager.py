@@ -156,6 +156,8 @@ class SQLStorageManager(object):
             model_class,
             set(include).union(sort, distinct, filters, substr_filters),
         )
+        if include:
+            query = self._defer_excluded_json(query, model_class, include)
 
         # apply the filters. Currently, tenant filter and filter rules
         # are methods that modify the query, rather than returning filter
@@ -194,6 +196,22 @@ class SQLStorageManager(object):
 
         return query
 
+    @staticmethod
+    def _defer_excluded_json(query, model_class, include):
+        """Don't load the JSON columns that are not included.
+
+        Those can be large, so they're only fetched and decoded when
+        they are actually accessed.
+        """
+        deferred = [
+            db.defer(getattr(model_class, name))
+            for name in model_class.serialization_plan().json_columns
+            if name not in include
+        ]
+        if deferred:
+            query = query.options(*deferred)
+        return query
+
     def _traverse_association_proxy(self, field):
         """Traverse an assocproxy
 
@@ -695,17 +713,33 @@ class SQLStorageManager(object):
         else:
             msg = 'List `{0}`'.format(model_class.__name__)
         current_app.logger.debug(msg)
-        query = self._get_query(
+        project = isinstance(include, Projection) and self._can_project(
             model_class,
             include,
             filters,
             substr_filters,
             sort,
             sort_labels,
+            distinct,
+            filter_rules,
+            locking,
+        )
+        query = self._get_query(
+            model_class,
+            # a projection selects the columns explicitly, so there's
+            # nothing to be deferred or joined
+            None if project else include,
+            filters,
+            substr_filters,
+            sort,
+            sort_labels,
             all_tenants,
             distinct,
             filter_rules,
         )
+        if project:
+            query = query.with_entities(
+                *[getattr(model_class, field) for field in include])
         results, total, size, offset = self._paginate(
             model_class,
             query,
@@ -713,6 +747,8 @@ class SQLStorageManager(object):
             get_all_results,
             locking=locking,
         )
+        if project:
+            results = [dict(zip(include, row)) for row in results]
         pagination = {'total': total, 'size': size, 'offset': offset}
         if filter_rules:
             filtered = self._add_tenant_filter(
@@ -726,6 +762,22 @@ class SQLStorageManager(object):
         return ListResult(items=results, metadata={'pagination': pagination,
                                                    'filtered': filtered})
 
+    @staticmethod
+    def _can_project(model_class, include, filters, substr_filters, sort,
+                     sort_labels, distinct, filter_rules, locking):
+        """Can the list query select just the included columns?
+
+        Only if all the included fields, and all the fields that the
+        query is filtered and sorted by, are plain columns - otherwise
+        the query needs the model's relationships.
+        """
+        if sort_labels or filter_rules or locking:
+            return False
+        plain_columns = model_class.serialization_plan().plain_columns
+        fields = set(include).union(
+            filters or {}, substr_filters or {}, sort or {}, distinct or [])
+        return bool(include) and fields <= plain_columns
+
     def summarize(self, target_field, sub_field, model_class,
                   pagination, get_all_results, all_tenants, filters):
         f = getattr(model_class, target_field, None)
@@ -859,6 +911,17 @@ def get_read_only_storage_manager():
                                          ReadOnlyStorageManager())
 
 
+class Projection(list):
+    """Names of the fields to include, when listing models.
+
+    Passing this as the include of SQLStorageManager.list, instead of
+    a plain list, means that the caller can handle the listed items
+    being dicts of just the included fields, rather than model
+    instances. Then, when possible, only those columns are queried,
+    instead of loading whole model instances.
+    """
+
+
 class ListResult(object):
     """
     a ListResult contains results about the requested items.
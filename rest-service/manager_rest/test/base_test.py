@@ -578,6 +578,8 @@ class BaseServerTestCase(unittest.TestCase):
         }
         test_config.postgresql_db_name = cls._find_db_name(test_config)
         test_config.file_server_root = cls.tmpdir
+        test_config.prometheus_snapshot_dir = os.path.join(
+            cls.tmpdir, 'prometheus-snapshots')
         test_config.file_server_url = 'http://localhost:53229'
         test_config.marketplace_api_url = 'http://localhost'
 
@@ -13,9 +13,14 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import unittest
 from unittest import mock
 
+import psycopg2
+
 from manager_rest import manager_exceptions
+from manager_rest.config_listener import (ConfigChangesListener,
+                                          LIVENESS_CHECK_INTERVAL)
 from manager_rest.test import base_test
 from manager_rest.storage import models
 
@@ -165,3 +170,46 @@ class ManagerConfigTestCase(base_test.BaseServerTestCase):
             with self.assertRaises(CloudifyClientError) as cm:
                 self.client.manager.put_config('x', 'z3')
             assert cm.exception.status_code == 401
+
+
+class ConfigChangesListenerTestCase(unittest.TestCase):
+    def test_check_when_not_connected(self):
+        listener = ConfigChangesListener(check_interval=300)
+        assert listener.should_check()
+        assert listener.should_check()
+
+    def test_check_when_notified(self):
+        listener = ConfigChangesListener(check_interval=300)
+        listener._connected = True
+        assert listener.should_check()  # first check
+        assert not listener.should_check()
+        listener._changed.set()
+        assert listener.should_check()
+        assert not listener.should_check()
+
+    def test_check_fallback_interval(self):
+        listener = ConfigChangesListener(check_interval=300)
+        listener._connected = True
+        with mock.patch('time.monotonic', return_value=1000):
+            assert listener.should_check()
+            assert not listener.should_check()
+        with mock.patch('time.monotonic', return_value=1301):
+            assert listener.should_check()
+
+    def test_liveness_check_reconnects(self):
+        listener = ConfigChangesListener(check_interval=300)
+        conn = mock.MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = psycopg2.OperationalError('gone')
+        with mock.patch.object(listener, '_connect', return_value=conn), \
+                mock.patch('select.select',
+                           return_value=([], [], [])) as select_mock, \
+                mock.patch('time.sleep', side_effect=StopIteration):
+            # time.sleep is only called before reconnecting
+            with self.assertRaises(StopIteration):
+                listener._listen()
+        select_mock.assert_called_once_with(
+            [conn], [], [], LIVENESS_CHECK_INTERVAL)
+        cursor.execute.assert_called_once_with('SELECT 1')
+        conn.close.assert_called_once_with()
+        assert not listener._connected
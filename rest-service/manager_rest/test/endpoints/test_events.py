@@ -644,6 +644,94 @@ class SelectEventsSortTest(SelectEventsBaseTest):
         self._sort_by_timestamp('@timestamp', 'desc')
 
 
+class SelectEventsCursorTest(SelectEventsBaseTest):
+
+    """Page through events using a cursor."""
+
+    DEFAULT_FILTERS = {
+        'type': ['cloudify_event', 'cloudify_log']
+    }
+    DEFAULT_RANGE_FILTERS: Dict[str, str] = {}
+    PAGE_SIZE = 7
+
+    def _list_all_with_cursor(self, sort):
+        """Fetch all pages, following the cursor"""
+        listed = []
+        cursor = ''
+        while True:
+            query, total = EventsV1._build_select_query(
+                self.DEFAULT_FILTERS,
+                sort,
+                self.DEFAULT_RANGE_FILTERS,
+                self.tenant.id,
+                cursor=cursor,
+                include_total=False,
+            )
+            self.assertIsNone(total)
+            events = query.params(limit=self.PAGE_SIZE).all()
+            if not events:
+                return listed
+            listed += events
+            cursor = EventsV1._encode_cursor(events[-1])
+
+    def _assert_cursor_order(self, direction):
+        sort = {'timestamp': direction}
+        query, _ = EventsV1._build_select_query(
+            self.DEFAULT_FILTERS,
+            sort,
+            self.DEFAULT_RANGE_FILTERS,
+            self.tenant.id,
+        )
+        expected = query.params(limit=self.EVENT_COUNT, offset=0).all()
+        listed = self._list_all_with_cursor(sort)
+
+        self.assertEqual(len(listed), self.EVENT_COUNT)
+        self.assertEqual(
+            len({(event.type, event._storage_id) for event in listed}),
+            self.EVENT_COUNT,
+        )
+        self.assertListEqual(
+            [event.timestamp for event in listed],
+            [event.timestamp for event in expected],
+        )
+
+    def test_cursor_ascending(self):
+        self._assert_cursor_order('asc')
+
+    def test_cursor_descending(self):
+        self._assert_cursor_order('desc')
+
+    def test_cursor_include_total(self):
+        _, total = EventsV1._build_select_query(
+            self.DEFAULT_FILTERS,
+            {'timestamp': 'asc'},
+            self.DEFAULT_RANGE_FILTERS,
+            self.tenant.id,
+            cursor='',
+        )
+        self.assertEqual(total, self.EVENT_COUNT)
+
+    def test_invalid_cursor(self):
+        with pytest.raises(BadParametersError):
+            EventsV1._build_select_query(
+                self.DEFAULT_FILTERS,
+                {'timestamp': 'asc'},
+                self.DEFAULT_RANGE_FILTERS,
+                self.tenant.id,
+                cursor='invalid',
+            )
+
+    def test_cursor_unsupported_sort(self):
+        with pytest.raises(BadParametersError):
+            EventsV1._build_select_query(
+                self.DEFAULT_FILTERS,
+                {'message': 'asc'},
+                self.DEFAULT_RANGE_FILTERS,
+                self.tenant.id,
+                cursor='',
+            )
+
+
 class SelectEventsRangeFilterTest(SelectEventsBaseTest):
 
     """Filter out events not included in a range."""
@@ -9,6 +9,7 @@ from cloudify_rest_client.exceptions import CloudifyClientError
 
 from manager_rest.test import base_test
 from manager_rest.storage import models
+from manager_rest.storage.operations_counts import fold_operations_counts
 
 OPERATIONS_MODULE = 'manager_rest.rest.resources_v3_1.operations'
 
@@ -145,8 +146,32 @@ class OperationsTestCase(OperationsTestBase, base_test.BaseServerTestCase):
         assert self.execution.finished_operations == 0
         assert self.execution.total_operations == 2
         self.client.operations.update(op1['id'], constants.TASK_SUCCEEDED)
+        # the change is only stored aside, and added to the counts when
+        # the execution is read via the REST API, without folding it
+        self.sm.refresh(self.execution)
+        assert self.execution.finished_operations == 0
+        execution = self.client.executions.get(self.execution.id)
+        assert execution.finished_operations == 1
+        assert execution.total_operations == 2
+        listed = {e.id: e for e in self.client.executions.list()}
+        assert listed[self.execution.id].finished_operations == 1
+        # listed as just the included columns
+        projected = {e.id: e for e in self.client.executions.list(
+            _include=['id', 'status', 'finished_operations'])}
+        assert projected[self.execution.id].finished_operations == 1
+        self.sm.refresh(self.execution)
+        assert self.execution.finished_operations == 0
+
+        fold_operations_counts()
         self.sm.refresh(self.execution)
         assert self.execution.finished_operations == 1
+        execution = self.client.executions.get(self.execution.id)
+        assert execution.finished_operations == 1
+
+        self.client._client.delete(f'/operations/{op1["id"]}')
+        execution = self.client.executions.get(self.execution.id)
+        assert execution.finished_operations == 0
+        assert execution.total_operations == 1
 
     def test_list_invalid_filters(self):
         with pytest.raises(CloudifyClientError) as cm:
@@ -217,6 +242,58 @@ class OperationsTestCase(OperationsTestBase, base_test.BaseServerTestCase):
         assert {o.id for o in all_ops} == {'op1', 'op2', 'op3'}
         assert {o.id for o in skip} == {'op2', 'op3'}
 
+    def test_bulk_update(self):
+        ops = [
+            {
+                'id': uuid.uuid4().hex,
+                'name': f'op{i}',
+                'dependencies': [],
+                'parameters': {},
+                'type': 'RemoteWorkflowTask'
+            } for i in range(3)
+        ]
+        self.client.tasks_graphs.create(
+            self.execution.id, name='workflow', operations=ops)
+        with mock.patch(f'{OPERATIONS_MODULE}.current_execution',
+                        self.execution):
+            self.client._client.patch('/operations', data={
+                'operations': [
+                    {'id': ops[0]['id'], 'state': constants.TASK_STARTED},
+                    {'id': ops[0]['id'], 'state': constants.TASK_SUCCEEDED},
+                    {'id': ops[1]['id'], 'state': constants.TASK_FAILED,
+                     'exception': 'error', 'agent_name': 'agent1'},
+                ]
+            })
+        execution = self.client.executions.get(self.execution.id)
+        assert execution.finished_operations == 2
+        states = {
+            op.id: op.state for op in self.client.operations.list(
+                execution_id=self.execution.id)
+        }
+        assert states == {
+            ops[0]['id']: constants.TASK_SUCCEEDED,
+            ops[1]['id']: constants.TASK_FAILED,
+            ops[2]['id']: constants.TASK_PENDING,
+        }
+        events = models.Event.query.all()
+        assert len(events) == 3
+        assert {e.agent_name for e in events} == {None, 'agent1'}
+
+    def test_bulk_update_missing(self):
+        tg1 = self._graph(id='g1', name='workflow1')
+        self._operation(id='op1', tasks_graph=tg1, state='pending',
+                        type='RemoteWorkflowTask')
+        with pytest.raises(CloudifyClientError) as cm:
+            self.client._client.patch('/operations', data={
+                'operations': [
+                    {'id': 'op1', 'state': constants.TASK_SUCCEEDED},
+                    {'id': 'nonexistent', 'state': constants.TASK_SUCCEEDED},
+                ]
+            })
+        assert cm.value.status_code == 404
+        assert 'nonexistent' in str(cm.value)
+        assert self.sm.get(models.Operation, 'op1').state == 'pending'
+
     def test_get_operation(self):
         tg1 = self._graph(id='g1', name='workflow1')
         self._operation(id='op1', tasks_graph=tg1, state='pending',
@@ -4,7 +4,7 @@ from cloudify.models_states import DeploymentState
 from cloudify_rest_client.exceptions import CloudifyClientError
 
 from manager_rest.test import base_test
-from manager_rest.storage import models
+from manager_rest.storage import db, models
 from manager_rest.rest.filters_utils import FilterRule
 from manager_rest.rest.search_utils import get_filter_rules
 
@@ -768,6 +768,86 @@ class SearchesTestCase(base_test.BaseServerTestCase):
         )
         assert [s.id for s in search] == []
 
+    def test_node_instances_filter_by_runtime_properties(self):
+        self._create_nodes('b1', 'd1',
+                           node_ids=['node1'],
+                           node_instance_suffixes=['a', 'b', 'c'])
+        runtime_properties = {
+            'node1_a': {'net': {'IP': '10.0.0.1'}},
+            'node1_b': {'net': {'IP': '10.0.0.2'}},
+            # only string values are matched
+            'node1_c': {'net': {'IP': 100}},
+        }
+        for ni in models.NodeInstance.query.all():
+            ni.runtime_properties = runtime_properties[ni.id]
+        db.session.commit()
+
+        def _search(operator, values):
+            response = self.client._client.post(
+                '/searches/node-instances',
+                data={'filter_rules': [{
+                    'key': 'runtime_properties.net.IP',
+                    'values': values,
+                    'operator': operator,
+                    'type': 'attribute',
+                }]},
+            )
+            return {item['id'] for item in response['items']}
+
+        assert _search('any_of', ['10.0.0.1']) == {'node1_a'}
+        assert _search('not_any_of', ['10.0.0.1']) == {'node1_b'}
+        assert _search('starts_with', ['10']) == {'node1_a', 'node1_b'}
+        assert _search('is_not_empty', []) == {'node1_a', 'node1_b'}
+
+    def test_capabilities_search_by_constraints(self):
+        bp, _ = self._create_deployment('d1', capabilities={
+            'cap_a': {'value': 'x'},
+            'other': {'value': 'y'},
+        })
+        self._create_deployment('d2', bp=bp, capabilities={
+            'cap_b': {'value': 'y'},
+        })
+        self._create_deployment('d3', bp=bp, capabilities=None)
+
+        def _search(constraints, search=None):
+            params = {'deployment_id': 'd'}
+            if search:
+                params['_search'] = search
+            response = self.client._client.post(
+                '/searches/capabilities',
+                params=params,
+                data={'constraints': constraints},
+            )
+            return {
+                item['deployment_id']: [
+                    key for cap in item['capabilities'] for key in cap
+                ]
+                for item in response['items']
+            }
+
+        assert _search({'name_pattern': {'starts_with': 'cap_'}}) == {
+            'd1': ['cap_a'],
+            'd2': ['cap_b'],
+        }
+        assert _search({'name_pattern': {'ends_with': '_a'}}) == {
+            'd1': ['cap_a'],
+        }
+        assert _search({'valid_values': ['y']}) == {
+            'd1': ['other'],
+            'd2': ['cap_b'],
+        }
+        assert _search({}, search='x') == {'d1': ['cap_a']}
+
+        # filtered counts all the deployments without matching
+        # capabilities, also the ones skipped in the db
+        response = self.client._client.post(
+            '/searches/capabilities',
+            params={'deployment_id': 'd'},
+            data={'constraints': {'name_pattern': {'ends_with': '_a'}}},
+        )
+        assert response['metadata']['filtered'] == 2
+        assert response['metadata']['pagination']['total'] == 1
+
     def test_scaling_groups_valid_request(self):
         self.client.deployments.scaling_groups.list(
             deployment_id='d1',
@@ -1,10 +1,14 @@
 import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
+from manager_rest import dsl_functions
 from manager_rest.storage import db, models
 from manager_rest.test import base_test
 
 from cloudify.cryptography_utils import (
     decrypt,
+    encrypt,
 )
 from cloudify.models_states import VisibilityState
 
@@ -183,3 +187,95 @@ class TestSecrets(base_test.BaseServerTestCase):
                 sec.id, VisibilityState.GLOBAL)
         secs = models.Secret.query.all()
         assert len(secs) == 2
+
+
+class _FakeVaultServer(ThreadingHTTPServer):
+    """Serves the Vault KV API: GET /v1/secret/data/<path>"""
+    def __init__(self, values):
+        super().__init__(('127.0.0.1', 0), _FakeVaultHandler)
+        self.values = values
+        self.requested_paths = []
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self.server_address)
+
+
+class _FakeVaultHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requested_paths.append(self.path)
+        body = json.dumps({'data': {'data': self.server.values}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSecretValuesCache(base_test.BaseServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.vault = _FakeVaultServer({'sec1': 'value1'})
+        vault_thread = threading.Thread(target=self.vault.serve_forever)
+        vault_thread.start()
+        self.addCleanup(vault_thread.join)
+        self.addCleanup(self.vault.server_close)
+        self.addCleanup(self.vault.shutdown)
+        self.addCleanup(dsl_functions.secret_values.invalidate)
+
+    def _add_vault_secret(self, key, cache_ttl):
+        provider = models.SecretsProvider(
+            id='vault1',
+            name='vault1',
+            type='vault',
+            connection_parameters=encrypt(json.dumps({
+                'url': self.vault.url,
+                'token': 'vault-token',
+                'path': 'cloudify',
+                'cache_ttl': cache_ttl,
+            })),
+            tenant=self.tenant,
+            creator=self.user,
+        )
+        models.Secret(
+            id=key,
+            provider=provider,
+            visibility=VisibilityState.TENANT,
+            tenant=self.tenant,
+            creator=self.user,
+        )
+        db.session.commit()
+
+    def test_vault_secret_cached(self):
+        self._add_vault_secret('sec1', cache_ttl=60)
+        for _ in range(3):
+            assert dsl_functions.get_secret_method('sec1').value == 'value1'
+        assert self.vault.requested_paths == [
+            '/v1/secret/data/cloudify',
+        ]
+
+        self.vault.values['sec1'] = 'value2'
+        assert dsl_functions.get_secret_method('sec1').value == 'value1'
+        # updating the secret drops its cached value
+        self.client.secrets.update('sec1', is_hidden_value=True)
+        assert dsl_functions.get_secret_method('sec1').value == 'value2'
+        assert len(self.vault.requested_paths) == 2
+
+    def test_vault_secret_cache_disabled(self):
+        self._add_vault_secret('sec1', cache_ttl=0)
+        for _ in range(3):
+            assert dsl_functions.get_secret_method('sec1').value == 'value1'
+        assert len(self.vault.requested_paths) == 3
+
+    def test_local_secret_cache_follows_updates(self):
+        self.client.secrets.create('sec2', 'value1')
+        assert dsl_functions.get_secret_method('sec2').value == 'value1'
+        # the cache is per-process, so a secret updated by another
+        # process must not be served from it either
+        secret = self.sm.get(models.Secret, 'sec2')
+        secret.value = encrypt('value2')
+        db.session.commit()
+        assert dsl_functions.get_secret_method('sec2').value == 'value2'
@@ -258,6 +258,41 @@ class StorageManagerTests(base_test.BaseServerTestCase):
         assert set(users) == {self.user, other_admin}
 
 
+class TestSerializationPlan(base_test.BaseServerTestCase):
+    def test_plan_matches_resource_fields(self):
+        for model in [models.Blueprint, models.Execution, models.Secret]:
+            plan = model.serialization_plan()
+            assert plan is model.serialization_plan()
+            assert plan.resource_fields == model.resource_fields
+            assert plan.field_names == tuple(model.resource_fields)
+
+    def test_resource_fields_can_be_modified(self):
+        fields = models.Blueprint.resource_fields
+        fields.pop('id')
+        assert 'id' in models.Blueprint.resource_fields
+
+    def test_plan_not_inherited(self):
+        assert models.Log.serialization_plan() is not \
+            models.Event.serialization_plan()
+        assert models.Execution.serialization_plan() is not \
+            models.Blueprint.serialization_plan()
+
+    def test_to_response_include(self):
+        blueprint = models.Blueprint(
+            id='bp1',
+            description='descr',
+            creator=self.user,
+            tenant=self.tenant,
+        )
+        assert blueprint.to_response(include=['id', 'description']) == {
+            'id': 'bp1',
+            'description': 'descr',
+        }
+        assert blueprint.to_response(include={'id': None}) == {'id': 'bp1'}
+        full = blueprint.to_response()
+        assert set(models.Blueprint.resource_fields) <= set(full)
+
+
 class TestTransactions(base_test.BaseServerTestCase):
     def _make_secret(self, id, value):
         # these tests are using secrets, but they could just as well
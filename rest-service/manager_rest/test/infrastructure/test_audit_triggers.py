@@ -0,0 +1,58 @@
+from manager_rest.storage import db, models
+from manager_rest.test.base_test import BaseServerTestCase
+
+
+class AuditTriggersTest(BaseServerTestCase):
+    def setUp(self):
+        super().setUp()
+        # cleaning up the previous tests might've been audited as well
+        db.session.execute('DELETE FROM audit_log')
+        for i in range(3):
+            db.session.add(models.Site(
+                id=f'site{i}',
+                name=f'site{i}',
+                creator=self.user,
+                tenant=self.tenant,
+            ))
+        db.session.commit()
+
+    def _audit_logs(self, operation):
+        return db.session.execute(
+            "SELECT ref_id, ref_identifier FROM audit_log "
+            "WHERE ref_table = 'sites' AND operation = :operation",
+            {'operation': operation},
+        ).all()
+
+    def _expected_audit_logs(self):
+        return {
+            (site._storage_id, site.name)
+            for site in models.Site.query.all()
+        }
+
+    def _check_audit_logs(self, operation, expected):
+        logs = self._audit_logs(operation)
+        assert len(logs) == len(expected)
+        assert {
+            (ref_id, ref_identifier['name']) for ref_id, ref_identifier in logs
+        } == expected
+        for _, ref_identifier in logs:
+            assert ref_identifier['_tenant_id'] == str(self.tenant.id)
+
+    def test_insert_audited(self):
+        self._check_audit_logs('create', self._expected_audit_logs())
+
+    def test_bulk_update_audited(self):
+        db.session.execute('UPDATE sites SET latitude = 1')
+        db.session.commit()
+        self._check_audit_logs('update', self._expected_audit_logs())
+
+    def test_bulk_delete_audited(self):
+        expected = self._expected_audit_logs()
+        db.session.execute('DELETE FROM sites')
+        db.session.commit()
+        self._check_audit_logs('delete', expected)
+
+    def test_empty_statement_not_audited(self):
+        db.session.execute("UPDATE sites SET latitude = 1 WHERE name = ''")
+        db.session.commit()
+        assert self._audit_logs('update') == []
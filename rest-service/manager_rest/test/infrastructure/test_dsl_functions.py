@@ -1,7 +1,9 @@
+from sqlalchemy import event
+
 from manager_rest import dsl_functions
 
 from manager_rest.manager_exceptions import FunctionsEvaluationError
-from manager_rest.storage import models
+from manager_rest.storage import db, models
 from manager_rest.test.base_test import BaseServerTestCase
 
 
@@ -123,3 +125,60 @@ class TestIntrinsicFunctions(BaseServerTestCase):
             srv_storage.get_environment_capability(['cap1', 'nonexistent'])
 
         assert 'b' == srv_storage.get_environment_capability(['cap1', 'a'])
+
+    def _count_queries(self, func, *args, **kwargs):
+        queries = []
+
+        def _on_query(*_):
+            queries.append(1)
+
+        event.listen(db.engine, 'before_cursor_execute', _on_query)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _on_query)
+        return result, len(queries)
+
+    def test_evaluation_queries_constant(self):
+        models.Deployment(
+            id='env',
+            blueprint=self.bp,
+            creator=self.user,
+            tenant=self.tenant,
+            capabilities={'cap1': {'value': 'x'}},
+        )
+        models.Deployment(
+            id='srv',
+            display_name='Server',
+            blueprint=self.bp,
+            creator=self.user,
+            tenant=self.tenant,
+            inputs={'inp1': 'a'},
+            labels=[
+                models.DeploymentLabel(
+                    key='csys-obj-parent',
+                    value='env',
+                    creator=self.user,
+                ),
+            ],
+        )
+        self.sm.get(models.Deployment, 'srv')
+
+        def _payload(functions_count):
+            return {
+                f'f{i}': [
+                    {'get_input': 'inp1'},
+                    {'get_sys': ['deployment', 'name']},
+                    {'get_label': ['csys-obj-parent', 0]},
+                    {'get_environment_capability': 'cap1'},
+                ]
+                for i in range(functions_count)
+            }
+
+        result, single_queries = self._count_queries(
+            dsl_functions.evaluate_intrinsic_functions, _payload(1), 'srv')
+        assert result == {'f0': ['a', 'Server', 'env', 'x']}
+        result, many_queries = self._count_queries(
+            dsl_functions.evaluate_intrinsic_functions, _payload(50), 'srv')
+        assert len(result) == 50
+        assert many_queries == single_queries
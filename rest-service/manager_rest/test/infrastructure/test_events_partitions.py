@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from manager_rest.storage import db, events_partitions, models
+from manager_rest.test.base_test import BaseServerTestCase
+
+
+class EventsPartitionsTest(BaseServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.execution = self._add_execution_with_id('execution1')
+
+    def _add_event(self, timestamp):
+        event = models.Event(
+            timestamp=timestamp,
+            reported_timestamp=timestamp,
+            event_type='workflow_started',
+            message='message',
+            execution=self.execution,
+            tenant=self.tenant,
+            creator=self.user,
+        )
+        db.session.add(event)
+        db.session.commit()
+
+    def _count(self, table_name):
+        return db.session.execute(
+            f'SELECT count(*) FROM {table_name}').scalar()
+
+    def test_partitions_created_by_migration(self):
+        current_month = datetime.utcnow().replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0)
+        for table_name in events_partitions.PARTITIONED_TABLES:
+            assert current_month in \
+                events_partitions.list_partitions(table_name)
+        assert events_partitions.ensure_partitions() == []
+
+    def test_create_partition_moves_rows(self):
+        self._add_event(datetime(2000, 1, 15))
+        assert self._count('events_default') == 1
+
+        events_partitions.create_partition('events', datetime(2000, 1, 1))
+        self.addCleanup(db.session.execute,
+                        'DROP TABLE IF EXISTS events_p200001')
+        db.session.commit()
+
+        assert self._count('events_default') == 0
+        assert self._count('events_p200001') == 1
+        assert models.Event.query.count() == 1
+
+    def test_drop_expired_partitions(self):
+        self._add_event(datetime(2000, 1, 15))
+        self._add_event(datetime(2000, 2, 15))
+        for month in [1, 2]:
+            events_partitions.create_partition(
+                'events', datetime(2000, month, 1))
+            self.addCleanup(db.session.execute,
+                            f'DROP TABLE IF EXISTS events_p20000{month}')
+        db.session.commit()
+
+        dropped = events_partitions.drop_expired_partitions(
+            retention_days=10, now=datetime(2000, 2, 20))
+        db.session.commit()
+
+        assert dropped == ['events_p200001']
+        assert models.Event.query.count() == 1
@@ -15,11 +15,21 @@
 
 from unittest import mock
 
+from flask_restful import marshal
+from sqlalchemy import inspect
+
 from cloudify_rest_client.exceptions import NoSuchIncludeFieldError
 
+from manager_rest.rest.rest_decorators import CompiledSerializer
 from manager_rest.test import base_test
 from manager_rest.test.utils import node_intance_counts
-from manager_rest.storage import ListResult, models
+from manager_rest.storage import (
+    ListResult,
+    db,
+    get_storage_manager,
+    models,
+)
+from manager_rest.storage.storage_manager import Projection
 
 
 class IncludeQueryParamTests(base_test.BaseServerTestCase):
@@ -211,3 +221,47 @@ class IncludeQueryParamTests(base_test.BaseServerTestCase):
         response = self.client.deployments.get(
             self.deployment_id, _include=['created_by'])
         self.assertEqual(response, {'created_by': 'admin'})
+
+    def test_projected_list(self):
+        sm = get_storage_manager()
+        instances = sm.list(models.NodeInstance,
+                            include=Projection(['id', 'state']))
+        assert sorted(instances, key=lambda ni: ni['id']) == [
+            {'id': 'node1_0', 'state': 'started'},
+            {'id': 'node1_1', 'state': 'started'},
+        ]
+        # filtering by a relationship can't be done on a projection
+        instances = sm.list(models.NodeInstance,
+                            include=Projection(['id', 'state']),
+                            filters={'deployment_id': 'dep1'})
+        assert all(isinstance(ni, models.NodeInstance) for ni in instances)
+
+    def test_compiled_serializer(self):
+        response = self.client.node_instances.list(
+            _include=['id', 'state', 'index', 'runtime_properties'])
+        assert len(response) == 2
+        for ni in response:
+            assert set(ni) == {'id', 'state', 'index', 'runtime_properties'}
+
+        fields = models.NodeInstance.response_fields
+        instances = models.NodeInstance.query.all()
+        serializer = CompiledSerializer(models.NodeInstance, fields)
+        assert serializer.usable
+        assert serializer.serialize(instances) == [
+            marshal(ni.to_response(), fields) for ni in instances
+        ]
+
+    def test_excluded_json_deferred(self):
+        sm = get_storage_manager()
+        dep = sm.get(models.Deployment, 'dep1')
+        dep.workflows = {'install': {'operation': 'op'}}
+        sm.update(dep)
+        db.session.expire_all()
+
+        dep = sm.list(models.Deployment, include=['id', 'inputs'])[0]
+        unloaded = inspect(dep).unloaded
+        assert 'workflows' in unloaded
+        assert 'capabilities' in unloaded
+        assert 'inputs' not in unloaded
+        # deferred columns are still loaded when accessed
+        assert dep.workflows == {'install': {'operation': 'op'}}
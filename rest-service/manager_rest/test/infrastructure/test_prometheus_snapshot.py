@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from manager_rest import prometheus_snapshot
+
+
+class PrometheusSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_dir)
+        self.snapshot = prometheus_snapshot.PrometheusSnapshot(
+            'manager_service',
+            refresh_interval=1,
+            max_staleness=30,
+            snapshot_dir=self.snapshot_dir,
+        )
+        patcher = mock.patch.object(prometheus_snapshot, 'config')
+        self.config = patcher.start()
+        self.config.instance.monitoring_timeout = 5
+        self.addCleanup(patcher.stop)
+
+    def _refresh(self, results):
+        with mock.patch.object(prometheus_snapshot, 'prometheus_query',
+                               return_value=results) as query:
+            self.snapshot.refresh()
+        return query
+
+    def test_no_snapshot(self):
+        assert self.snapshot.get_results() is None
+
+    def test_refresh(self):
+        query = self._refresh([{'metric': {'name': 'a'}}])
+        query.assert_called_once()
+        assert self.snapshot.get_results() == [{'metric': {'name': 'a'}}]
+        assert os.listdir(self.snapshot_dir) == [
+            os.path.basename(self.snapshot._snapshot_path)]
+
+    def test_reads_replaced_snapshot(self):
+        self._refresh([{'metric': {'name': 'a'}}])
+        self.snapshot.get_results()
+        # make sure the mtime changes even on coarse-grained filesystems
+        time.sleep(0.01)
+        self._refresh([{'metric': {'name': 'b'}}])
+        assert self.snapshot.get_results() == [{'metric': {'name': 'b'}}]
+
+    def test_stale_snapshot(self):
+        self._refresh([{'metric': {'name': 'a'}}])
+        with mock.patch('time.time', return_value=time.time() + 60):
+            assert self.snapshot.get_results() is None
+
+    def test_query_copies_results(self):
+        self._refresh([{'metric': {'name': 'a'}}])
+        logger = mock.Mock()
+        with mock.patch.object(prometheus_snapshot, 'get_snapshot',
+                               return_value=self.snapshot):
+            results = prometheus_snapshot.query('manager_service', logger)
+            results.pop()
+            assert prometheus_snapshot.query('manager_service', logger) == \
+                [{'metric': {'name': 'a'}}]
+        logger.error.assert_not_called()
+
+    def test_query_waits_for_first_snapshot(self):
+        logger = mock.Mock()
+        timer = threading.Timer(
+            0.1, self._refresh, args=([{'metric': {'name': 'a'}}], ))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        with mock.patch.object(prometheus_snapshot, 'get_snapshot',
+                               return_value=self.snapshot):
+            assert prometheus_snapshot.query('manager_service', logger) == \
+                [{'metric': {'name': 'a'}}]
+
+    def test_stale_snapshot_not_waited_for(self):
+        self._refresh([{'metric': {'name': 'a'}}])
+        logger = mock.Mock()
+        with mock.patch.object(prometheus_snapshot, 'get_snapshot',
+                               return_value=self.snapshot), \
+                mock.patch('time.time', return_value=time.time() + 60), \
+                mock.patch('time.sleep') as sleep:
+            assert prometheus_snapshot.query('manager_service', logger) == []
+        sleep.assert_not_called()
+        logger.error.assert_called_once()
+
+    def test_snapshot_dir_must_be_private(self):
+        os.chmod(self.snapshot_dir, 0o777)
+        with self.assertRaises(RuntimeError):
+            self.snapshot.start()
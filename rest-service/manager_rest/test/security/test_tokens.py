@@ -1,10 +1,12 @@
 from datetime import datetime
+from unittest import mock
 
 import pytest
 
 from cloudify_rest_client.exceptions import UserUnauthorizedError
 
 from manager_rest.constants import CLOUDIFY_TENANT_HEADER
+from manager_rest.security import user_handler
 from manager_rest.storage import user_datastore
 from manager_rest.test.token_utils import (
     create_expired_token,
@@ -139,3 +141,38 @@ class TokenTests(SecurityTestBase):
 
     def test_invalid_token_authentication(self):
         self._assert_user_unauthorized(token='wrong token')
+
+    def test_verified_token_is_cached(self):
+        with self.use_secured_client(username='alice',
+                                     password='alice_password'):
+            token = self.client.tokens.create()
+        with mock.patch(
+            'manager_rest.security.user_handler.verify_password',
+            wraps=user_handler.verify_password,
+        ) as verify_mock:
+            self._assert_user_authorized(token=token.value)
+            self._assert_user_authorized(token=token.value)
+        assert verify_mock.call_count == 1
+
+    def test_deleted_token_fails_auth_when_cached(self):
+        with self.use_secured_client(username='alice',
+                                     password='alice_password'):
+            token = self.client.tokens.create()
+        self._assert_user_authorized(token=token.value)
+        with self.use_secured_client(username='alice',
+                                     password='alice_password'):
+            self.client.tokens.delete(token.id)
+        self._assert_token_unauthorized(token=token.value)
+
+    def test_cached_token_for_locked_account_fails_auth(self):
+        with self.use_secured_client(username='alice',
+                                     password='alice_password'):
+            token = self.client.tokens.create()
+        self._assert_user_authorized(token=token.value)
+        try:
+            self._lock_alice()
+            self._assert_token_unauthorized(
+                token=token.value,
+                error='.+locked account')
+        finally:
+            self._unlock_alice()
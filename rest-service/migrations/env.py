@@ -3,6 +3,7 @@ from __future__ import with_statement
 import contextlib
 import logging
 import os
+import re
 
 from flask import current_app
 from alembic import context
@@ -10,6 +11,7 @@ from sqlalchemy import engine_from_config, pool
 
 from manager_rest import config as manager_config
 from manager_rest.flask_utils import setup_flask_app
+from manager_rest.storage.events_partitions import PARTITIONED_TABLES
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -19,6 +21,9 @@ config = context.config
 # This line sets up loggers basically.
 logger = logging.getLogger('alembic.env')
 
+events_partition_name = re.compile(r'^({0})_(p\d{{6}}|default)$'.format(
+    '|'.join(PARTITIONED_TABLES)))
+
 
 @contextlib.contextmanager
 def default_config_path():
@@ -83,10 +88,19 @@ def run_migrations_online():
                                 prefix='sqlalchemy.',
                                 poolclass=pool.NullPool)
 
+    # partitions of the events and logs tables are created at runtime
+    # (see manager_rest.storage.events_partitions), and are not a part
+    # of the models
+    def include_object(obj, name, type_, reflected, compare_to):
+        if type_ == 'table' and reflected and compare_to is None:
+            return not events_partition_name.match(name)
+        return True
+
     connection = engine.connect()
     context.configure(connection=connection,
                       target_metadata=target_metadata,
                       process_revision_directives=process_revision_directives,
+                      include_object=include_object,
                       **current_app.extensions['migrate'].configure_args)
 
     try:
@@ -0,0 +1,555 @@
+"""Cloudify 7.0 to 7.1 DB migration
+
+Revision ID: 3e5f8c2a9b71
+Revises: edd6d829a209
+Create Date: 2026-10-18 10:12:31.115832
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3e5f8c2a9b71'
+down_revision = 'edd6d829a209'
+branch_labels = None
+depends_on = None
+
+
+config_tables = ['config', 'roles', 'permissions', 'certificates']
+events_tables = ['events', 'logs']
+# how many months ahead to create the events partitions
+partition_months_ahead = 3
+# JSON columns that are filtered by, so they're stored as JSONB
+jsonb_columns = [
+    ('deployments', 'capabilities'),
+    ('node_instances', 'runtime_properties'),
+]
+# Same as in the 6.4 to 7.0 migration: the tables whose changes are
+# written to audit_log, mapped to the column used for audit_log.ref_id,
+# and to the columns stored in audit_log.ref_identifier.
+tables_to_audit = {
+    'agents': ('_storage_id', ['_tenant_id', 'id']),
+    'blueprints': ('_storage_id', ['_tenant_id', 'id']),
+    'blueprints_filters': ('_storage_id', ['_tenant_id', 'id']),
+    'blueprints_labels': ('id', ['id']),
+    'certificates': ('id', ['id']),
+    'deployment_groups': ('_storage_id', ['_tenant_id', 'id']),
+    'deployment_groups_labels': ('id', ['id']),
+    'deployment_labels_dependencies': ('_storage_id', ['_tenant_id', 'id']),
+    'deployment_modifications': ('_storage_id', ['_tenant_id', 'id']),
+    'deployment_update_steps': ('_storage_id', ['_tenant_id', 'id']),
+    'deployment_updates': ('_storage_id', ['_tenant_id', 'id']),
+    'deployments': ('_storage_id', ['_tenant_id', 'id']),
+    'deployments_filters': ('_storage_id', ['_tenant_id', 'id']),
+    'deployments_labels': ('id', ['id']),
+    'execution_groups': ('_storage_id', ['_tenant_id', 'id']),
+    'execution_schedules': ('_storage_id', ['_tenant_id', 'id']),
+    'executions': ('_storage_id', ['_tenant_id', 'id']),
+    'groups': ('id', ['id']),
+    'inter_deployment_dependencies': ('_storage_id', ['_tenant_id', 'id']),
+    'licenses': ('id', ['id']),
+    'maintenance_mode': ('id', ['id']),
+    'managers': ('id', ['id']),
+    'node_instances': ('_storage_id', ['_tenant_id', 'id']),
+    'nodes': ('_storage_id', ['_tenant_id', 'id']),
+    'operations': ('_storage_id', ['_tenant_id', 'id']),
+    'permissions': ('id', ['id']),
+    'plugins': ('_storage_id', ['_tenant_id', 'id']),
+    'plugins_states': ('_storage_id', ['_storage_id']),
+    'plugins_updates': ('_storage_id', ['_tenant_id', 'id']),
+    'roles': ('id', ['id']),
+    'secrets': ('_storage_id', ['_tenant_id', 'id']),
+    'sites': ('_storage_id', ['_tenant_id', 'name']),
+    'snapshots': ('_storage_id', ['_tenant_id', 'id']),
+    'tasks_graphs': ('_storage_id', ['_tenant_id', 'id']),
+    'tenants': ('id', ['_tenant_id', 'name']),
+    'users': ('id', ['username']),
+}
+# A trigger with transition tables can only fire on a single operation,
+# so each audited table has a trigger per operation. The transition
+# table holds the new rows for INSERT and UPDATE, and the old rows for
+# DELETE.
+audited_operations = [
+    ('INSERT', 'NEW'),
+    ('UPDATE', 'NEW'),
+    ('DELETE', 'OLD'),
+]
+# how many id ranges to send in a single audit_log_inserted notification,
+# to keep the payload under the 8000 bytes limit
+audit_notify_ranges = 200
+
+
+def upgrade():
+    add_execution_schedules_notify()
+    add_config_notify()
+    add_events_keyset_indexes()
+    partition_events_tables()
+    create_executions_operations_counts()
+    convert_columns_to_jsonb()
+    create_statement_audit_triggers()
+    create_statement_audit_log_notify()
+
+
+def downgrade():
+    drop_statement_audit_log_notify()
+    drop_statement_audit_triggers()
+    convert_columns_to_text()
+    drop_executions_operations_counts()
+    unpartition_events_tables()
+    drop_events_keyset_indexes()
+    drop_config_notify()
+    drop_execution_schedules_notify()
+
+
+def add_execution_schedules_notify():
+    # The execution scheduler LISTENs on this channel, so that it can
+    # recompute when the next schedule is due, instead of polling.
+    # This is a statement-level trigger, so that bulk changes to schedules
+    # (eg. for a whole deployment group) only send a single notification.
+    op.execute("""CREATE OR REPLACE FUNCTION notify_execution_schedules()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('execution_schedules_changed'::text, ''::text);
+            RETURN NULL;
+        END;
+    $$ LANGUAGE plpgsql;""")
+    op.execute("""CREATE TRIGGER execution_schedules_changed
+                  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+                  ON execution_schedules FOR EACH STATEMENT
+                  EXECUTE PROCEDURE notify_execution_schedules();""")
+
+
+def drop_execution_schedules_notify():
+    op.execute("""DROP TRIGGER execution_schedules_changed
+                  ON execution_schedules;""")
+    op.execute("""DROP FUNCTION notify_execution_schedules();""")
+
+
+def add_config_notify():
+    # The rest-service workers LISTEN on this channel, and only check
+    # whether the config needs to be reloaded when notified.
+    op.execute("""CREATE OR REPLACE FUNCTION notify_config_changed()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('config_changed'::text, TG_TABLE_NAME::text);
+            RETURN NULL;
+        END;
+    $$ LANGUAGE plpgsql;""")
+    for table_name in config_tables:
+        op.execute(f"""CREATE TRIGGER {table_name}_config_changed
+                       AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+                       ON {table_name} FOR EACH STATEMENT
+                       EXECUTE PROCEDURE notify_config_changed();""")
+
+
+def drop_config_notify():
+    for table_name in config_tables:
+        op.execute(f"""DROP TRIGGER {table_name}_config_changed
+                       ON {table_name};""")
+    op.execute("""DROP FUNCTION notify_config_changed();""")
+
+
+def add_events_keyset_indexes():
+    # for listing the events of an execution in order, using a cursor
+    for table_name in ['events', 'logs']:
+        op.create_index(
+            op.f(f'{table_name}__execution_fk_timestamp_storage_id_idx'),
+            table_name,
+            ['_execution_fk', 'timestamp', '_storage_id'],
+            unique=False,
+        )
+
+
+def drop_events_keyset_indexes():
+    for table_name in ['events', 'logs']:
+        op.drop_index(
+            op.f(f'{table_name}__execution_fk_timestamp_storage_id_idx'),
+            table_name=table_name,
+        )
+
+
+def _month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def _next_month(dt):
+    return _month_start(_month_start(dt) + timedelta(days=32))
+
+
+def _recreate_events_table(table_name, partitioned):
+    """Recreate the table, either partitioned by month, or not partitioned.
+
+    A table can't be converted to a partitioned table (or back) in place,
+    so a new table is created, the rows are copied over to it, and
+    it then replaces the old table, with all its indexes and constraints.
+    A primary key on a partitioned table must include the partition key,
+    so the primary key of a partitioned table is (_storage_id, timestamp).
+    """
+    bind = op.get_bind()
+    new_table = f'{table_name}_new'
+    indexes = bind.execute(sa.text("""
+        SELECT indexdef FROM pg_indexes
+        WHERE tablename = :table_name AND indexname != :pkey
+    """), {'table_name': table_name, 'pkey': f'{table_name}_pkey'}).all()
+    foreign_keys = bind.execute(sa.text("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = CAST(:table_name AS regclass) AND contype = 'f'
+    """), {'table_name': table_name}).all()
+    sequence = bind.execute(sa.text(
+        "SELECT pg_get_serial_sequence(:table_name, '_storage_id')"
+    ), {'table_name': table_name}).scalar()
+
+    op.execute(f"""
+        CREATE TABLE {new_table}
+        (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        {'PARTITION BY RANGE ("timestamp")' if partitioned else ''}
+    """)
+    if partitioned:
+        oldest = bind.execute(sa.text(
+            f'SELECT min("timestamp") FROM {table_name}')).scalar()
+        month = _month_start(oldest or datetime.utcnow())
+        last_month = _month_start(datetime.utcnow())
+        for _ in range(partition_months_ahead):
+            last_month = _next_month(last_month)
+        while month <= last_month:
+            op.execute(f"""
+                CREATE TABLE {table_name}_p{month:%Y%m}
+                PARTITION OF {new_table}
+                FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')
+            """)
+            month = _next_month(month)
+        op.execute(f"""
+            CREATE TABLE {table_name}_default
+            PARTITION OF {new_table} DEFAULT
+        """)
+
+    op.execute(f'INSERT INTO {new_table} SELECT * FROM {table_name}')
+    # the sequence is owned by the old table's column, so it would be
+    # dropped together with the old table
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    op.execute(f'DROP TABLE {table_name}')
+    op.execute(f'ALTER TABLE {new_table} RENAME TO {table_name}')
+    op.execute(f'ALTER SEQUENCE {sequence} '
+               f'OWNED BY {table_name}._storage_id')
+
+    primary_key = ['_storage_id', 'timestamp'] if partitioned \
+        else ['_storage_id']
+    op.create_primary_key(f'{table_name}_pkey', table_name, primary_key)
+    for (indexdef, ) in indexes:
+        op.execute(indexdef)
+    for name, definition in foreign_keys:
+        op.execute(f'ALTER TABLE {table_name} '
+                   f'ADD CONSTRAINT {name} {definition}')
+
+
+def _create_events_audit_trigger(table_name):
+    op.execute(f"""
+    CREATE TRIGGER audit_{table_name}
+    AFTER INSERT OR UPDATE OR DELETE ON {table_name} FOR EACH ROW
+    EXECUTE PROCEDURE write_audit_log_for_events_logs('{table_name}');
+    """)
+
+
+def partition_events_tables():
+    for table_name in events_tables:
+        _recreate_events_table(table_name, partitioned=True)
+        # the triggers were dropped together with the old table
+        _create_events_audit_trigger(table_name)
+
+
+def unpartition_events_tables():
+    for table_name in events_tables:
+        _recreate_events_table(table_name, partitioned=False)
+        # the triggers were dropped together with the partitioned table
+        _create_events_audit_trigger(table_name)
+
+
+def create_executions_operations_counts():
+    op.create_table(
+        'executions_operations_counts',
+        sa.Column(
+            '_storage_id',
+            sa.Integer(),
+            autoincrement=True,
+            nullable=False,
+        ),
+        sa.Column(
+            '_execution_fk',
+            sa.Integer(),
+            nullable=False,
+        ),
+        sa.Column(
+            'finished_delta',
+            sa.Integer(),
+            nullable=False,
+        ),
+        sa.Column(
+            'total_delta',
+            sa.Integer(),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ['_execution_fk'],
+            ['executions._storage_id'],
+            name=op.f('executions_operations_counts__execution_fk_fkey'),
+            ondelete='CASCADE',
+        ),
+        sa.PrimaryKeyConstraint(
+            '_storage_id',
+            name=op.f('executions_operations_counts_pkey'),
+        ),
+    )
+    op.create_index(
+        op.f('executions_operations_counts__execution_fk_idx'),
+        'executions_operations_counts',
+        ['_execution_fk'],
+        unique=False,
+    )
+
+
+def drop_executions_operations_counts():
+    # fold the pending changes first, so that they're not lost
+    op.execute("""
+        UPDATE executions e
+        SET
+            finished_operations =
+                coalesce(e.finished_operations, 0) + summed.finished_delta,
+            total_operations =
+                coalesce(e.total_operations, 0) + summed.total_delta
+        FROM (
+            SELECT
+                _execution_fk,
+                sum(finished_delta) AS finished_delta,
+                sum(total_delta) AS total_delta
+            FROM executions_operations_counts
+            GROUP BY _execution_fk
+        ) AS summed
+        WHERE e._storage_id = summed._execution_fk
+    """)
+    op.drop_index(
+        op.f('executions_operations_counts__execution_fk_idx'),
+        table_name='executions_operations_counts',
+    )
+    op.drop_table('executions_operations_counts')
+
+
+def convert_columns_to_jsonb():
+    for table_name, column_name in jsonb_columns:
+        op.alter_column(
+            table_name,
+            column_name,
+            type_=postgresql.JSONB(),
+            postgresql_using=f'{column_name}::jsonb',
+        )
+    # for filtering node instances by their runtime properties
+    op.create_index(
+        op.f('node_instances_runtime_properties_idx'),
+        'node_instances',
+        ['runtime_properties'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'runtime_properties': 'jsonb_path_ops'},
+    )
+
+
+def convert_columns_to_text():
+    op.drop_index(
+        op.f('node_instances_runtime_properties_idx'),
+        table_name='node_instances',
+    )
+    for table_name, column_name in jsonb_columns:
+        op.alter_column(
+            table_name,
+            column_name,
+            type_=sa.Text(),
+            postgresql_using=f'{column_name}::text',
+        )
+
+
+def _create_statement_audit_triggers(table_name, procedure):
+    for operation, transition in audited_operations:
+        op.execute(f"""
+        CREATE TRIGGER audit_{table_name}_{operation.lower()}
+        AFTER {operation} ON {table_name}
+        REFERENCING {transition} TABLE AS changed_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE {procedure};
+        """)
+
+
+def _drop_statement_audit_triggers(table_name):
+    for operation, _ in audited_operations:
+        op.execute(f"""
+        DROP TRIGGER IF EXISTS audit_{table_name}_{operation.lower()}
+        ON {table_name};
+        """)
+
+
+def create_statement_audit_triggers():
+    # Statement-level versions of write_audit_log and
+    # write_audit_log_for_events_logs: instead of a function call and an
+    # INSERT per modified row, a single INSERT .. SELECT per statement
+    # writes the audit_log rows of all the modified rows.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION write_audit_log_for_statement()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            -- List of columns to store, the second argument of the function
+            _id_columns text[] := tg_argv[1]::text[];
+            -- User performing the modification, from external context
+            _user text := public.audit_username();
+            -- Execution_id performing the modification, from external context
+            _execution_id text := public.audit_execution_id();
+            _operation public.audit_operation;
+        BEGIN
+            IF (TG_OP = 'INSERT') THEN
+                _operation := 'create';
+            ELSEIF (TG_OP = 'UPDATE') THEN
+                _operation := 'update';
+            ELSEIF (TG_OP = 'DELETE') THEN
+                _operation := 'delete';
+            END IF;
+
+            -- Same as write_audit_log, for every row of the changed_rows
+            -- transition table: ref_id is populated with the column named
+            -- by the first parameter, and ref_identifier with the columns
+            -- named by the second parameter.
+            INSERT INTO public.audit_log (ref_table, ref_id, ref_identifier,
+                                          operation, creator_name,
+                                          execution_id, created_at)
+                SELECT quote_ident(tg_table_name),
+                       (changed.row_json->>tg_argv[0])::int,
+                       (
+                           SELECT jsonb_object(
+                               array_agg(key),
+                               array_agg(changed.row_json ->> key)
+                           )
+                           FROM unnest(_id_columns) id_cols(key)
+                       ),
+                       _operation, _user, _execution_id, now()
+                FROM (
+                    SELECT to_jsonb(changed_rows) AS row_json
+                    FROM changed_rows
+                ) changed;
+            RETURN NULL;
+        END;
+    $$ LANGUAGE plpgsql;""")
+    op.execute("""
+    CREATE OR REPLACE FUNCTION write_audit_log_for_events_logs_statement()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            _table TEXT := TG_ARGV[0]::TEXT;
+            _user TEXT := public.audit_username();
+            _execution_id TEXT := public.audit_execution_id();
+            _operation public.audit_operation;
+        BEGIN
+            IF (_execution_id IS NOT NULL) THEN
+                RETURN NULL;
+            END IF;
+            IF (TG_OP = 'INSERT') THEN
+                _operation := 'create';
+            ELSEIF (TG_OP = 'UPDATE') THEN
+                _operation := 'update';
+            ELSEIF (TG_OP = 'DELETE') THEN
+                _operation := 'delete';
+            END IF;
+            INSERT INTO public.audit_log (ref_table, ref_id, operation,
+                                          creator_name, execution_id,
+                                          created_at)
+                SELECT _table, _storage_id, _operation, _user,
+                       _execution_id, now()
+                FROM changed_rows;
+            RETURN NULL;
+        END;
+    $$ LANGUAGE plpgsql;""")
+    for table_name, (id_field, identifier_fields) in tables_to_audit.items():
+        op.execute(f"""
+        DROP TRIGGER IF EXISTS audit_{table_name} ON {table_name};
+        """)
+        _create_statement_audit_triggers(
+            table_name,
+            f"""write_audit_log_for_statement(
+                '{id_field}', '{{ {",".join(identifier_fields)} }}')""",
+        )
+    for table_name in events_tables:
+        op.execute(f"""
+        DROP TRIGGER IF EXISTS audit_{table_name} ON {table_name};
+        """)
+        _create_statement_audit_triggers(
+            table_name,
+            f"write_audit_log_for_events_logs_statement('{table_name}')",
+        )
+
+
+def drop_statement_audit_triggers():
+    for table_name in events_tables:
+        _drop_statement_audit_triggers(table_name)
+        _create_events_audit_trigger(table_name)
+    for table_name, (id_field, identifier_fields) in tables_to_audit.items():
+        _drop_statement_audit_triggers(table_name)
+        op.execute(f"""
+        CREATE TRIGGER audit_{table_name}
+        AFTER INSERT OR UPDATE OR DELETE ON {table_name} FOR EACH ROW
+        EXECUTE PROCEDURE
+        write_audit_log('{id_field}', '{{ {",".join(identifier_fields)} }}');
+        """)
+    op.execute("""DROP FUNCTION write_audit_log_for_events_logs_statement;""")
+    op.execute("""DROP FUNCTION write_audit_log_for_statement;""")
+
+
+def create_statement_audit_log_notify():
+    # Instead of a notification with the whole row for every audit_log
+    # row, send a single notification per statement, with the _storage_id
+    # ranges of the inserted rows (split into several notifications only
+    # if there's too many ranges to fit in the payload). The listeners
+    # fetch the rows themselves.
+    op.execute(f"""CREATE OR REPLACE FUNCTION notify_new_audit_logs()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            _payload text;
+        BEGIN
+            FOR _payload IN
+                SELECT json_build_object(
+                    'ranges',
+                    json_agg(json_build_array(first_id, last_id)
+                             ORDER BY first_id)
+                )::text
+                FROM (
+                    -- consecutive ids have the same island number
+                    SELECT min(_storage_id) AS first_id,
+                           max(_storage_id) AS last_id,
+                           (row_number() OVER (ORDER BY min(_storage_id))
+                            - 1) / {audit_notify_ranges} AS chunk
+                    FROM (
+                        SELECT _storage_id,
+                               _storage_id - row_number() OVER (
+                                   ORDER BY _storage_id) AS island
+                        FROM new_audit_logs
+                    ) ids
+                    GROUP BY island
+                ) ranges
+                GROUP BY chunk
+                ORDER BY chunk
+            LOOP
+                PERFORM pg_notify('audit_log_inserted'::text, _payload);
+            END LOOP;
+            RETURN NULL;
+        END;
+    $$ LANGUAGE plpgsql;""")
+    op.execute("""DROP TRIGGER audit_log_inserted ON audit_log;""")
+    op.execute("""CREATE TRIGGER audit_log_inserted
+                  AFTER INSERT ON audit_log
+                  REFERENCING NEW TABLE AS new_audit_logs
+                  FOR EACH STATEMENT
+                  EXECUTE PROCEDURE notify_new_audit_logs();""")
+
+
+def drop_statement_audit_log_notify():
+    op.execute("""DROP TRIGGER audit_log_inserted ON audit_log;""")
+    op.execute("""DROP FUNCTION notify_new_audit_logs();""")
+    op.execute("""CREATE TRIGGER audit_log_inserted
+                  AFTER INSERT ON audit_log FOR EACH ROW
+                  EXECUTE PROCEDURE notify_new_audit_log();""")